@@ -9,13 +9,81 @@ Backtester - система бэктестинга торговых страте
 """
 
 import logging
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
 from virtual_trading_bot import VirtualTradingBot
-from data_loader import DataLoader
+from data_loader import DataLoader, Klines
 from database import Database
+from indicators import IncrementalMACD, IncrementalRSI
 import time
 
+# Сколько символов загружать одновременно (загрузка упирается в сеть и БД, а не в CPU)
+MAX_PARALLEL_SYMBOL_LOADS = 4
+
+
+@dataclass
+class PreparedData:
+    """
+    Загруженные свечи и рассчитанные по ним индикаторы.
+    
+    Только читается во время симуляции, поэтому один экземпляр можно
+    передать в несколько прогонов run_backtest (например, с разными
+    комиссиями и slippage) без повторной загрузки и пересчета.
+    """
+    historical_data: Dict[str, Klines]
+    candle_index_by_ts: Dict[str, Dict[int, int]]
+    indicators: Dict[str, Dict[str, np.ndarray]]
+
+
+class ReturnStats:
+    """
+    Потоковая статистика доходностей между соседними точками истории баланса.
+    
+    Среднее и дисперсия считаются по Уэлфорду за один проход; для Сортино
+    отдельно копятся отрицательные доходности (их количество и сумма квадратов).
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.downside_count = 0
+        self._downside_sq_sum = 0.0
+        self._prev_balance: Optional[float] = None
+    
+    def add_balance(self, balance: float):
+        """Добавляет точку баланса; доходность считается относительно предыдущей"""
+        prev_balance = self._prev_balance
+        self._prev_balance = balance
+        if prev_balance is not None and prev_balance > 0:
+            self.update((balance - prev_balance) / prev_balance)
+    
+    def update(self, value: float):
+        """Добавляет одну доходность"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        
+        if value < 0:
+            self.downside_count += 1
+            self._downside_sq_sum += value * value
+    
+    @property
+    def std(self) -> float:
+        """Выборочное стандартное отклонение (ddof=1)"""
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+    
+    @property
+    def downside_deviation(self) -> float:
+        """Среднеквадратичное отрицательных доходностей"""
+        return math.sqrt(self._downside_sq_sum / self.downside_count) if self.downside_count else 0.0
+
 
 class BacktestEngine(VirtualTradingBot):
     """
@@ -47,7 +115,7 @@ class BacktestEngine(VirtualTradingBot):
         self.config = config or {}
         
         # Исторические данные для всех символов
-        self.historical_data: Dict[str, List[Dict]] = {}
+        self.historical_data: Dict[str, Klines] = {}
         
         # Текущая временная метка в процессе бэктеста
         self.current_backtest_time: Optional[datetime] = None
@@ -55,6 +123,15 @@ class BacktestEngine(VirtualTradingBot):
         # Индекс текущей свечи для каждого символа
         self.candle_indexes: Dict[str, int] = {}
         
+        # Позиция свечи в historical_data по ее timestamp (строится один раз при загрузке)
+        self.candle_index_by_ts: Dict[str, Dict[int, int]] = {}
+        
+        # Индикаторы простой стратегии, рассчитанные сразу на всю историю символа
+        self.indicators: Dict[str, Dict[str, np.ndarray]] = {}
+        
+        # Потоковые RSI и MACD для стратегии deepseek (обновляются на каждой свече)
+        self.indicator_streams: Dict[str, Dict] = {}
+        
         # Результаты бэктеста
         self.backtest_results: Dict = {}
         
@@ -74,6 +151,16 @@ class BacktestEngine(VirtualTradingBot):
         # История баланса для расчета метрик (timestamp: balance)
         self.balance_history: List[Dict] = []
         
+        # Доходности по истории баланса, накапливаются по ходу симуляции (для Sharpe/Sortino)
+        self.return_stats = ReturnStats()
+        
+        # Число периодов в год для аннуализации метрик (оценивается один раз за прогон)
+        self._periods_per_year: Optional[int] = None
+        
+        # Реализованный PnL из БД меняется только при закрытии позиции,
+        # поэтому между закрытиями он не перечитывается на каждой свече
+        self._realized_pnl_cache: Optional[float] = None
+        
         # История сделок для детального анализа
         self.trades_history: List[Dict] = []
         
@@ -90,7 +177,8 @@ class BacktestEngine(VirtualTradingBot):
     def run_backtest(self, symbols: List[str], interval: str,
                      start_date: datetime, end_date: datetime,
                      initial_balance: Optional[float] = None,
-                     progress_callback: Optional[callable] = None) -> Dict:
+                     progress_callback: Optional[callable] = None,
+                     prepared: Optional[PreparedData] = None) -> Dict:
         """
         Запускает бэктест на исторических данных.
         
@@ -101,6 +189,8 @@ class BacktestEngine(VirtualTradingBot):
             end_date: Конечная дата
             initial_balance: Начальный баланс (если None - берется из настроек)
             progress_callback: Функция обратного вызова для отчета о прогрессе
+            prepared: Данные из prepare() для тех же символов и периода
+                      (если None - данные загружаются заново)
             
         Returns:
             Dict: Результаты бэктеста с метриками
@@ -156,6 +246,10 @@ class BacktestEngine(VirtualTradingBot):
             # Сбрасываем трекеры баланса
             self.highest_balance = self.initial_balance
             self.lowest_balance = self.initial_balance
+            self.balance_history = []
+            self.return_stats = ReturnStats()
+            self._periods_per_year = None
+            self._realized_pnl_cache = None
             
             self.logger.info(f"💰 Начальный баланс: ${self.initial_balance:.2f}")
             
@@ -164,7 +258,10 @@ class BacktestEngine(VirtualTradingBot):
             if self.progress_callback:
                 self.progress_callback(0, f"Загрузка данных для {len(symbols)} символов...")
             
-            if not self._load_historical_data(symbols, interval, start_date, end_date):
+            if prepared is not None:
+                self.logger.info("♻️ Используем подготовленные данные (без повторной загрузки)")
+                self._apply_prepared_data(prepared)
+            elif not self._load_historical_data(symbols, interval, start_date, end_date):
                 self.logger.error("❌ Не удалось загрузить данные для бэктеста")
                 return {}
             
@@ -201,10 +298,8 @@ class BacktestEngine(VirtualTradingBot):
             self.backtest_results = results
             return results
             
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка выполнения бэктеста: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка выполнения бэктеста")
             return {}
     
     def _load_historical_data(self, symbols: List[str], interval: str,
@@ -216,43 +311,67 @@ class BacktestEngine(VirtualTradingBot):
             bool: True если данные успешно загружены
         """
         try:
-            # Загружаем данные для каждого символа с обновлением прогресса
+            # Символы независимы до начала симуляции - загружаем их параллельно
             self.historical_data = {}
             total_symbols = len(symbols)
-            
-            for i, symbol in enumerate(symbols, 1):
-                # Обновляем прогресс загрузки (0-10% диапазон)
-                progress = (i / total_symbols) * 10
-                if self.progress_callback:
-                    self.progress_callback(
-                        progress, 
-                        f"Загрузка данных {i}/{total_symbols}: {symbol}..."
-                    )
-                
-                self.logger.info(f"📊 [{i}/{total_symbols}] Загрузка {symbol}...")
-                
-                klines = self.data_loader.load_historical_data(
-                    symbol=symbol,
-                    interval=interval,
-                    start_date=start_date,
-                    end_date=end_date,
-                    use_cache=True
-                )
+            loaded: Dict[str, Klines] = {}
+            
+            with ThreadPoolExecutor(max_workers=min(total_symbols, MAX_PARALLEL_SYMBOL_LOADS) or 1,
+                                    thread_name_prefix="backtest-load") as pool:
+                futures = {
+                    pool.submit(
+                        self.data_loader.load_historical_data,
+                        symbol=symbol,
+                        interval=interval,
+                        start_date=start_date,
+                        end_date=end_date,
+                        use_cache=True
+                    ): symbol
+                    for symbol in symbols
+                }
                 
-                if klines:
-                    self.historical_data[symbol] = klines
-                    self.logger.info(f"✅ {symbol}: {len(klines)} свечей")
-                else:
-                    self.logger.warning(f"⚠️ {symbol}: нет данных")
+                for i, future in enumerate(as_completed(futures), 1):
+                    symbol = futures[future]
+                    klines = future.result()
+                    loaded[symbol] = klines
+                    
+                    # Обновляем прогресс загрузки (0-10% диапазон)
+                    progress = (i / total_symbols) * 10
+                    if self.progress_callback:
+                        self.progress_callback(
+                            progress,
+                            f"Загружено {i}/{total_symbols}: {symbol}"
+                        )
+                    
+                    if klines:
+                        self.logger.info(f"✅ [{i}/{total_symbols}] {symbol}: {len(klines)} свечей")
+                    else:
+                        self.logger.warning(f"⚠️ [{i}/{total_symbols}] {symbol}: нет данных")
+            
+            # Порядок символов влияет на порядок обработки свечей - сохраняем порядок запроса
+            for symbol in symbols:
+                if loaded.get(symbol):
+                    self.historical_data[symbol] = loaded[symbol]
             
             if not self.historical_data:
                 self.logger.error("❌ Не удалось загрузить исторические данные")
                 return False
             
             # Инициализируем индексы для каждого символа
-            for symbol in self.historical_data.keys():
+            self.candle_index_by_ts = {}
+            for symbol, candles in self.historical_data.items():
                 self.candle_indexes[symbol] = 0
-                self.total_candles += len(self.historical_data[symbol])
+                self.total_candles += len(candles)
+                
+                # При дубликатах timestamp остается первая свеча, как при линейном поиске
+                index_by_ts: Dict[int, int] = {}
+                for idx, timestamp in enumerate(candles.timestamp.tolist()):
+                    index_by_ts.setdefault(timestamp, idx)
+                self.candle_index_by_ts[symbol] = index_by_ts
+                
+                self.indicators[symbol] = self._precompute_indicators(candles)
+            
+            self._reset_indicator_streams()
             
             self.logger.info(f"✅ Загружено данных для {len(self.historical_data)} символов")
             self.logger.info(f"📊 Всего свечей для обработки: {self.total_candles}")
@@ -263,6 +382,65 @@ class BacktestEngine(VirtualTradingBot):
             self.logger.error(f"❌ Ошибка загрузки исторических данных: {e}")
             return False
     
+    def prepare(self, symbols: List[str], interval: str,
+                start_date: datetime, end_date: datetime) -> Optional[PreparedData]:
+        """
+        Загружает свечи и рассчитывает индикаторы для нескольких прогонов бэктеста.
+        
+        Args:
+            symbols: Список торговых пар
+            interval: Таймфрейм
+            start_date: Начальная дата
+            end_date: Конечная дата
+            
+        Returns:
+            PreparedData: Данные для run_backtest(prepared=...) или None, если загрузка не удалась
+        """
+        if not self._load_historical_data(symbols, interval, start_date, end_date):
+            return None
+        
+        return PreparedData(
+            historical_data=self.historical_data,
+            candle_index_by_ts=self.candle_index_by_ts,
+            indicators=self.indicators
+        )
+    
+    def _apply_prepared_data(self, prepared: PreparedData):
+        """Подставляет подготовленные данные вместо загрузки (состояние прогона сбрасывается)"""
+        self.historical_data = prepared.historical_data
+        self.candle_index_by_ts = prepared.candle_index_by_ts
+        self.indicators = prepared.indicators
+        self.candle_indexes = {symbol: 0 for symbol in self.historical_data}
+        self.total_candles = sum(len(candles) for candles in self.historical_data.values())
+        self._reset_indicator_streams()
+    
+    def _reset_indicator_streams(self):
+        """Создает потоковые индикаторы заново: их состояние относится к одному прогону"""
+        self.indicator_streams = {
+            symbol: {'rsi': IncrementalRSI(14), 'macd': IncrementalMACD()}
+            for symbol in self.historical_data
+        }
+    
+    def _precompute_indicators(self, candles: Klines) -> Dict[str, np.ndarray]:
+        """
+        Рассчитывает индикаторы простой стратегии на всю историю символа.
+        
+        Значение с индексом i совпадает с расчетом по окну, заканчивающемуся свечой i,
+        поэтому в цикле симуляции индикаторы читаются по позиции свечи без пересчета.
+        
+        Args:
+            candles: Свечи символа, отсортированные по времени
+            
+        Returns:
+            Dict[str, np.ndarray]: {'close_ma10': ..., 'volume_ma5': ...}
+        """
+        frame = pd.DataFrame({'close': candles.close, 'volume': candles.volume})
+        
+        return {
+            'close_ma10': frame['close'].rolling(10, min_periods=1).mean().to_numpy(),
+            'volume_ma5': frame['volume'].rolling(5, min_periods=1).mean().to_numpy()
+        }
+    
     def _simulate_trading(self, start_date: datetime, end_date: datetime, interval: str):
         """
         Симулирует торговлю на исторических данных.
@@ -286,7 +464,7 @@ class BacktestEngine(VirtualTradingBot):
             total_steps = len(timeline)
             report_interval = max(1, total_steps // 100)  # Отчет каждые 1%
             
-            start_time = time.time()
+            start_time = time.monotonic()
             
             # Проходим по каждой точке на временной шкале
             for i, timestamp in enumerate(timeline):
@@ -311,11 +489,12 @@ class BacktestEngine(VirtualTradingBot):
                     'datetime': self.current_backtest_time,
                     'balance': self.current_balance
                 })
+                self.return_stats.add_balance(self.current_balance)
                 
                 # Прогресс-бар
                 if (i + 1) % report_interval == 0 or i == total_steps - 1:
                     progress = ((i + 1) / total_steps) * 100
-                    elapsed = time.time() - start_time
+                    elapsed = time.monotonic() - start_time
                     eta = (elapsed / (i + 1)) * (total_steps - i - 1)
                     
                     # Отправляем прогресс через callback
@@ -328,18 +507,15 @@ class BacktestEngine(VirtualTradingBot):
                         )
                     
                     self.logger.info(
-                        f"📈 Прогресс: {progress:.1f}% ({i + 1}/{total_steps}) | "
-                        f"⏱️ Прошло: {elapsed:.1f}s | ETA: {eta:.1f}s | "
-                        f"💰 Баланс: ${self.current_balance:.2f}"
+                        "📈 Прогресс: %.1f%% (%d/%d) | ⏱️ Прошло: %.1fs | ETA: %.1fs | 💰 Баланс: $%.2f",
+                        progress, i + 1, total_steps, elapsed, eta, self.current_balance
                     )
             
-            total_time = time.time() - start_time
-            self.logger.info(f"\n✅ Симуляция завершена за {total_time:.1f}s")
+            total_time = time.monotonic() - start_time
+            self.logger.info("\n✅ Симуляция завершена за %.1fs", total_time)
             
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка симуляции торговли: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка симуляции торговли")
     
     def _create_timeline(self) -> List[int]:
         """
@@ -348,13 +524,25 @@ class BacktestEngine(VirtualTradingBot):
         Returns:
             List[int]: Отсортированный список timestamp в миллисекундах
         """
-        all_timestamps = set()
-        
-        for symbol, candles in self.historical_data.items():
-            for candle in candles:
-                all_timestamps.add(candle['timestamp'])
+        if not self.historical_data:
+            return []
         
-        return sorted(list(all_timestamps))
+        all_timestamps = np.concatenate([candles.timestamp for candles in self.historical_data.values()])
+        return np.unique(all_timestamps).tolist()
+    
+    def _close_virtual_position(self, position: Dict, base_exit_price: float, reason: str):
+        """Закрытие позиции; сбрасывает закешированный реализованный PnL"""
+        try:
+            super()._close_virtual_position(position, base_exit_price, reason)
+        finally:
+            self._realized_pnl_cache = None
+    
+    def _get_realized_pnl(self) -> float:
+        """Реализованный PnL из БД (перечитывается только после закрытия позиции)"""
+        if self._realized_pnl_cache is None:
+            stats = self.db.get_virtual_trade_stats(365)
+            self._realized_pnl_cache = stats.get('total_realized_pnl', 0) or 0
+        return self._realized_pnl_cache
     
     def _get_candle_at_timestamp(self, symbol: str, timestamp: int) -> Optional[Dict]:
         """
@@ -367,17 +555,11 @@ class BacktestEngine(VirtualTradingBot):
         Returns:
             Dict: Свеча или None если не найдена
         """
-        if symbol not in self.historical_data:
+        idx = self.candle_index_by_ts.get(symbol, {}).get(timestamp)
+        if idx is None:
             return None
         
-        candles = self.historical_data[symbol]
-        
-        # Ищем свечу с нужным timestamp
-        for candle in candles:
-            if candle['timestamp'] == timestamp:
-                return candle
-        
-        return None
+        return self.historical_data[symbol][idx]
     
     def _process_historical_candle(self, symbol: str, candle: Dict):
         """
@@ -389,14 +571,9 @@ class BacktestEngine(VirtualTradingBot):
         """
         try:
             # Обновляем индекс текущей свечи для использования в стратегии
-            if symbol in self.historical_data:
-                candles = self.historical_data[symbol]
-                candle_timestamp = candle['timestamp']
-                # Находим индекс текущей свечи по timestamp
-                for idx, c in enumerate(candles):
-                    if c['timestamp'] == candle_timestamp:
-                        self.candle_indexes[symbol] = idx
-                        break
+            idx = self.candle_index_by_ts.get(symbol, {}).get(candle['timestamp'])
+            if idx is not None:
+                self.candle_indexes[symbol] = idx
             
             current_price = candle['close']
             
@@ -416,11 +593,25 @@ class BacktestEngine(VirtualTradingBot):
                     'volume_24h': candle['volume'],
                     'historical_prices': []
                 }
+                
+                # Индикаторы обновляются по одной свече; пока окно не заполнено, в промпте будет N/A
+                streams = self.indicator_streams[symbol]
+                rsi = streams['rsi'].update(current_price)
+                macd = streams['macd'].update(current_price)
+                if rsi is not None:
+                    market_data['rsi'] = round(rsi, 2)
+                if macd is not None:
+                    market_data['macd'] = round(macd, 4)
+                
                 signal = self.get_trading_signal_with_logging(symbol, market_data)
             else:
                 # Используем простую техническую стратегию (быстро!)
                 signal = self._get_simple_backtest_signal(symbol, candle)
             
+            # HOLD и неуверенные сигналы ничего не исполняют - размер позиции для них не считаем
+            if signal.get('action') not in ('BUY', 'SELL') or signal['confidence'] <= self.min_confidence:
+                return
+            
             # Рассчитываем размер позиции
             position_amount = self.calculate_position_size(symbol, current_price)
             
@@ -436,11 +627,9 @@ class BacktestEngine(VirtualTradingBot):
                 'historical_prices': []
             }
             
-            # Исполняем торговое решение если сигнал достаточно уверенный
-            if signal['confidence'] > self.min_confidence:
-                self._execute_virtual_trading_decision(
-                    symbol, signal, market_data, position_amount
-                )
+            self._execute_virtual_trading_decision(
+                symbol, signal, market_data, position_amount
+            )
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка обработки свечи {symbol}: {e}")
@@ -468,20 +657,17 @@ class BacktestEngine(VirtualTradingBot):
             if current_idx < 20:
                 return {'action': 'hold', 'confidence': 0.0, 'reason': 'Недостаточно истории'}
             
-            # Берем последние 20 свечей для анализа
-            recent_candles = self.historical_data[symbol][max(0, current_idx-19):current_idx+1]
+            indicators = self.indicators[symbol]
             
             # Простая стратегия на основе изменения цены
             # Сравниваем текущую цену с средней за последние 10 свечей
-            prices = [c['close'] for c in recent_candles[-10:]]
-            avg_price = sum(prices) / len(prices) if prices else candle['close']
+            avg_price = float(indicators['close_ma10'][current_idx])
             
             current_price = candle['close']
             price_change = ((current_price - avg_price) / avg_price) * 100
             
             # Анализ объема
-            volumes = [c['volume'] for c in recent_candles[-5:]]
-            avg_volume = sum(volumes) / len(volumes) if volumes else candle['volume']
+            avg_volume = float(indicators['volume_ma5'][current_idx])
             volume_ratio = candle['volume'] / avg_volume if avg_volume > 0 else 1.0
             
             # Генерируем сигнал
@@ -610,10 +796,8 @@ class BacktestEngine(VirtualTradingBot):
             else:
                 self.logger.warning(f"⚠️ Не удалось получить статистику для символов {self.backtest_symbols}")
                 return {}
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка получения статистики бэктеста: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка получения статистики бэктеста")
             return {}
     
     def _calculate_results(self) -> Dict:
@@ -685,6 +869,7 @@ class BacktestEngine(VirtualTradingBot):
             # А не только из реализованного PnL из БД
             total_pnl = self.current_balance - self.initial_balance
             roi = (total_pnl / self.initial_balance * 100) if self.initial_balance > 0 else 0
+            max_drawdown = self._calculate_max_drawdown()
             
             results = {
                 # Базовые метрики
@@ -700,10 +885,10 @@ class BacktestEngine(VirtualTradingBot):
                 'lowest_balance': self.lowest_balance,
                 
                 # Риск-метрики
-                'max_drawdown': self._calculate_max_drawdown(),
+                'max_drawdown': max_drawdown,
                 'sharpe_ratio': self._calculate_sharpe_ratio(),
                 'sortino_ratio': self._calculate_sortino_ratio(),
-                'calmar_ratio': self._calculate_calmar_ratio(),
+                'calmar_ratio': self._calculate_calmar_ratio(max_drawdown),
                 
                 # Торговые метрики
                 'profit_factor': self._calculate_profit_factor(),
@@ -777,19 +962,36 @@ class BacktestEngine(VirtualTradingBot):
             self.logger.error(f"❌ Ошибка оценки периодов в год: {e}")
             return 0
     
+    def _get_periods_per_year(self) -> int:
+        """Число периодов в год (оценка кешируется до следующего прогона)"""
+        if self._periods_per_year is None:
+            self._periods_per_year = self._estimate_periods_per_year()
+        return self._periods_per_year
+    
+    def _annualization_factor(self) -> float:
+        """Множитель аннуализации sqrt(periods_per_year); 1.0, если оценить не удалось"""
+        periods_per_year = self._get_periods_per_year()
+        return math.sqrt(periods_per_year) if periods_per_year > 0 else 1.0
+    
     def _calculate_max_drawdown(self) -> float:
         """
-        Рассчитывает максимальную просадку.
+        Рассчитывает максимальную просадку - наибольшее падение баланса
+        от предшествующего пика (начальный баланс тоже считается пиком).
         
         Returns:
             float: Максимальная просадка в процентах
         """
         try:
-            if self.highest_balance == 0:
+            if not self.balance_history:
                 return 0.0
             
-            drawdown = ((self.highest_balance - self.lowest_balance) / self.highest_balance) * 100
-            return drawdown
+            equity = np.fromiter(
+                (point['balance'] for point in self.balance_history),
+                dtype=np.float64, count=len(self.balance_history)
+            )
+            peak = np.maximum.accumulate(np.concatenate(([self.initial_balance], equity)))[1:]
+            drawdown = np.divide(peak - equity, peak, out=np.zeros_like(equity), where=peak > 0)
+            return float(drawdown.max() * 100)
         except Exception as e:
             self.logger.error(f"❌ Ошибка расчета Max Drawdown: {e}")
             return 0.0
@@ -811,38 +1013,24 @@ class BacktestEngine(VirtualTradingBot):
                 self.logger.debug("⚠️ Недостаточно данных для расчета Sharpe Ratio")
                 return 0.0
             
-            # Рассчитываем доходность между периодами (returns)
-            returns = []
-            for i in range(1, len(self.balance_history)):
-                prev_balance = self.balance_history[i-1]['balance']
-                curr_balance = self.balance_history[i]['balance']
-                
-                if prev_balance > 0:
-                    period_return = (curr_balance - prev_balance) / prev_balance
-                    returns.append(period_return)
-            
-            if len(returns) == 0:
+            # Средняя доходность и стандартное отклонение накоплены по ходу симуляции
+            stats = self.return_stats
+            if stats.count == 0:
                 return 0.0
             
-            # Вычисляем среднюю доходность и стандартное отклонение
-            import numpy as np
-            mean_return = np.mean(returns)
-            std_return = np.std(returns, ddof=1)  # ddof=1 для выборочного стд. откл.
+            mean_return = stats.mean
+            std_return = stats.std  # ddof=1 для выборочного стд. откл.
             
             if std_return == 0:
                 return 0.0
             
             # Преобразуем risk-free rate в периодическую ставку
             # (предполагаем, что periods примерно соответствуют годовой доходности)
-            periods_per_year = self._estimate_periods_per_year()
+            periods_per_year = self._get_periods_per_year()
             risk_free_per_period = (risk_free_rate / 100) / periods_per_year if periods_per_year > 0 else 0
             
-            # Sharpe Ratio
-            sharpe = (mean_return - risk_free_per_period) / std_return
-            
-            # Аннуализируем (умножаем на sqrt(periods_per_year))
-            if periods_per_year > 0:
-                sharpe = sharpe * np.sqrt(periods_per_year)
+            # Sharpe Ratio, аннуализированный (умножаем на sqrt(periods_per_year))
+            sharpe = (mean_return - risk_free_per_period) / std_return * self._annualization_factor()
             
             return float(sharpe)
             
@@ -850,15 +1038,12 @@ class BacktestEngine(VirtualTradingBot):
             self.logger.error(f"❌ Ошибка расчета Sharpe Ratio: {e}")
             return 0.0
     
-    def _calculate_sortino_ratio(self, target_return: float = 0.0) -> float:
+    def _calculate_sortino_ratio(self) -> float:
         """
         Рассчитывает коэффициент Сортино (учитывает только негативную волатильность).
         
-        Sortino Ratio = (Mean Return - Target Return) / Downside Deviation
+        Sortino Ratio = Mean Return / Downside Deviation (целевая доходность - 0%)
         
-        Args:
-            target_return: Целевая доходность (обычно 0% или минимальная приемлемая)
-            
         Returns:
             float: Sortino Ratio (чем выше, тем лучше)
         """
@@ -867,41 +1052,24 @@ class BacktestEngine(VirtualTradingBot):
                 self.logger.debug("⚠️ Недостаточно данных для расчета Sortino Ratio")
                 return 0.0
             
-            # Рассчитываем доходность между периодами
-            returns = []
-            for i in range(1, len(self.balance_history)):
-                prev_balance = self.balance_history[i-1]['balance']
-                curr_balance = self.balance_history[i]['balance']
-                
-                if prev_balance > 0:
-                    period_return = (curr_balance - prev_balance) / prev_balance
-                    returns.append(period_return)
-            
-            if len(returns) == 0:
+            stats = self.return_stats
+            if stats.count == 0:
                 return 0.0
             
-            import numpy as np
-            mean_return = np.mean(returns)
-            
-            # Рассчитываем downside deviation (учитываем только отрицательные отклонения)
-            downside_returns = [r - target_return for r in returns if r < target_return]
+            mean_return = stats.mean
             
-            if len(downside_returns) == 0:
+            if stats.downside_count == 0:
                 # Нет негативных периодов - отличный результат
-                return 999.0 if mean_return > target_return else 0.0
+                return 999.0 if mean_return > 0 else 0.0
             
-            downside_deviation = np.sqrt(np.mean(np.array(downside_returns) ** 2))
+            # Downside deviation (учитываем только отрицательные доходности)
+            downside_deviation = stats.downside_deviation
             
             if downside_deviation == 0:
                 return 0.0
             
-            # Sortino Ratio
-            sortino = (mean_return - target_return) / downside_deviation
-            
-            # Аннуализируем
-            periods_per_year = self._estimate_periods_per_year()
-            if periods_per_year > 0:
-                sortino = sortino * np.sqrt(periods_per_year)
+            # Sortino Ratio, аннуализированный
+            sortino = mean_return / downside_deviation * self._annualization_factor()
             
             return float(sortino)
             
@@ -917,6 +1085,7 @@ class BacktestEngine(VirtualTradingBot):
             
             # Рассчитываем нереализованный PnL для всех позиций
             total_unrealized_pnl = 0.0
+            debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
             
             # Группируем позиции по символам для получения цен из свечей
             positions_by_symbol = {}
@@ -952,16 +1121,15 @@ class BacktestEngine(VirtualTradingBot):
                     total_unrealized_pnl += pnl
                     
                     # Логируем для отладки (только первые несколько позиций)
-                    if len([p for p in all_open_positions if p['symbol'] == symbol]) <= 2:
+                    if debug_enabled and len(positions) <= 2:
                         self.logger.debug(
-                            f"🔍 PnL для позиции #{position['id']} ({position['side']}): "
-                            f"entry=${position['entry_price']:.2f}, current=${current_price:.2f}, "
-                            f"size={position['size']:.6f}, pnl=${pnl:.2f}"
+                            "🔍 PnL для позиции #%s (%s): entry=$%.2f, current=$%.2f, size=%.6f, pnl=$%.2f",
+                            position['id'], position['side'], position['entry_price'],
+                            current_price, position['size'], pnl
                         )
             
-            # Получаем реализованный PnL из БД (один раз для всех позиций)
-            stats = self.db.get_virtual_trade_stats(365)
-            total_realized_pnl = stats.get('total_realized_pnl', 0) or 0
+            # Реализованный PnL из БД (один раз для всех позиций, кешируется до закрытия позиции)
+            total_realized_pnl = self._get_realized_pnl()
             
             # Обновляем баланс (один раз для всех символов)
             # ВАЖНО: баланс = начальный баланс + реализованный PnL + нереализованный PnL
@@ -1004,17 +1172,22 @@ class BacktestEngine(VirtualTradingBot):
         except Exception as e:
             self.logger.error(f"❌ Ошибка обновления баланса в бэктесте: {e}")
     
-    def _calculate_calmar_ratio(self) -> float:
+    def _calculate_calmar_ratio(self, max_dd: Optional[float] = None) -> float:
         """
         Рассчитывает коэффициент Кальмара (доходность к максимальной просадке).
         
         Calmar Ratio = Annualized Return / Maximum Drawdown
         
+        Args:
+            max_dd: Уже рассчитанная максимальная просадка в процентах
+                    (если None - рассчитывается заново)
+            
         Returns:
             float: Calmar Ratio (чем выше, тем лучше)
         """
         try:
-            max_dd = self._calculate_max_drawdown()
+            if max_dd is None:
+                max_dd = self._calculate_max_drawdown()
             
             if max_dd == 0:
                 return 0.0
@@ -1,12 +1,20 @@
 from pybit.unified_trading import HTTP, WebSocket
+from requests.adapters import HTTPAdapter
+import asyncio
+import httpx
 from config import Config
 import json
 import logging
 from typing import Dict, Optional, Callable, List
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+# Свечи для анализа рынка: интервал (минуты) и глубина истории
+KLINE_INTERVAL_MINUTES = 15
+KLINE_LIMIT = 100
+
 
 class BybitClient:
     def __init__(self):
@@ -15,46 +23,134 @@ class BybitClient:
             api_key=Config.BYBIT_API_KEY,
             api_secret=Config.BYBIT_API_SECRET
         )
+        # pybit держит один requests.Session на клиента - расширяем его пул,
+        # чтобы параллельные вызовы из обработчиков переиспользовали keep-alive соединения
+        self.session.client.mount(
+            "https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+        # Асинхронный клиент для вызовов из обработчиков Telegram (создается в их цикле событий)
+        self._async_client: httpx.AsyncClient | None = None
+        # Свечи по символу до закрытия текущей свечи: symbol -> (номер свечи, ответ kline)
+        self._kline_cache: Dict[str, tuple] = {}
+        # Пул для запроса свечей параллельно с тикером (потоки создаются по мере надобности)
+        self._kline_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bybit-kline")
         self.logger = logging.getLogger(__name__)
         self.ws = None
         self.position_handlers = []
         self.order_handlers = []
         self.is_ws_running = False
 
+    def close(self):
+        """Закрытие HTTP-сессии и освобождение пула соединений"""
+        try:
+            self.session.client.close()
+        except Exception as e:
+            self.logger.error(f"Ошибка закрытия HTTP-сессии Bybit: {e}")
+
+    async def aclose(self):
+        """Закрытие асинхронного HTTP-клиента"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def get_market_data(self, symbol="ETHUSDT"):
         """Получаем рыночные данные для анализа"""
         try:
-            # Для маржинальной торговли используем linear категорию
-            ticker = self.session.get_tickers(category="linear", symbol=symbol)
+            # Для маржинальной торговли используем linear категорию.
+            # Номер свечи берем до запроса: ответ, пришедший после границы свечи,
+            # относится к предыдущей свече и не должен считаться свежим для новой
+            candle = self._current_candle()
+            kline = self._get_cached_kline(symbol, candle)
+            if kline is None:
+                # Свечи запрашиваем в фоне, пока текущий поток ждет тикер: один RTT вместо двух
+                kline_future = self._kline_pool.submit(
+                    self.session.get_kline,
+                    category="linear",
+                    symbol=symbol,
+                    interval=str(KLINE_INTERVAL_MINUTES),
+                    limit=KLINE_LIMIT
+                )
+                ticker = self.session.get_tickers(category="linear", symbol=symbol)
+                kline = kline_future.result()
+                self._cache_kline(symbol, candle, kline)
+            else:
+                ticker = self.session.get_tickers(category="linear", symbol=symbol)
 
-            kline = self.session.get_kline(
-                category="linear",
-                symbol=symbol,
-                interval="15",
-                limit=100
-            )
+            return self._parse_market_data(symbol, ticker, kline)
 
-            if ('result' in ticker and 'list' in ticker['result'] and
-                len(ticker['result']['list']) > 0 and
-                    'result' in kline and 'list' in kline['result']):
+        except Exception as e:
+            self.logger.error(f"Ошибка получения данных с Bybit: {e}")
+            return {}
 
-                ticker_data = ticker['result']['list'][0]
-                prices = [float(item[4]) for item in kline['result']['list']]
+    def _parse_market_data(self, symbol: str, ticker: Dict, kline: Dict) -> Dict:
+        """Собирает рыночные данные из ответов tickers и kline"""
+        if ('result' in ticker and 'list' in ticker['result'] and
+            len(ticker['result']['list']) > 0 and
+                'result' in kline and 'list' in kline['result']):
 
-                return {
-                    'symbol': symbol,
-                    'price': float(ticker_data.get('lastPrice', 0)),
-                    'price_change_24h': float(ticker_data.get('price24hPcnt', 0)) * 100,
-                    'volume_24h': float(ticker_data.get('volume24h', 0)),
-                    'historical_prices': prices
-                }
-            else:
-                self.logger.error("Unexpected API response structure")
-                return {}
+            ticker_data = ticker['result']['list'][0]
+            price = float(ticker_data.get('lastPrice', 0))
+            prices = [float(item[4]) for item in kline['result']['list']]
+            if prices:
+                # Первая свеча (самая новая) еще не закрыта: ее close - текущая цена тикера.
+                # Так свечи из кеша не отстают от рынка
+                prices[0] = price
+
+            return {
+                'symbol': symbol,
+                'price': price,
+                'price_change_24h': float(ticker_data.get('price24hPcnt', 0)) * 100,
+                'volume_24h': float(ticker_data.get('volume24h', 0)),
+                'historical_prices': prices
+            }
+
+        self.logger.error("Unexpected API response structure")
+        return {}
+
+    @staticmethod
+    def _current_candle() -> int:
+        """Номер текущей свечи KLINE_INTERVAL_MINUTES (меняется на границе свечи)"""
+        return int(time.time() // (KLINE_INTERVAL_MINUTES * 60))
+
+    def _get_cached_kline(self, symbol: str, candle: int) -> Optional[Dict]:
+        """Ответ kline, запрошенный в пределах свечи candle, или None"""
+        cached = self._kline_cache.get(symbol)
+        if cached and cached[0] == candle:
+            return cached[1]
+        return None
+
+    def _cache_kline(self, symbol: str, candle: int, kline: Dict):
+        """Запоминает корректный ответ kline под свечой candle, в которой он был запрошен"""
+        if kline and kline.get('result', {}).get('list'):
+            self._kline_cache[symbol] = (candle, kline)
+
+    def get_linear_symbols(self) -> frozenset:
+        """Получение множества всех торгуемых linear-символов (с пагинацией)"""
+        symbols = set()
+        cursor = ""
+        try:
+            while True:
+                params = {"category": "linear", "limit": 1000}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.session.get_instruments_info(**params)
+
+                if not (response and 'result' in response and 'list' in response['result']):
+                    self.logger.error("Unexpected API response structure")
+                    break
+
+                symbols.update(
+                    item['symbol'] for item in response['result']['list']
+                    if item.get('status', 'Trading') == 'Trading')
+
+                cursor = response['result'].get('nextPageCursor', '')
+                if not cursor:
+                    break
+
+            return frozenset(symbols)
 
         except Exception as e:
-            self.logger.error(f"Ошибка получения данных с Bybit: {e}")
-            return {}
+            self.logger.error(f"❌ Ошибка получения списка символов: {e}")
+            return frozenset(symbols)
 
     def get_symbol_info(self, symbol: str) -> Dict | None:
         """Получение информации о символе, включая минимальные лимиты"""
@@ -134,7 +230,7 @@ class BybitClient:
             self.logger.error(f"❌ Ошибка размещения ордера: {e}")
             return None
 
-    def set_leverage(self, symbol: str, leverage: int):
+    def set_leverage(self, symbol: str, leverage: int) -> bool:
         """Установка левериджа"""
         try:
             self.session.set_leverage(
@@ -145,8 +241,10 @@ class BybitClient:
             )
             self.logger.info(
                 f"✅ Леверидж установлен: {leverage}x для {symbol}")
+            return True
         except Exception as e:
             self.logger.error(f"❌ Ошибка установки левериджа: {e}")
+            return False
 
     def get_positions(self, symbol: str | None = None):
         """Получение открытых позиций"""
@@ -164,26 +262,144 @@ class BybitClient:
             self.logger.error(f"❌ Ошибка получения позиций: {e}")
             return []
 
-    def close_position(self, symbol: str, side: str | None = None):
-        """Закрытие позиции"""
-        try:
-            params = {
-                "category": "linear",
-                "symbol": symbol,
-                "orderType": "Market"
-            }
+    def close_position(self, symbol: str, side: str | None = None) -> Dict:
+        """Закрытие позиции рыночным reduce-only ордером.
 
-            if side:
-                params["side"] = "Buy" if side == "Sell" else "Sell"
-
-            result = self.session.close_position(**params)
+        Returns:
+            Dict: {'success': bool, 'price': средняя цена исполнения или None}
+        """
+        try:
+            result = self.session.place_order(**self._close_order_params(symbol, side))
 
             if result and 'result' in result:
                 self.logger.info(f"✅ Позиция закрыта: {symbol}")
-                return True
-            return False
+                return {
+                    'success': True,
+                    'price': self._get_order_avg_price(symbol, result['result'].get('orderId'))
+                }
+            return {'success': False, 'price': None}
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка закрытия позиции: {e}")
+            return {'success': False, 'price': None}
+
+    def _close_order_params(self, symbol: str, side: str | None) -> Dict:
+        """Параметры рыночного reduce-only ордера, закрывающего позицию"""
+        params = {
+            "category": "linear",
+            "symbol": symbol,
+            "orderType": "Market",
+            # qty=0 + reduceOnly + closeOnTrigger закрывает позицию целиком
+            "qty": "0",
+            "reduceOnly": True,
+            "closeOnTrigger": True
+        }
+
+        if side:
+            params["side"] = "Buy" if side.upper() == "SELL" else "Sell"
+
+        return params
+
+    def _get_order_avg_price(self, symbol: str, order_id: str | None) -> float | None:
+        """Средняя цена исполнения ордера из истории ордеров"""
+        if not order_id:
+            return None
+        try:
+            response = self.session.get_order_history(
+                category="linear", symbol=symbol, orderId=order_id)
+            orders = response.get('result', {}).get('list', []) if response else []
+            avg_price = float(orders[0].get('avgPrice') or 0) if orders else 0
+            return avg_price or None
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка получения цены исполнения ордера: {e}")
+            return None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Общий httpx-клиент с пулом keep-alive соединений"""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.session.endpoint,
+                timeout=5.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._async_client
+
+    async def _request_async(self, method: str, path: str, query: Dict, auth: bool = False) -> Dict:
+        """Запрос к REST API v5 через httpx; сериализация и подпись - как в pybit"""
+        payload = self.session.prepare_payload(method, self.session._clean_query(query))
+        headers = self.session._prepare_headers(payload, self.session.recv_window) if auth else {}
+
+        client = self._get_async_client()
+        if method == "GET":
+            response = await client.get(f"{path}?{payload}" if payload else path, headers=headers)
+        else:
+            response = await client.post(path, content=payload, headers=headers)
+        response.raise_for_status()
+
+        data = response.json()
+        if data.get('retCode') != 0:
+            raise RuntimeError(f"{path}: {data.get('retMsg')} (retCode {data.get('retCode')})")
+        return data
+
+    async def get_market_data_async(self, symbol: str = "ETHUSDT") -> Dict:
+        """Асинхронный вариант get_market_data: тикер и свечи запрашиваются параллельно"""
+        try:
+            candle = self._current_candle()
+            kline = self._get_cached_kline(symbol, candle)
+            if kline is None:
+                ticker, kline = await asyncio.gather(
+                    self._request_async("GET", "/v5/market/tickers",
+                                        {"category": "linear", "symbol": symbol}),
+                    self._request_async("GET", "/v5/market/kline",
+                                        {"category": "linear", "symbol": symbol,
+                                         "interval": str(KLINE_INTERVAL_MINUTES), "limit": KLINE_LIMIT})
+                )
+                self._cache_kline(symbol, candle, kline)
+            else:
+                ticker = await self._request_async("GET", "/v5/market/tickers",
+                                                   {"category": "linear", "symbol": symbol})
+            return self._parse_market_data(symbol, ticker, kline)
+        except Exception as e:
+            self.logger.error(f"Ошибка получения данных с Bybit: {e}")
+            return {}
+
+    async def close_position_async(self, symbol: str, side: str | None = None) -> Dict:
+        """Асинхронный вариант close_position"""
+        try:
+            result = await self._request_async(
+                "POST", "/v5/order/create", self._close_order_params(symbol, side), auth=True)
+            self.logger.info(f"✅ Позиция закрыта: {symbol}")
+
+            order_id = result.get('result', {}).get('orderId')
+            price = None
+            if order_id:
+                try:
+                    history = await self._request_async(
+                        "GET", "/v5/order/history",
+                        {"category": "linear", "symbol": symbol, "orderId": order_id}, auth=True)
+                    orders = history.get('result', {}).get('list', [])
+                    if orders:
+                        price = float(orders[0].get('avgPrice') or 0) or None
+                except Exception as e:
+                    self.logger.error(f"❌ Ошибка получения цены исполнения ордера: {e}")
+
+            return {'success': True, 'price': price}
         except Exception as e:
             self.logger.error(f"❌ Ошибка закрытия позиции: {e}")
+            return {'success': False, 'price': None}
+
+    async def set_leverage_async(self, symbol: str, leverage: int) -> bool:
+        """Асинхронный вариант set_leverage"""
+        try:
+            await self._request_async(
+                "POST", "/v5/position/set-leverage",
+                {"category": "linear", "symbol": symbol,
+                 "buyLeverage": str(leverage), "sellLeverage": str(leverage)},
+                auth=True)
+            self.logger.info(
+                f"✅ Леверидж установлен: {leverage}x для {symbol}")
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка установки левериджа: {e}")
             return False
 
     def get_wallet_balance(self, account_type: str = "UNIFIED"):
@@ -363,8 +579,7 @@ class BybitClient:
                         'low': float(kline[3]),
                         'close': float(kline[4]),
                         'volume': float(kline[5]),
-                        'turnover': float(kline[6]) if len(kline) > 6 else 0,
-                        'datetime': datetime.fromtimestamp(int(kline[0]) / 1000).isoformat()
+                        'turnover': float(kline[6]) if len(kline) > 6 else 0
                     })
                 
                 return formatted_klines
@@ -479,10 +694,8 @@ class BybitClient:
             
             return unique_klines
             
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка загрузки исторических данных за период: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка загрузки исторических данных за период")
             return []
 
     def _interval_to_milliseconds(self, interval: str) -> int:
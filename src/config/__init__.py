@@ -12,6 +12,12 @@ class Config:
     BYBIT_TESTNET = os.getenv('BYBIT_TESTNET', 'true').lower() == 'true'
     DATABASE_URL = os.getenv('DATABASE_URL', '')
 
+    # Диагностика: cProfile + tracemalloc и команда /profile
+    ENABLE_PROFILING = os.getenv('ENABLE_PROFILING', 'false').lower() == 'true'
+
+    # Формат логов: text (по умолчанию) или json для систем сбора логов
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+
     @classmethod
     def validate_config(cls):
         """Validate that all required environment variables are set"""
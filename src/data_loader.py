@@ -9,11 +9,69 @@ DataLoader - умная загрузка исторических данных 
 """
 
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
+import numpy as np
 from bybit_client import BybitClient
 from database import Database
 
+# Сколько символов предзагружать одновременно (загрузка упирается в сеть и БД)
+MAX_PARALLEL_PRELOADS = 4
+
+# Сколько загруженных периодов держать в памяти DataLoader
+MAX_MEMORY_CACHED_RANGES = 64
+
+
+@dataclass
+class Klines:
+    """
+    Свечи одного символа в колоночном виде: по numpy-массиву на поле.
+    
+    Индексация и итерация возвращают свечу словарем в прежнем формате
+    (kline[0]['close']) - для отчетов и старого кода; вычисления
+    работают напрямую с массивами.
+    """
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    turnover: np.ndarray
+    
+    @classmethod
+    def from_list(cls, klines: List[Dict]) -> 'Klines':
+        """Собирает колонки из списка свечей-словарей"""
+        return cls(
+            timestamp=np.array([k['timestamp'] for k in klines], dtype=np.int64),
+            open=np.array([k['open'] for k in klines], dtype=np.float64),
+            high=np.array([k['high'] for k in klines], dtype=np.float64),
+            low=np.array([k['low'] for k in klines], dtype=np.float64),
+            close=np.array([k['close'] for k in klines], dtype=np.float64),
+            volume=np.array([k['volume'] for k in klines], dtype=np.float64),
+            turnover=np.array([k.get('turnover', 0) for k in klines], dtype=np.float64)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.timestamp)
+    
+    def __getitem__(self, index: int) -> Dict:
+        return {
+            'timestamp': int(self.timestamp[index]),
+            'open': float(self.open[index]),
+            'high': float(self.high[index]),
+            'low': float(self.low[index]),
+            'close': float(self.close[index]),
+            'volume': float(self.volume[index]),
+            'turnover': float(self.turnover[index])
+        }
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return (self[i] for i in range(len(self)))
+
 
 class DataLoader:
     """
@@ -36,11 +94,17 @@ class DataLoader:
         self.bybit = bybit_client or BybitClient()
         self.db = database or Database()
         
+        # Уже разобранные свечи по (symbol, interval, start_ms, end_ms): повторная
+        # загрузка того же периода возвращает тот же объект без чтения БД.
+        # Записи символа сбрасываются, когда для него сохраняются новые свечи
+        self._memory_cache: Dict[Tuple[str, str, int, int], Klines] = {}
+        self._memory_cache_lock = threading.Lock()
+        
         self.logger.info("✅ DataLoader инициализирован")
     
     def load_historical_data(self, symbol: str, interval: str, 
                             start_date: datetime, end_date: datetime,
-                            use_cache: bool = True, force_reload: bool = False) -> List[Dict]:
+                            use_cache: bool = True, force_reload: bool = False) -> Klines:
         """
         Загружает исторические данные с оптимальным использованием кеша.
         
@@ -53,8 +117,45 @@ class DataLoader:
             force_reload: Принудительно загрузить с API даже если есть в кеше
             
         Returns:
-            List[Dict]: Список свечей OHLCV
+            Klines: Свечи OHLCV в колоночном виде (время свечи - целочисленный
+                    timestamp в мс; datetime на каждую свечу не создается).
+                    При use_cache повторный вызов с тем же периодом возвращает
+                    тот же объект - массивы не должны изменяться вызывающим кодом
         """
+        key = (symbol, interval, int(start_date.timestamp() * 1000), int(end_date.timestamp() * 1000))
+        
+        if use_cache and not force_reload:
+            with self._memory_cache_lock:
+                cached = self._memory_cache.get(key)
+            if cached is not None:
+                self.logger.info(f"⚡ {symbol} ({interval}): {len(cached)} свечей из памяти")
+                return cached
+        
+        klines = Klines.from_list(
+            self._load_klines(symbol, interval, start_date, end_date, use_cache, force_reload)
+        )
+        
+        if use_cache and klines:
+            with self._memory_cache_lock:
+                self._memory_cache[key] = klines
+                # Вытесняем самые старые периоды (dict хранит порядок вставки)
+                while len(self._memory_cache) > MAX_MEMORY_CACHED_RANGES:
+                    del self._memory_cache[next(iter(self._memory_cache))]
+        
+        return klines
+    
+    def _save_klines(self, symbol: str, interval: str, klines: List[Dict]) -> int:
+        """Сохраняет свечи в кеш БД и сбрасывает загруженные периоды символа в памяти"""
+        saved_count = self.db.save_historical_klines(symbol, interval, klines)
+        with self._memory_cache_lock:
+            for key in [key for key in self._memory_cache if key[:2] == (symbol, interval)]:
+                del self._memory_cache[key]
+        return saved_count
+    
+    def _load_klines(self, symbol: str, interval: str,
+                     start_date: datetime, end_date: datetime,
+                     use_cache: bool, force_reload: bool) -> List[Dict]:
+        """Загружает свечи списком словарей: из кеша, с API или комбинируя их"""
         try:
             # Конвертируем даты в миллисекунды
             start_ms = int(start_date.timestamp() * 1000)
@@ -76,18 +177,14 @@ class DataLoader:
                 self.logger.info("📡 Загрузка только с API (кеш отключён)")
                 return self.bybit.get_historical_klines_range(symbol, interval, start_date, end_date)
             
-            # Проверяем наличие данных в кеше
-            cache_info = self.db.check_cache_coverage(symbol, interval, start_ms, end_ms)
+            # Читаем кеш сразу: покрытие видно по самим свечам,
+            # отдельный запрос check_cache_coverage не нужен
+            cached_data = self.db.get_historical_klines_from_cache(
+                symbol, interval, start_ms, end_ms
+            )
             
-            if cache_info['has_data']:
-                self.logger.info(
-                    f"💾 Найдено {cache_info['cached_count']} свечей в кеше"
-                )
-                
-                # Загружаем из кеша
-                cached_data = self.db.get_historical_klines_from_cache(
-                    symbol, interval, start_ms, end_ms
-                )
+            if cached_data:
+                self.logger.info(f"💾 Найдено {len(cached_data)} свечей в кеше")
                 
                 # Проверяем полноту данных
                 if self._is_data_complete(cached_data, start_ms, end_ms, interval):
@@ -98,16 +195,14 @@ class DataLoader:
                         "⚠️ Данные в кеше неполные, догружаем с API"
                     )
                     return self._fill_missing_data(
-                        symbol, interval, start_date, end_date, cached_data
+                        symbol, interval, start_ms, end_ms, cached_data
                     )
             else:
                 self.logger.info("📡 Данных нет в кеше, загружаем с API")
                 return self._load_from_api_and_cache(symbol, interval, start_date, end_date)
                 
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка загрузки исторических данных: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка загрузки исторических данных")
             return []
     
     def _load_from_api_and_cache(self, symbol: str, interval: str,
@@ -135,7 +230,7 @@ class DataLoader:
                 return []
             
             # Сохраняем в кеш
-            saved_count = self.db.save_historical_klines(symbol, interval, klines)
+            saved_count = self._save_klines(symbol, interval, klines)
             self.logger.info(f"💾 Сохранено {saved_count} свечей в кеш")
             
             return klines
@@ -145,7 +240,7 @@ class DataLoader:
             return []
     
     def _fill_missing_data(self, symbol: str, interval: str,
-                          start_date: datetime, end_date: datetime,
+                          start_ms: int, end_ms: int,
                           cached_data: List[Dict]) -> List[Dict]:
         """
         Догружает недостающие данные к уже загруженным из кеша.
@@ -153,8 +248,8 @@ class DataLoader:
         Args:
             symbol: Торговая пара
             interval: Таймфрейм
-            start_date: Начальная дата
-            end_date: Конечная дата
+            start_ms: Начальная временная метка
+            end_ms: Конечная временная метка
             cached_data: Данные из кеша
             
         Returns:
@@ -163,10 +258,7 @@ class DataLoader:
         try:
             # Находим пропуски в данных
             missing_ranges = self._find_missing_ranges(
-                cached_data, 
-                int(start_date.timestamp() * 1000),
-                int(end_date.timestamp() * 1000),
-                interval
+                cached_data, start_ms, end_ms, interval
             )
             
             if not missing_ranges:
@@ -193,7 +285,7 @@ class DataLoader:
                 
                 if missing_data:
                     # Сохраняем в кеш
-                    self.db.save_historical_klines(symbol, interval, missing_data)
+                    self._save_klines(symbol, interval, missing_data)
                     all_data.extend(missing_data)
             
             # Сортируем и удаляем дубликаты
@@ -320,7 +412,7 @@ class DataLoader:
         return unique_data
     
     def preload_data_for_backtest(self, symbols: List[str], interval: str,
-                                  start_date: datetime, end_date: datetime) -> Dict[str, List[Dict]]:
+                                  start_date: datetime, end_date: datetime) -> Dict[str, Klines]:
         """
         Предзагружает данные для нескольких символов (для бэктеста).
         
@@ -331,7 +423,7 @@ class DataLoader:
             end_date: Конечная дата
             
         Returns:
-            Dict[str, List[Dict]]: Словарь {symbol: klines}
+            Dict[str, Klines]: Словарь {symbol: klines}
         """
         try:
             self.logger.info(
@@ -341,17 +433,23 @@ class DataLoader:
             
             all_data = {}
             
-            for i, symbol in enumerate(symbols, 1):
-                self.logger.info(f"📊 [{i}/{len(symbols)}] Загрузка {symbol}...")
-                
-                klines = self.load_historical_data(
-                    symbol=symbol,
-                    interval=interval,
-                    start_date=start_date,
-                    end_date=end_date,
-                    use_cache=True
-                )
-                
+            # Символы независимы - загружаем параллельно, время ~ самого медленного символа
+            with ThreadPoolExecutor(max_workers=min(len(symbols), MAX_PARALLEL_PRELOADS) or 1,
+                                    thread_name_prefix="preload") as pool:
+                futures = [
+                    pool.submit(
+                        self.load_historical_data,
+                        symbol=symbol,
+                        interval=interval,
+                        start_date=start_date,
+                        end_date=end_date,
+                        use_cache=True
+                    )
+                    for symbol in symbols
+                ]
+            
+            for symbol, future in zip(symbols, futures):
+                klines = future.result()
                 if klines:
                     all_data[symbol] = klines
                     self.logger.info(f"✅ {symbol}: {len(klines)} свечей")
@@ -377,6 +475,8 @@ class DataLoader:
         """
         try:
             deleted_count = self.db.clear_historical_cache(older_than_days=days)
+            with self._memory_cache_lock:
+                self._memory_cache.clear()
             self.logger.info(f"🗑️ Очищено {deleted_count} старых записей из кеша (>{days} дней)")
         except Exception as e:
             self.logger.error(f"❌ Ошибка очистки кеша: {e}")
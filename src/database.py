@@ -228,6 +228,9 @@ class Database:
     def _init_sqlite(self):
         """Инициализация SQLite"""
         queries = [
+            # WAL сохраняется в файле БД: запись не блокирует чтение,
+            # а коммит не требует fsync основного файла
+            "PRAGMA journal_mode=WAL",
             '''
             CREATE TABLE IF NOT EXISTS positions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -310,6 +313,9 @@ class Database:
                 self._init_sqlite()
             self.logger.info("✅ База данных инициализирована")
 
+            # Создаем предагрегированную таблицу открытых позиций
+            self._create_open_positions_mv()
+
             # Создаем таблицу для виртуальных позиций
             self._create_virtual_positions_table()
             
@@ -319,6 +325,152 @@ class Database:
             self.logger.error(f"❌ Ошибка инициализации БД: {e}")
             raise
 
+    # Колонки positions, зеркалируемые в open_positions_mv
+    _OPEN_POSITIONS_MV_COLUMNS = (
+        "id, symbol, side, size, entry_price, current_price, stop_loss, take_profit, "
+        "leverage, status, pnl, pnl_percent, created_at, updated_at"
+    )
+
+    def _create_open_positions_mv(self):
+        """Создание таблицы open_positions_mv, которую триггеры синхронизируют с positions.
+
+        В таблице лежат только открытые позиции (с уже рассчитанными pnl/pnl_percent),
+        поэтому get_open_positions читает её целиком без сканирования всей истории.
+        Таблица, триггеры и начальное заполнение создаются один раз в одной транзакции:
+        повторные Database() (например, на каждый запрос Web UI) не трогают positions.
+        """
+        columns = self._OPEN_POSITIONS_MV_COLUMNS
+        try:
+            if self._open_positions_mv_exists():
+                return
+
+            if self.db_type == 'postgresql':
+                new_values = ", ".join(
+                    f"NEW.{column.strip()}" for column in columns.split(","))
+                queries = [
+                    """
+                    CREATE TABLE IF NOT EXISTS open_positions_mv (
+                        id INTEGER PRIMARY KEY,
+                        symbol VARCHAR(20) NOT NULL,
+                        side VARCHAR(10) NOT NULL,
+                        size DECIMAL(20, 8) NOT NULL,
+                        entry_price DECIMAL(20, 8) NOT NULL,
+                        current_price DECIMAL(20, 8) NOT NULL,
+                        stop_loss DECIMAL(20, 8),
+                        take_profit DECIMAL(20, 8),
+                        leverage INTEGER DEFAULT 10,
+                        status VARCHAR(20) DEFAULT 'open',
+                        pnl DECIMAL(20, 8) DEFAULT 0,
+                        pnl_percent DECIMAL(10, 4) DEFAULT 0,
+                        created_at TIMESTAMP,
+                        updated_at TIMESTAMP
+                    )
+                    """,
+                    f"""
+                    CREATE OR REPLACE FUNCTION sync_open_positions_mv() RETURNS TRIGGER AS $$
+                    BEGIN
+                        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                            DELETE FROM open_positions_mv WHERE id = OLD.id;
+                        END IF;
+                        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'open' THEN
+                            INSERT INTO open_positions_mv ({columns}) VALUES ({new_values});
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql
+                    """,
+                    "DROP TRIGGER IF EXISTS trg_sync_open_positions_mv ON positions",
+                    """
+                    CREATE TRIGGER trg_sync_open_positions_mv
+                    AFTER INSERT OR UPDATE OR DELETE ON positions
+                    FOR EACH ROW EXECUTE FUNCTION sync_open_positions_mv()
+                    """
+                ]
+            else:
+                queries = [
+                    """
+                    CREATE TABLE IF NOT EXISTS open_positions_mv (
+                        id INTEGER PRIMARY KEY,
+                        symbol TEXT NOT NULL,
+                        side TEXT NOT NULL,
+                        size REAL NOT NULL,
+                        entry_price REAL NOT NULL,
+                        current_price REAL NOT NULL,
+                        stop_loss REAL,
+                        take_profit REAL,
+                        leverage INTEGER DEFAULT 10,
+                        status TEXT DEFAULT 'open',
+                        pnl REAL DEFAULT 0,
+                        pnl_percent REAL DEFAULT 0,
+                        created_at TIMESTAMP,
+                        updated_at TIMESTAMP
+                    )
+                    """,
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_open_positions_mv_insert
+                    AFTER INSERT ON positions WHEN NEW.status = 'open'
+                    BEGIN
+                        INSERT OR REPLACE INTO open_positions_mv ({columns})
+                        SELECT {columns} FROM positions WHERE id = NEW.id;
+                    END
+                    """,
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_open_positions_mv_update
+                    AFTER UPDATE ON positions
+                    BEGIN
+                        DELETE FROM open_positions_mv WHERE id = OLD.id;
+                        INSERT INTO open_positions_mv ({columns})
+                        SELECT {columns} FROM positions WHERE id = NEW.id AND status = 'open';
+                    END
+                    """,
+                    """
+                    CREATE TRIGGER IF NOT EXISTS trg_open_positions_mv_delete
+                    AFTER DELETE ON positions
+                    BEGIN
+                        DELETE FROM open_positions_mv WHERE id = OLD.id;
+                    END
+                    """
+                ]
+
+            # Начальное заполнение позициями, открытыми до появления триггеров
+            # (конфликт id - таблицу параллельно создал другой процесс)
+            if self.db_type == 'postgresql':
+                queries.append(
+                    f"INSERT INTO open_positions_mv ({columns}) "
+                    f"SELECT {columns} FROM positions WHERE status = 'open' "
+                    f"ON CONFLICT (id) DO NOTHING")
+            else:
+                queries.append(
+                    f"INSERT OR IGNORE INTO open_positions_mv ({columns}) "
+                    f"SELECT {columns} FROM positions WHERE status = 'open'")
+
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                for query in queries:
+                    cursor.execute(query)
+                cursor.close()
+
+            self.logger.info("✅ Таблица open_positions_mv и триггеры созданы")
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка создания таблицы open_positions_mv: {e}")
+
+    def _open_positions_mv_exists(self) -> bool:
+        """Проверяет по каталогу БД, создана ли уже таблица open_positions_mv"""
+        if self.db_type == 'postgresql':
+            query = """
+            SELECT EXISTS (
+                SELECT FROM information_schema.tables
+                WHERE table_schema = 'public'
+                AND table_name = 'open_positions_mv'
+            );
+            """
+            result = self._execute_query(query)
+            return bool(result and result[0]['exists'])
+
+        query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'open_positions_mv'"
+        return bool(self._execute_query(query))
+
     def get_trade_stats(self, days: int = 7) -> Dict:
         """Получение статистики торгов за период"""
         try:
@@ -413,7 +565,10 @@ class Database:
                 return conn
             else:
                 import sqlite3
-                return sqlite3.connect(self.db_config)
+                conn = sqlite3.connect(self.db_config)
+                # В режиме WAL NORMAL безопасен для целостности и не делает fsync на каждый коммит
+                conn.execute("PRAGMA synchronous=NORMAL")
+                return conn
         except Exception as e:
             self.logger.error(f"❌ Ошибка подключения к БД: {e}")
             raise
@@ -536,8 +691,8 @@ class Database:
         return position_id
 
     def get_open_positions(self) -> List[Dict]:
-        """Получение всех открытых позиций"""
-        query = "SELECT * FROM positions WHERE status = 'open' ORDER BY created_at DESC"
+        """Получение всех открытых позиций из open_positions_mv"""
+        query = "SELECT * FROM open_positions_mv ORDER BY created_at DESC"
         result = self._execute_query(query)
         return self._convert_rows(result) if result else []
 
@@ -652,6 +807,19 @@ class Database:
             return res
         return ''
 
+    def get_settings(self, keys: List[str] | None = None) -> Dict[str, str]:
+        """Несколько настроек одним запросом: {key: value} (без keys - все настройки)"""
+        if keys is None:
+            return {row['key']: row['value'] for row in self._execute_query(
+                "SELECT key, value FROM settings")}
+        if not keys:
+            return {}
+
+        placeholder = '%s' if self.db_type == 'postgresql' else '?'
+        query = (f"SELECT key, value FROM settings "
+                 f"WHERE key IN ({', '.join([placeholder] * len(keys))})")
+        return {row['key']: row['value'] for row in self._execute_query(query, tuple(keys))}
+
     def set_setting(self, key: str, value: str):
         if self.db_type == 'postgresql':
             query = """
@@ -665,30 +833,52 @@ class Database:
             INSERT OR REPLACE INTO settings (key, value, updated_at)
             VALUES (?, ?, CURRENT_TIMESTAMP)
             """
-            params = (key, value, value)
+            params = (key, value)
 
         self._execute_query(query, params, fetch=False)
 
-    def add_allowed_user(self, user_id: int, username: str | None = None, is_admin: bool = False):
+    def add_allowed_user(self, user_id: int, username: str | None = None, is_admin: bool = False) -> bool:
         """Добавляет пользователя в белый список"""
         params: tuple
+        try:
+            if self.db_type == 'postgresql':
+                query = """
+                INSERT INTO allowed_users (user_id, username, is_admin)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = %s,
+                    is_admin = %s
+                """
+                params = (user_id, username, is_admin, username, is_admin)
+            else:
+                query = """
+                INSERT OR REPLACE INTO allowed_users (user_id, username, is_admin)
+                VALUES (?, ?, ?)
+                """
+                params = (user_id, username, is_admin)
+
+            self._execute_query(query, params, fetch=False)
+            return True
+        except Exception as e:
+            self.logger.error(f"Ошибка добавления пользователя: {e}")
+            return False
+
+    def upsert_user(self, user_id: int, username: str | None = None):
+        """Добавляет пользователя или обновляет его имя одним запросом (права не меняются)"""
         if self.db_type == 'postgresql':
             query = """
-            INSERT INTO allowed_users (user_id, username, is_admin)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) DO UPDATE SET
-                username = %s,
-                is_admin = %s
+            INSERT INTO allowed_users (user_id, username)
+            VALUES (%s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username
             """
-            params = (user_id, username, is_admin, username, is_admin)
         else:
             query = """
-            INSERT OR REPLACE INTO allowed_users (user_id, username, is_admin)
-            VALUES (?, ?, ?)
+            INSERT INTO allowed_users (user_id, username)
+            VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET username = excluded.username
             """
-            params = (user_id, username, is_admin)
 
-        self._execute_query(query, params, fetch=False)
+        self._execute_query(query, (user_id, username), fetch=False)
 
     def is_user_allowed(self, user_id: int) -> bool:
         if self.db_type == 'postgresql':
@@ -937,17 +1127,20 @@ class Database:
 
             params = (symbol, side, size, entry_price, entry_price,
                       leverage, stop_loss, take_profit, entry_fee, entry_fee, created_at)
-            result = self._execute_query(query, params, fetch=True)
 
             position_id = None
-            if result:
-                if self.db_type == 'postgresql':
-                    # PostgreSQL с RETURNING - результат уже в виде dict
-                    position_id = result.get('id') if isinstance(result, dict) else None
-                else:
-                    # SQLite - получаем lastrowid
-                    position_id = self._execute_query(
-                        "SELECT last_insert_rowid() as id")[0]['id']
+            if self.db_type == 'postgresql':
+                # PostgreSQL с RETURNING - результат уже в виде dict
+                result = self._execute_query(query, params, fetch=True)
+                position_id = result.get('id') if isinstance(result, dict) else None
+            else:
+                # SQLite: last_insert_rowid() виден только в том же соединении,
+                # поэтому вставка и lastrowid - в одной транзакции
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(query, params)
+                    position_id = cursor.lastrowid
+                    cursor.close()
 
             self.logger.info(
                 f"✅ Виртуальная позиция #{position_id} добавлена: {side} {size} {symbol}")
@@ -1082,7 +1275,9 @@ class Database:
             # Вычитаем все комиссии из PnL
             total_fees = entry_fee + exit_fee
             pnl_net = pnl_gross - total_fees
-            pnl_percent = (pnl_net / (entry_price * size)) * 100 if (entry_price * size) > 0 else 0
+            # Размер из БД может быть нулевым (ручные правки) - деление только при ненулевом номинале
+            notional = entry_price * size
+            pnl_percent = pnl_net / notional * 100 if notional > 0 else 0
             
             # Проверка корректности причины закрытия
             if close_reason == "take_profit" and pnl_net < 0:
@@ -1140,6 +1335,71 @@ class Database:
         except Exception as e:
             self.logger.error(f"❌ Ошибка закрытия виртуальной позиции: {e}")
 
+    def add_closed_virtual_positions(self, positions: List[Dict]) -> int:
+        """Пакетная запись уже закрытых виртуальных позиций (одна транзакция, executemany)
+        
+        Args:
+            positions: Словари с ключами symbol, side, size, entry_price, exit_price,
+                       leverage, realized_pnl, pnl_percent, entry_fee, exit_fee,
+                       close_reason, created_at, closed_at
+            
+        Returns:
+            int: Количество записанных позиций
+        """
+        try:
+            for position in positions:
+                self._validate_position_params(
+                    position['symbol'], position['side'], position['size'],
+                    position['entry_price'], position['leverage'], None, None)
+            
+            if self.db_type == 'postgresql':
+                query = """
+                INSERT INTO virtual_positions (symbol, side, size, entry_price, current_price, exit_price,
+                                               leverage, status, realized_pnl, pnl_percent, entry_fee, exit_fee,
+                                               total_fees, close_reason, created_at, closed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, 'closed', %s, %s, %s, %s, %s, %s, %s, %s)
+                """
+            else:
+                query = """
+                INSERT INTO virtual_positions (symbol, side, size, entry_price, current_price, exit_price,
+                                               leverage, status, realized_pnl, pnl_percent, entry_fee, exit_fee,
+                                               total_fees, close_reason, created_at, closed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'closed', ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+            
+            params = [
+                (
+                    position['symbol'],
+                    position['side'],
+                    position['size'],
+                    position['entry_price'],
+                    position['exit_price'],
+                    position['exit_price'],
+                    position['leverage'],
+                    position['realized_pnl'],
+                    position['pnl_percent'],
+                    position['entry_fee'],
+                    position['exit_fee'],
+                    position['entry_fee'] + position['exit_fee'],
+                    position['close_reason'],
+                    position['created_at'],
+                    position['closed_at']
+                )
+                for position in positions
+            ]
+            
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(query, params)
+                cursor.close()
+            
+            self.logger.info(f"✅ Записано {len(params)} закрытых виртуальных позиций")
+            return len(params)
+            
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка пакетной записи виртуальных позиций: {e}")
+            return 0
+
     def get_virtual_trade_stats(self, days: int = 30) -> Dict:
         """Получение статистики виртуальной торговли с учетом комиссий"""
         try:
@@ -1238,10 +1498,8 @@ class Database:
                 return False
             
             return True
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка очистки виртуальных позиций: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка очистки виртуальных позиций")
             return False
 
     def _create_historical_klines_table(self):
@@ -1316,49 +1574,48 @@ class Database:
             int: Количество сохранённых свечей
         """
         try:
-            saved_count = 0
+            if self.db_type == 'postgresql':
+                query = """
+                INSERT INTO historical_klines 
+                (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume, turnover)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (symbol, interval, timestamp) DO UPDATE SET
+                    open_price = EXCLUDED.open_price,
+                    high_price = EXCLUDED.high_price,
+                    low_price = EXCLUDED.low_price,
+                    close_price = EXCLUDED.close_price,
+                    volume = EXCLUDED.volume,
+                    turnover = EXCLUDED.turnover
+                """
+            else:
+                query = """
+                INSERT OR REPLACE INTO historical_klines 
+                (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume, turnover)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
             
-            for kline in klines:
-                try:
-                    if self.db_type == 'postgresql':
-                        query = """
-                        INSERT INTO historical_klines 
-                        (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume, turnover)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (symbol, interval, timestamp) DO UPDATE SET
-                            open_price = EXCLUDED.open_price,
-                            high_price = EXCLUDED.high_price,
-                            low_price = EXCLUDED.low_price,
-                            close_price = EXCLUDED.close_price,
-                            volume = EXCLUDED.volume,
-                            turnover = EXCLUDED.turnover
-                        """
-                    else:
-                        query = """
-                        INSERT OR REPLACE INTO historical_klines 
-                        (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume, turnover)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """
-                    
-                    params = (
-                        symbol,
-                        interval,
-                        kline['timestamp'],
-                        kline['open'],
-                        kline['high'],
-                        kline['low'],
-                        kline['close'],
-                        kline['volume'],
-                        kline.get('turnover', 0)
-                    )
-                    
-                    self._execute_query(query, params, fetch=False)
-                    saved_count += 1
-                    
-                except Exception as e:
-                    self.logger.warning(f"⚠️ Ошибка сохранения свечи {kline.get('timestamp')}: {e}")
-                    continue
+            params = [
+                (
+                    symbol,
+                    interval,
+                    kline['timestamp'],
+                    kline['open'],
+                    kline['high'],
+                    kline['low'],
+                    kline['close'],
+                    kline['volume'],
+                    kline.get('turnover', 0)
+                )
+                for kline in klines
+            ]
             
+            # Все свечи пишутся одним соединением и одной транзакцией
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(query, params)
+                cursor.close()
+            
+            saved_count = len(params)
             self.logger.info(f"✅ Сохранено {saved_count}/{len(klines)} свечей для {symbol} ({interval})")
             return saved_count
             
@@ -1409,24 +1666,29 @@ class Database:
                 query += f" LIMIT {'%s' if self.db_type == 'postgresql' else '?'}"
                 params.append(limit)
             
-            result = self._execute_query(query, tuple(params))
+            # Строки читаются кортежами одним запросом, без промежуточного словаря на строку
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, tuple(params))
+                rows = cursor.fetchall()
+                cursor.close()
             
-            if not result:
+            if not rows:
                 return []
             
             # Преобразуем в формат, совместимый с Bybit API
-            klines = []
-            for row in result:
-                klines.append({
-                    'timestamp': int(row['timestamp']),
-                    'open': float(row['open_price']),
-                    'high': float(row['high_price']),
-                    'low': float(row['low_price']),
-                    'close': float(row['close_price']),
-                    'volume': float(row['volume']),
-                    'turnover': float(row.get('turnover', 0)),
-                    'datetime': datetime.fromtimestamp(int(row['timestamp']) / 1000).isoformat()
-                })
+            klines = [
+                {
+                    'timestamp': int(timestamp),
+                    'open': float(open_price),
+                    'high': float(high_price),
+                    'low': float(low_price),
+                    'close': float(close_price),
+                    'volume': float(volume),
+                    'turnover': float(turnover or 0)
+                }
+                for timestamp, open_price, high_price, low_price, close_price, volume, turnover in rows
+            ]
             
             self.logger.info(f"✅ Загружено {len(klines)} свечей из кеша для {symbol} ({interval})")
             return klines
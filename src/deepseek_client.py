@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import re
 from config import Config
@@ -7,12 +9,21 @@ import logging
 from typing import Dict, Any
 import time
 
+# Повторы запроса к API при перегрузке/сбое шлюза с экспоненциальной паузой.
+# Таймаут чтения не повторяется: ответ модели может идти минутами
+API_RETRY = Retry(total=3, read=0, backoff_factor=0.2,
+                  status_forcelist=(429, 502, 503, 504),
+                  allowed_methods=frozenset({'POST'}), raise_on_status=False)
+
 
 class DeepSeekClient:
     def __init__(self, db: Database | None = None):
         self.db = db or Database()
         self.logger = logging.getLogger(__name__)
         self.base_url = "https://api.deepseek.com/chat/completions"
+        # Одна сессия на клиента: запросы к API идут по keep-alive соединению без повторного TLS
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=API_RETRY))
         self._load_settings()
         self.request_timeout = 300  # 5 минут для сложных анализов
 
@@ -84,20 +95,19 @@ class DeepSeekClient:
             payload["reasoning"] = True
 
         try:
-            self.logger.info(
-                f"🔗 Отправляем запрос к DeepSeek API (модель: {self.model})...")
-            start_time = time.time()
+            self.logger.info("🔗 Отправляем запрос к DeepSeek API (модель: %s)...", self.model)
+            start_time = time.monotonic()
 
-            response = requests.post(
+            response = self._http.post(
                 self.base_url,
                 json=payload,
                 headers=headers,
                 timeout=self.request_timeout
             )
 
-            response_time = time.time() - start_time
-            self.logger.info(
-                f"📨 Ответ получен за {response_time:.2f}с, статус: {response.status_code}")
+            response_time = time.monotonic() - start_time
+            self.logger.info("📨 Ответ получен за %.2fс, статус: %s",
+                             response_time, response.status_code)
 
             if response.status_code != 200:
                 self.logger.error(f"❌ HTTP ошибка: {response.status_code}")
@@ -155,10 +165,8 @@ class DeepSeekClient:
                 "reason": "Ошибка формата JSON",
                 "error": "json_decode_error"
             }
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка при запросе к DeepSeek: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            self.logger.exception("❌ Ошибка при запросе к DeepSeek")
             return {
                 "action": "HOLD",
                 "confidence": 0.0,
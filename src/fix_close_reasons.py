@@ -8,7 +8,6 @@
 """
 
 import sys
-sys.path.append('src')
 
 from database import Database
 from datetime import datetime
@@ -0,0 +1,92 @@
+"""
+Потоковые технические индикаторы.
+
+Каждый индикатор хранит только свое состояние и обновляется за O(1)
+на новую цену, без пересчета по всему окну:
+    rsi = IncrementalRSI(14)
+    for price in prices:
+        value = rsi.update(price)   # None, пока окно не заполнено
+"""
+from typing import Optional
+
+
+class IncrementalEMA:
+    """Экспоненциальная скользящая средняя (первое значение - SMA за period цен)"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value: Optional[float] = None
+        self._count = 0
+        self._seed_sum = 0.0
+
+    def update(self, price: float) -> Optional[float]:
+        if self.value is not None:
+            self.value += self.alpha * (price - self.value)
+            return self.value
+
+        self._count += 1
+        self._seed_sum += price
+        if self._count == self.period:
+            self.value = self._seed_sum / self.period
+        return self.value
+
+
+class IncrementalRSI:
+    """RSI по Уайлдеру: сглаженные средние роста и падения цены"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value: Optional[float] = None
+        self._prev_price: Optional[float] = None
+        self._count = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    def update(self, price: float) -> Optional[float]:
+        if self._prev_price is None:
+            self._prev_price = price
+            return None
+
+        change = price - self._prev_price
+        self._prev_price = price
+        gain = max(change, 0.0)
+        loss = max(-change, 0.0)
+
+        if self._count < self.period:
+            # Первые period изменений - простое среднее
+            self._count += 1
+            self._avg_gain += gain / self.period
+            self._avg_loss += loss / self.period
+            if self._count < self.period:
+                return None
+        else:
+            self._avg_gain = (self._avg_gain * (self.period - 1) + gain) / self.period
+            self._avg_loss = (self._avg_loss * (self.period - 1) + loss) / self.period
+
+        if self._avg_loss == 0:
+            self.value = 100.0 if self._avg_gain > 0 else 50.0
+        else:
+            self.value = 100 - 100 / (1 + self._avg_gain / self._avg_loss)
+        return self.value
+
+
+class IncrementalMACD:
+    """MACD как разница быстрой и медленной EMA (сигнальная линия - EMA от MACD)"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = IncrementalEMA(fast)
+        self._slow = IncrementalEMA(slow)
+        self._signal = IncrementalEMA(signal)
+        self.value: Optional[float] = None
+        self.signal: Optional[float] = None
+
+    def update(self, price: float) -> Optional[float]:
+        fast = self._fast.update(price)
+        slow = self._slow.update(price)
+        if fast is None or slow is None:
+            return None
+
+        self.value = fast - slow
+        self.signal = self._signal.update(self.value)
+        return self.value
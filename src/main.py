@@ -10,6 +10,7 @@ from config import Config
 import os
 
 from virtual_trading_bot import VirtualTradingBot
+from utils.log_format import JsonFormatter
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,6 +23,10 @@ logging.basicConfig(
     ]
 )
 
+if Config.LOG_FORMAT == 'json':
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(JsonFormatter())
+
 logger = logging.getLogger(__name__)
 
 
@@ -1,88 +1,469 @@
+import asyncio
+import functools
 import logging
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
+import random
+from telegram import Chat, Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from config import Config
 from trading_strategy import TradingBot
 from database import Database
+from utils.performance import log_latency
+from utils.profiling import Profiler
 import json
+import os
+import re
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from virtual_trading_bot import VirtualTradingBot
 
-# Состояния для ConversationHandler
+try:
+    # Цикл событий на libuv: меньше накладных расходов на сокеты и колбэки (нет под Windows)
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+# Состояния диалога смены торговой пары
 SET_SYMBOL, SET_LEVERAGE = range(2)
 
+# Сообщения старше этого возраста (повторная доставка после простоя) не получают ответа
+STALE_MESSAGE_SECONDS = 10
+
+# Long polling: сервер держит запрос getUpdates открытым до этого времени
+POLLING_TIMEOUT_SECONDS = 30
+
+# Формат торговой пары и период обновления списка символов биржи
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]{2,20}USDT$')
+SYMBOLS_CACHE_TTL_SECONDS = 3600
+
+# Время жизни снимка баланса для /balance и рыночных данных символа
+BALANCE_CACHE_TTL_SECONDS = 3.0
+MARKET_DATA_CACHE_TTL_SECONDS = 1.0
+
+# Максимум одновременных запросов к бирже при /close_all
+CLOSE_ALL_CONCURRENCY = 5
+
+# Разделитель записей в списках и безопасный размер одного сообщения (лимит Telegram - 4096)
+MESSAGE_SEPARATOR = "────────────────────\n"
+MESSAGE_CHUNK_LIMIT = 4000
+
+# Очередь отправки: попытки при сетевых ошибках, потолок паузы и простой, после которого воркер чата завершается
+SEND_MAX_ATTEMPTS = 5
+SEND_MAX_BACKOFF_SECONDS = 30
+CHAT_WORKER_IDLE_SECONDS = 60
+
+# Статические тексты ответов
+START_MESSAGE = (
+    "🤖 *Торговый бот запущен*\n\n"
+    "*Основные команды:*\n"
+    "• /balance - текущий баланс\n"
+    "• /positions - открытые позиции\n"
+    "• /close [id] - закрыть позицию по ID\n"
+    "• /close_all - закрыть все позиции\n"
+    "• /reverse - переворот позиции\n\n"
+    "*Настройки:*\n"
+    "• /settings - текущие настройки\n\n"
+    "*Администратор:*\n"
+    "• /set [ключ] [значение] - изменить настройку\n"
+    "• /set_symbol - изменить торговую пару\n"
+    "• /admin_users - управление пользователями\n"
+    "• /reset_settings - сброс настроек\n"
+    "• /profile [top|mem] - профиль CPU/памяти\n\n"
+    "Используйте /settings для просмотра всех доступных настроек."
+)
+
+ADMIN_USERS_HELP = (
+    "\nКоманды управления:\n"
+    "• `/admin_users add <user_id> <username>` - добавить пользователя\n"
+    "• `/admin_users remove <user_id>` - удалить пользователя\n"
+    "• `/admin_users admin <user_id>` - сделать администратором\n"
+    "• `/admin_users user <user_id>` - убрать права администратора\n"
+)
+
+# Группировка настроек в ответе /settings: (заголовок, ключи)
+SETTINGS_CATEGORIES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ('📊 Торговые настройки', (
+        'trading_symbols', 'default_symbol', 'min_confidence', 'leverage',
+        'trading_interval_minutes'
+    )),
+    ('🛡️ Риск-менеджмент', (
+        'risk_percent', 'max_position_percent', 'max_total_position_percent',
+        'min_trade_usdt', 'stop_loss_percent', 'take_profit_percent',
+        'trailing_stop_activation_percent', 'trailing_stop_distance_percent'
+    )),
+    ('🔧 Поведение', (
+        'allow_short_positions', 'allow_long_positions', 'auto_position_reversal'
+    )),
+    ('🔔 Уведомления', (
+        'enable_notifications', 'enable_trade_logging'
+    )),
+    ('🤖 DeepSeek', (
+        'deepseek_model', 'deepseek_max_tokens', 'deepseek_temperature',
+        'enable_deepseek_reasoning'
+    )),
+    ('💰 Баланс', (
+        'initial_balance',
+    )),
+)
+
+# Валидация числовых настроек /set: ключ -> (парсер, проверка, текст ошибки)
+LEVERAGE_RULE = (int, lambda v: 1 <= v <= 100, "❌ Леверидж должен быть от 1 до 100")
+UNIT_INTERVAL_RULE = (float, lambda v: 0 <= v <= 1, "❌ {key} должен быть между 0 и 1")
+NON_NEGATIVE_RULE = (float, lambda v: v >= 0, "❌ {key} должен быть положительным числом")
+SETTING_PARSERS = {
+    'leverage': LEVERAGE_RULE,
+    'min_confidence': UNIT_INTERVAL_RULE,
+    'deepseek_temperature': UNIT_INTERVAL_RULE,
+    **dict.fromkeys((
+        'risk_percent', 'max_position_percent', 'max_total_position_percent',
+        'min_trade_usdt', 'stop_loss_percent', 'take_profit_percent',
+        'trailing_stop_activation_percent', 'trailing_stop_distance_percent',
+        'initial_balance', 'deepseek_max_tokens', 'trading_interval_minutes'
+    ), NON_NEGATIVE_RULE),
+}
+BOOLEAN_SETTING_KEYS = frozenset({
+    'enable_notifications', 'enable_trade_logging', 'allow_short_positions',
+    'allow_long_positions', 'auto_position_reversal', 'enable_deepseek_reasoning'
+})
+TRUE_VALUES = frozenset({'true', '1', 'yes'})
+BOOLEAN_VALUES = TRUE_VALUES | {'false', '0', 'no'}
+
+SETTINGS_FOOTER = (
+    "*Изменить настройку:*\n"
+    "`/set <ключ> <значение>`\n\n"
+    "*Примеры:*\n"
+    "`/set leverage 5`\n"
+    "`/set risk_percent 1.5`\n"
+    "`/set enable_notifications true`\n"
+    "`/set trading_symbols BTCUSDT,ETHUSDT`"
+)
+
+SET_USAGE = (
+    "❌ Использование: /set <ключ> <значение>\n\n"
+    "Примеры:\n"
+    "`/set trading_symbols BTCUSDT,ETHUSDT,ADAUSDT`\n"
+    "`/set leverage 10`\n"
+    "`/set risk_percent 2.0`\n"
+    "`/set enable_notifications true`\n\n"
+    "Посмотреть текущие настройки: /settings"
+)
+
+# Шаблоны повторяющихся блоков ответов: строка формата разбирается один раз,
+# в цикле остается один вызов format_map на запись
+POSITION_TEMPLATE = (
+    "{emoji} *{direction}*\n"
+    "🆔 *ID:* {id}\n"
+    "💹 *Символ:* {symbol}\n"
+    "📊 *Сторона:* {side}\n"
+    "🔢 *Размер:* {size:.4f}\n"
+    "💵 *Цена входа:* {entry_price:.2f}\n"
+    "💰 *Текущая цена:* {current_price:.2f}\n"
+    "📉 *Стоп-лосс:* {stop_loss:.2f}\n"
+    "📈 *Тейк-профит:* {take_profit:.2f}\n"
+    "📈 *P&L:* {pnl:.2f} USDT ({pnl_percent:.2f}%)\n"
+    "⏰ *Открыта:* {opened_at}\n"
+) + MESSAGE_SEPARATOR
+
+USER_TEMPLATE = (
+    "👤 *{username}*\n"
+    "🆔 ID: `{user_id}`\n"
+    "📊 {status}\n"
+    "📅 Добавлен: {added_short}\n"
+) + MESSAGE_SEPARATOR
+
+
+def split_message(text: str, limit: int = MESSAGE_CHUNK_LIMIT) -> list[str]:
+    """Делит текст на части не длиннее limit по границам записей (при необходимости - по строкам)"""
+    if len(text) <= limit:
+        return [text]
+
+    blocks = [block + MESSAGE_SEPARATOR for block in text.split(MESSAGE_SEPARATOR)]
+    blocks[-1] = blocks[-1][:-len(MESSAGE_SEPARATOR)]
+
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for block in blocks:
+        if len(block) <= limit:
+            pieces = [block]
+        else:
+            pieces = [line[i:i + limit]
+                      for line in block.splitlines(keepends=True)
+                      for i in range(0, len(line), limit)]
+        for piece in pieces:
+            if current and size + len(piece) > limit:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece)
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
 
 class TelegramBot:
     def __init__(self, trading_bot: TradingBot):
         self.trading_bot = VirtualTradingBot()
         # self.trading_bot = trading_bot
         self.db = Database()
-        self.logger = logging.getLogger(__name__)
+
+        # Белый список и админы загружаются один раз и далее меняются вместе с БД
+        users = self.db.get_all_users()
+        self._allowed_ids: set[int] = {user['user_id'] for user in users}
+        self._admin_ids: set[int] = {user['user_id'] for user in users if user.get('is_admin')}
+        self._allowed_users_filter = filters.User(user_id=self._allowed_ids)
+        self._admin_users_filter = filters.User(user_id=self._admin_ids)
+
+        # Пул потоков для блокирующих вызовов БД и синхронного REST API биржи
+        self._db_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db")
+
+        # Подкоманды /admin_users: имя -> (обработчик, минимум аргументов после имени)
+        self._admin_commands = {
+            'add': (self._admin_add, 2),
+            'remove': (self._admin_remove, 1),
+            'admin': (functools.partial(self._admin_set_admin, is_admin=True), 1),
+            'user': (functools.partial(self._admin_set_admin, is_admin=False), 1),
+        }
+
+        # Очереди отправки и их воркеры по chat_id
+        self._chat_queues: dict[int, asyncio.Queue] = {}
+        self._chat_workers: dict[int, asyncio.Task] = {}
+
+        # Незавершенные диалоги: user_id -> (состояние, данные диалога)
+        self._pending: dict[int, tuple[int, dict]] = {}
+
+        # Блокировки изменяющих операций по user_id (неиспользуемые удаляются сборщиком мусора)
+        self._user_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+        # Кеш торгуемых символов биржи для локальной валидации
+        self._symbols_cache: frozenset[str] = frozenset()
+        self._symbols_cache_updated_at = 0.0
+
+        # Снимок баланса: (время, balance_info, get_balance_change_info())
+        self._balance_cache: tuple[float, dict, tuple] | None = None
+
+        # Рыночные данные по символам: symbol -> (время, данные)
+        self._market_data_cache: dict[str, tuple[float, dict]] = {}
+
+        # Снимок настроек бота и версия trading_bot.settings_version, на которой он получен
+        self._settings_snapshot: dict[str, str] = self.trading_bot.get_all_settings()
+        self._settings_version = self.trading_bot.settings_version
+
+        # Последний ответ /settings: (версия настроек, текст)
+        self._settings_cache: tuple[int, str] | None = None
+
+        # Профилировщик (только при ENABLE_PROFILING=true)
+        self._profiler = Profiler(
+            output_dir='/app/logs/profiles' if os.path.exists('/app/logs') else 'profiles'
+        ) if Config.ENABLE_PROFILING else None
 
         # Создаем приложение Telegram
-        self.application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(Config.TELEGRAM_BOT_TOKEN)
+            # Пул соединений для пачек ответов; read timeout long poll PTB увеличивает сам на timeout
+            .connection_pool_size(20)
+            .connect_timeout(5.0)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
 
         # Добавляем обработчики команд
         self._setup_handlers()
 
     def _setup_handlers(self):
         """Настройка обработчиков команд"""
-        # Сначала ConversationHandler (важно для приоритета)
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('set_symbol', self._set_symbol)],
-            states={
-                SET_SYMBOL: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._set_symbol_receive)],
-                SET_LEVERAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._set_leverage_receive)],
-            },
-            fallbacks=[CommandHandler('cancel', self._cancel)],
-        )
-        self.application.add_handler(conv_handler)
+        # Права проверяются фильтрами: обновления чужих пользователей не доходят до обработчиков
+        allowed = self._allowed_users_filter
+        admins = self._admin_users_filter
+
+        # Диалог смены символа: состояние хранится в self._pending, текст маршрутизирует _fsm_route
+        self.application.add_handler(CommandHandler('set_symbol', self._set_symbol, filters=allowed))
+        self.application.add_handler(CommandHandler('cancel', self._cancel, filters=allowed))
+        self.application.add_handler(
+            MessageHandler(filters.TEXT & ~filters.COMMAND & allowed, self._fsm_route))
 
-        # Затем обычные команды
+        # Затем обычные команды (/start доступен всем - сообщает ID неизвестным пользователям)
         self.application.add_handler(CommandHandler("start", self._start))
-        self.application.add_handler(CommandHandler("balance", self._balance))
+        self.application.add_handler(CommandHandler("balance", self._balance, filters=allowed))
         self.application.add_handler(
-            CommandHandler("positions", self._positions))
+            CommandHandler("positions", self._positions, filters=allowed))
         self.application.add_handler(
-            CommandHandler("close_all", self._close_all))
+            CommandHandler("close_all", self._close_all, filters=allowed))
         self.application.add_handler(
-            CommandHandler("settings", self._settings))
-        self.application.add_handler(CommandHandler("close", self._close))
-        self.application.add_handler(CommandHandler("reverse", self._reverse))
+            CommandHandler("settings", self._settings, filters=allowed))
+        self.application.add_handler(CommandHandler("close", self._close, filters=allowed))
+        self.application.add_handler(CommandHandler("reverse", self._reverse, filters=allowed))
 
         # Команды для настроек
-        self.application.add_handler(CommandHandler("set", self._set_setting))
+        self.application.add_handler(CommandHandler("set", self._set_setting, filters=allowed))
         self.application.add_handler(CommandHandler(
-            "set_setting", self._set_setting))  # Альтернативная команда
+            "set_setting", self._set_setting, filters=allowed))  # Альтернативная команда
 
         # Команды администратора
         self.application.add_handler(
-            CommandHandler("admin_users", self._admin_users))
+            CommandHandler("admin_users", self._admin_users, filters=admins))
         self.application.add_handler(CommandHandler(
-            "reset_settings", self._reset_settings))
+            "reset_settings", self._reset_settings, filters=admins))
+        self.application.add_handler(CommandHandler("profile", self._profile, filters=admins))
+        self.application.add_handler(CommandHandler(
+            ["admin_users", "reset_settings", "profile"], self._admin_only, filters=allowed))
 
-        # В самом конце - обработчик для неизвестных команд
+        # В самом конце - обработчик для неизвестных команд (только личные чаты разрешенных пользователей)
         self.application.add_handler(
-            MessageHandler(filters.COMMAND, self._unknown))
+            MessageHandler(
+                filters.COMMAND & filters.ChatType.PRIVATE & allowed,
+                self._unknown))
+
+    async def _post_init(self, application: Application):
+        """Запуск фоновых задач после инициализации приложения"""
+        if self._profiler:
+            # Профилировщик запускается в потоке цикла событий, где работают обработчики
+            self._profiler.start()
+            application.create_task(self._rotate_profiles())
+
+    async def _post_shutdown(self, application: Application):
+        """Остановка очередей отправки и закрытие асинхронного клиента биржи в цикле событий приложения"""
+        for worker in self._chat_workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._chat_workers.values(), return_exceptions=True)
+        await self.trading_bot.bybit.aclose()
+
+    async def _rotate_profiles(self):
+        """Периодическое сохранение CPU-профиля в файл"""
+        while self._profiler and self._profiler.is_running:
+            await asyncio.sleep(self._profiler.rotate_seconds)
+            self._profiler.maybe_rotate()
+
+    async def _send_message(self, update: Update, text: str, parse_mode: str | None = None, reply_markup=None):
+        """Постановка сообщения в очередь отправки чата (порядок сохраняется, 429 не теряет сообщения)"""
+        chat = update.effective_chat
+        if not chat:
+            return
 
-    async def _send_message(self, update: Update, text: str, parse_mode: str = '', reply_markup=None):
-        """Безопасная отправка сообщения"""
-        try:
-            if update.message:
-                await update.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
-            elif update.callback_query and update.callback_query.message:
-                await update.callback_query.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
-            elif update.effective_chat:
-                await self.application.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=text,
-                    parse_mode=parse_mode,
-                    reply_markup=reply_markup
-                )
-        except Exception as e:
-            self.logger.error(f"Ошибка отправки сообщения: {e}")
+        payload = {
+            'chat_id': chat.id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'reply_markup': reply_markup
+        }
+        # Как reply_text: в группах отвечаем цитатой на исходное сообщение
+        message = update.effective_message
+        if message and chat.type != Chat.PRIVATE:
+            payload['reply_to_message_id'] = message.message_id
+
+        queue = self._chat_queues.get(chat.id)
+        if queue is None:
+            queue = self._chat_queues[chat.id] = asyncio.Queue()
+            self._chat_workers[chat.id] = asyncio.create_task(self._chat_worker(chat.id, queue))
+        queue.put_nowait(payload)
+
+    async def _chat_worker(self, chat_id: int, queue: asyncio.Queue):
+        """Последовательная отправка сообщений одного чата с учетом RetryAfter и backoff"""
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), CHAT_WORKER_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                # Между таймаутом и удалением нет await - новое сообщение не потеряется
+                if queue.empty():
+                    del self._chat_queues[chat_id]
+                    del self._chat_workers[chat_id]
+                    return
+                continue
+
+            attempt = 0
+            while True:
+                try:
+                    await self.application.bot.send_message(**payload)
+                    break
+                except RetryAfter as e:
+                    # Flood control: ждем указанное Telegram время и повторяем то же сообщение
+                    await asyncio.sleep(float(e.retry_after) + 0.25)
+                except BadRequest as e:
+                    # Ошибка в самом сообщении (разметка, длина) - повтор не поможет
+                    logger.error("Ошибка отправки сообщения в чат %s: %s", chat_id, e)
+                    break
+                except NetworkError as e:
+                    attempt += 1
+                    if attempt >= SEND_MAX_ATTEMPTS:
+                        logger.error("Ошибка отправки сообщения в чат %s: %s", chat_id, e)
+                        break
+                    await asyncio.sleep(min(SEND_MAX_BACKOFF_SECONDS, 2 ** attempt) + random.random() * 0.5)
+                except Exception:
+                    logger.exception("Ошибка отправки сообщения в чат %s", chat_id)
+                    break
+            queue.task_done()
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Выполняет блокирующий вызов в пуле потоков, не останавливая цикл событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_pool, functools.partial(func, *args, **kwargs))
+
+    def _set_access(self, user_id: int, allowed: bool, admin: bool = False):
+        """Обновляет множества прав и фильтры обработчиков после изменения в БД"""
+        if allowed:
+            self._allowed_ids.add(user_id)
+            self._allowed_users_filter.add_user_ids(user_id)
+        else:
+            self._allowed_ids.discard(user_id)
+            self._allowed_users_filter.remove_user_ids(user_id)
 
+        if allowed and admin:
+            self._admin_ids.add(user_id)
+            self._admin_users_filter.add_user_ids(user_id)
+        else:
+            self._admin_ids.discard(user_id)
+            self._admin_users_filter.remove_user_ids(user_id)
+
+    async def _send_long_message(self, update: Update, text: str, parse_mode: str | None = None):
+        """Отправка длинного ответа частями; порядок и паузы обеспечивает очередь чата"""
+        for chunk in split_message(text):
+            await self._send_message(update, chunk, parse_mode=parse_mode)
+
+    async def _get_settings_snapshot(self) -> dict[str, str]:
+        """Снимок настроек; перечитывается из БД, только если бот перезагружал настройки"""
+        version = self.trading_bot.settings_version
+        if version != self._settings_version:
+            self._settings_snapshot = await self._run_blocking(self.trading_bot.get_all_settings)
+            self._settings_version = version
+        return self._settings_snapshot
+
+    async def _get_market_data(self, symbol: str) -> dict | None:
+        """Рыночные данные символа с кешированием на MARKET_DATA_CACHE_TTL_SECONDS"""
+        cached = self._market_data_cache.get(symbol)
+        if cached and time.monotonic() - cached[0] < MARKET_DATA_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        market_data = await self.trading_bot.bybit.get_market_data_async(symbol)
+        if market_data:
+            self._market_data_cache[symbol] = (time.monotonic(), market_data)
+        return market_data
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка пользователя: его изменяющие операции выполняются по очереди"""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user_id] = lock
+        return lock
+
+    async def _get_tradable_symbols(self) -> frozenset[str]:
+        """Возвращает кешированный список символов биржи, обновляя его раз в час"""
+        if not self._symbols_cache or time.monotonic() - self._symbols_cache_updated_at > SYMBOLS_CACHE_TTL_SECONDS:
+            symbols = await self._run_blocking(self.trading_bot.bybit.get_linear_symbols)
+            if symbols:
+                self._symbols_cache = symbols
+                self._symbols_cache_updated_at = time.monotonic()
+        return self._symbols_cache
+
+    @log_latency
     async def _start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         if not update.effective_user:
@@ -91,146 +472,133 @@ class TelegramBot:
         user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name
 
-        # Проверяем, есть ли пользователь в белом списке
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(
-                update,
-                "❌ Доступ запрещен.\n\n"
-                "Ваш user ID не найден в списке разрешенных пользователей.\n"
-                f"Ваш ID: {user_id}\n"
-                "Обратитесь к администратору для получения доступа."
-            )
-            return
+        # Проверяем белый список: известные пользователи проходят без обращения к БД
+        if user_id not in self._allowed_ids:
+            if not await self._run_blocking(self.db.is_user_allowed, user_id):
+                await self._send_message(
+                    update,
+                    "❌ Доступ запрещен.\n\n"
+                    "Ваш user ID не найден в списке разрешенных пользователей.\n"
+                    f"Ваш ID: {user_id}\n"
+                    "Обратитесь к администратору для получения доступа."
+                )
+                return
 
-        await self._send_message(
-            update,
-            "🤖 *Торговый бот запущен*\n\n"
-            "*Основные команды:*\n"
-            "• /balance - текущий баланс\n"
-            "• /positions - открытые позиции\n"
-            "• /close [id] - закрыть позицию по ID\n"
-            "• /close_all - закрыть все позиции\n"
-            "• /reverse - переворот позиции\n\n"
-            "*Настройки:*\n"
-            "• /settings - текущие настройки\n\n"
-            "*Администратор:*\n"
-            "• /set [ключ] [значение] - изменить настройку\n"
-            "• /set_symbol - изменить торговую пару\n"
-            "• /admin_users - управление пользователями\n"
-            "• /reset_settings - сброс настроек\n\n"
-            "Используйте /settings для просмотра всех доступных настроек.",
-            parse_mode='Markdown'
-        )
+            # Пользователь добавлен в БД в обход бота - обновляем имя один раз
+            await self._run_blocking(self.db.upsert_user, user_id, username)
+            self._set_access(
+                user_id, True, await self._run_blocking(self.db.is_user_admin, user_id))
 
+        await self._send_message(update, START_MESSAGE, parse_mode='Markdown')
+
+    @log_latency
     async def _admin_users(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда для управления пользователями (только для админов)"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-
-        # Проверяем, является ли пользователь администратором
-        if not self.db.is_user_admin(user_id):
-            await self._send_message(update, "❌ Эта команда доступна только администраторам.")
-            return
-
         if not context.args:
             # Показываем список пользователей
-            users = self.db.get_all_users()
+            users = await self._run_blocking(self.db.get_all_users)
             if not users:
                 await self._send_message(update, "📝 Список пользователей пуст.")
                 return
 
-            message = "👥 *Список пользователей:*\n\n"
+            parts = ["👥 *Список пользователей:*\n\n"]
             for user in users:
-                status = "🟢 Админ" if user.get(
-                    'is_admin') else "🔵 Пользователь"
-                message += (
-                    f"👤 *{user['username']}*\n"
-                    f"🆔 ID: `{user['user_id']}`\n"
-                    f"📊 {status}\n"
-                    f"📅 Добавлен: {user['created_at'][:10]}\n"
-                    f"────────────────────\n"
-                )
+                # Дата добавления есть не во всех выборках (added_at в SQLite)
+                added = user.get('added_at') or user.get('created_at') or '—'
+                parts.append(USER_TEMPLATE.format_map({
+                    **user,
+                    'status': "🟢 Админ" if user.get('is_admin') else "🔵 Пользователь",
+                    'added_short': str(added)[:10],
+                }))
 
-            message += "\nКоманды управления:\n"
-            message += "• `/admin_users add <user_id> <username>` - добавить пользователя\n"
-            message += "• `/admin_users remove <user_id>` - удалить пользователя\n"
-            message += "• `/admin_users admin <user_id>` - сделать администратором\n"
-            message += "• `/admin_users user <user_id>` - убрать права администратора\n"
+            parts.append(ADMIN_USERS_HELP)
 
-            await self._send_message(update, message, parse_mode='Markdown')
+            await self._send_long_message(update, "".join(parts), parse_mode='Markdown')
             return
 
-        command = context.args[0].lower()
-
-        if command == 'add' and len(context.args) >= 3:
-            try:
-                new_user_id = int(context.args[1])
-                new_username = ' '.join(context.args[2:])
-
-                if self.db.add_allowed_user(new_user_id, new_username):
-                    await self._send_message(update, f"✅ Пользователь {new_username} (ID: {new_user_id}) добавлен.")
-                else:
-                    await self._send_message(update, "❌ Ошибка при добавлении пользователя.")
-
-            except ValueError:
-                await self._send_message(update, "❌ Неверный формат user_id.")
-
-        elif command == 'remove' and len(context.args) >= 2:
-            try:
-                remove_user_id = int(context.args[1])
-
-                if self.db.remove_user(remove_user_id):
-                    await self._send_message(update, f"✅ Пользователь (ID: {remove_user_id}) удален.")
-                else:
-                    await self._send_message(update, "❌ Пользователь не найден.")
-
-            except ValueError:
-                await self._send_message(update, "❌ Неверный формат user_id.")
+        handler, min_args = self._admin_commands.get(context.args[0].lower(), (None, 0))
+        if handler is None or len(context.args) - 1 < min_args:
+            await self._send_message(update, "❌ Неверная команда. Используйте /admin_users для справки.")
+            return
 
-        elif command == 'admin' and len(context.args) >= 2:
-            try:
-                admin_user_id = int(context.args[1])
+        try:
+            target_user_id = int(context.args[1])
+        except ValueError:
+            await self._send_message(update, "❌ Неверный формат user_id.")
+            return
 
-                if self.db.set_user_admin(admin_user_id, True):
-                    await self._send_message(update, f"✅ Пользователь (ID: {admin_user_id}) назначен администратором.")
-                else:
-                    await self._send_message(update, "❌ Пользователь не найден.")
+        await handler(update, target_user_id, context.args[2:])
 
-            except ValueError:
-                await self._send_message(update, "❌ Неверный формат user_id.")
+    async def _admin_add(self, update: Update, target_user_id: int, args: list[str]):
+        """/admin_users add <user_id> <username>"""
+        username = ' '.join(args)
+        if await self._run_blocking(self.db.add_allowed_user, target_user_id, username):
+            self._set_access(target_user_id, True)
+            await self._send_message(update, f"✅ Пользователь {username} (ID: {target_user_id}) добавлен.")
+        else:
+            await self._send_message(update, "❌ Ошибка при добавлении пользователя.")
 
-        elif command == 'user' and len(context.args) >= 2:
-            try:
-                user_user_id = int(context.args[1])
+    async def _admin_remove(self, update: Update, target_user_id: int, args: list[str]):
+        """/admin_users remove <user_id>"""
+        if await self._run_blocking(self.db.remove_user, target_user_id):
+            self._set_access(target_user_id, False)
+            await self._send_message(update, f"✅ Пользователь (ID: {target_user_id}) удален.")
+        else:
+            await self._send_message(update, "❌ Пользователь не найден.")
+
+    async def _admin_set_admin(self, update: Update, target_user_id: int, args: list[str], is_admin: bool):
+        """/admin_users admin|user <user_id>"""
+        if await self._run_blocking(self.db.set_user_admin, target_user_id, is_admin):
+            self._set_access(target_user_id, target_user_id in self._allowed_ids, is_admin)
+            if is_admin:
+                await self._send_message(update, f"✅ Пользователь (ID: {target_user_id}) назначен администратором.")
+            else:
+                await self._send_message(update, f"✅ Пользователь (ID: {target_user_id}) лишен прав администратора.")
+        else:
+            await self._send_message(update, "❌ Пользователь не найден.")
 
-                if self.db.set_user_admin(user_user_id, False):
-                    await self._send_message(update, f"✅ Пользователь (ID: {user_user_id}) лишен прав администратора.")
-                else:
-                    await self._send_message(update, "❌ Пользователь не найден.")
+    @log_latency
+    async def _profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Отчет профилировщика: /profile [top|mem] (только для админов)"""
+        if not update.effective_user:
+            return
 
-            except ValueError:
-                await self._send_message(update, "❌ Неверный формат user_id.")
+        if not self._profiler:
+            await self._send_message(update, "ℹ️ Профилирование выключено (ENABLE_PROFILING=false).")
+            return
 
+        mode = context.args[0].lower() if context.args else 'top'
+        if mode == 'mem':
+            report = self._profiler.top_allocations()
+        elif mode == 'top':
+            report = self._profiler.top_functions()
         else:
-            await self._send_message(update, "❌ Неверная команда. Используйте /admin_users для справки.")
+            await self._send_message(update, "❌ Использование: /profile [top|mem]")
+            return
 
+        # Лимит Telegram - 4096 символов, самое важное в конце отчета pstats/в начале tracemalloc
+        report = report.strip() or "Нет данных"
+        await self._send_message(update, report[-4000:] if mode == 'top' else report[:4000])
+
+    @log_latency
     async def _balance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /balance"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return
-
-        # Обновляем баланс
-        self.trading_bot.update_balance()
-        arrow, balance_change, balance_change_percent, highest, lowest = self.trading_bot.get_balance_change_info()
+        # Обновляем баланс (повторные запросы в течение TTL используют последний снимок)
+        if self._balance_cache and time.monotonic() - self._balance_cache[0] < BALANCE_CACHE_TTL_SECONDS:
+            _, balance_info, change_info = self._balance_cache
+        else:
+            await self._run_blocking(self.trading_bot.update_balance)
+            balance_info = dict(self.trading_bot.balance_info)
+            change_info = self.trading_bot.get_balance_change_info()
+            self._balance_cache = (time.monotonic(), balance_info, change_info)
+        arrow, balance_change, balance_change_percent, highest, lowest = change_info
 
-        balance_info = self.trading_bot.balance_info
         message = (
             f"💰 *Баланс:* {balance_info['total_equity']:.2f} USDT\n"
             f"{arrow} *Изменение:* {balance_change:+.2f} USDT ({balance_change_percent:+.2f}%)\n"
@@ -242,53 +610,36 @@ class TelegramBot:
 
         await self._send_message(update, message, parse_mode='Markdown')
 
+    @log_latency
     async def _positions(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /positions"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return
-
-        open_positions = self.db.get_open_positions()
+        open_positions = await self._run_blocking(self.db.get_open_positions)
         if not open_positions:
             await self._send_message(update, "📭 Нет открытых позиций.")
             return
 
-        message = "📋 *Открытые позиции:*\n\n"
+        parts = ["📋 *Открытые позиции:*\n\n"]
         for pos in open_positions:
-            direction_emoji = "🟢" if pos['side'] == 'BUY' else "🔴"
-            direction_text = "ЛОНГ" if pos['side'] == 'BUY' else "ШОРТ"
-
-            message += (
-                f"{direction_emoji} *{direction_text}*\n"
-                f"🆔 *ID:* {pos['id']}\n"
-                f"💹 *Символ:* {pos['symbol']}\n"
-                f"📊 *Сторона:* {pos['side']}\n"
-                f"🔢 *Размер:* {pos['size']:.4f}\n"
-                f"💵 *Цена входа:* {pos['entry_price']:.2f}\n"
-                f"💰 *Текущая цена:* {pos['current_price']:.2f}\n"
-                f"📉 *Стоп-лосс:* {pos['stop_loss']:.2f}\n"
-                f"📈 *Тейк-профит:* {pos['take_profit']:.2f}\n"
-                f"📈 *P&L:* {pos['pnl']:.2f} USDT ({pos['pnl_percent']:.2f}%)\n"
-                f"⏰ *Открыта:* {pos['created_at'][:19]}\n"
-                f"────────────────────\n"
-            )
+            is_long = pos['side'] == 'BUY'
+            parts.append(POSITION_TEMPLATE.format_map({
+                **pos,
+                'emoji': "🟢" if is_long else "🔴",
+                'direction': "ЛОНГ" if is_long else "ШОРТ",
+                'opened_at': str(pos['created_at'])[:19],
+            }))
 
-        await self._send_message(update, message, parse_mode='Markdown')
+        await self._send_long_message(update, "".join(parts), parse_mode='Markdown')
 
+    @log_latency
     async def _close(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /close [id]"""
         if not update.effective_user:
             return
 
         user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return
-
         if not context.args:
             await self._send_message(update, "❌ Укажите ID позиции: /close [id]")
             return
@@ -299,203 +650,144 @@ class TelegramBot:
             await self._send_message(update, "❌ Неверный ID позиции.")
             return
 
-        position = self.db.get_position(position_id)
-        if not position:
-            await self._send_message(update, "❌ Позиция не найдена.")
-            return
-
-        if position['status'] != 'open':
-            await self._send_message(update, "❌ Позиция уже закрыта.")
-            return
+        async with self._lock(user_id):
+            position = await self._run_blocking(self.db.get_position, position_id)
+            if not position:
+                await self._send_message(update, "❌ Позиция не найдена.")
+                return
 
-        # Получаем текущую цену
-        market_data = self.trading_bot.bybit.get_market_data(
-            position['symbol'])
-        if not market_data:
-            await self._send_message(update, "❌ Ошибка получения текущей цены.")
-            return
+            if position['status'] != 'open':
+                await self._send_message(update, "❌ Позиция уже закрыта.")
+                return
 
-        # Закрываем позицию
-        success = self.trading_bot.bybit.close_position(
-            position['symbol'], position['side'])
-        if success:
-            self.db.close_position(position_id, market_data['price'])
-            await self._send_message(update, f"✅ Позиция #{position_id} закрыта.")
-        else:
-            await self._send_message(update, f"❌ Ошибка закрытия позиции #{position_id}.")
+            # Закрываем позицию - цену закрытия берем из исполнения ордера
+            result = await self.trading_bot.bybit.close_position_async(
+                position['symbol'], position['side'])
+            if result['success']:
+                await self._run_blocking(
+                    self.db.close_position, position_id, result['price'] or position['current_price'])
+                await self._send_message(update, f"✅ Позиция #{position_id} закрыта.")
+            else:
+                await self._send_message(update, f"❌ Ошибка закрытия позиции #{position_id}.")
 
+    @log_latency
     async def _close_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /close_all"""
         if not update.effective_user:
             return
 
         user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return
-
-        open_positions = self.db.get_open_positions()
-        if not open_positions:
-            await self._send_message(update, "📭 Нет открытых позиций.")
-            return
-
-        closed_count = 0
-        for position in open_positions:
-            market_data = self.trading_bot.bybit.get_market_data(
-                position['symbol'])
-            if market_data:
-                success = self.trading_bot.bybit.close_position(
-                    position['symbol'], position['side'])
-                if success:
-                    self.db.close_position(
-                        position['id'], market_data['price'])
-                    closed_count += 1
-
-        await self._send_message(update, f"✅ Закрыто позиций: {closed_count}/{len(open_positions)}")
+        async with self._lock(user_id):
+            open_positions = await self._run_blocking(self.db.get_open_positions)
+            if not open_positions:
+                await self._send_message(update, "📭 Нет открытых позиций.")
+                return
 
+            # Закрываем позиции параллельно, ограничивая число одновременных запросов к бирже
+            semaphore = asyncio.Semaphore(CLOSE_ALL_CONCURRENCY)
+
+            async def close_one(position: dict) -> int:
+                async with semaphore:
+                    result = await self.trading_bot.bybit.close_position_async(
+                        position['symbol'], position['side'])
+                    if not result['success']:
+                        return 0
+                    await self._run_blocking(
+                        self.db.close_position, position['id'], result['price'] or position['current_price'])
+                    return 1
+
+            results = await asyncio.gather(
+                *(close_one(position) for position in open_positions), return_exceptions=True)
+            for position, result in zip(open_positions, results):
+                if isinstance(result, Exception):
+                    logger.error("Ошибка закрытия позиции #%s: %s", position['id'], result)
+            closed_count = sum(result for result in results if isinstance(result, int))
+
+            await self._send_message(update, f"✅ Закрыто позиций: {closed_count}/{len(open_positions)}")
+
+    @log_latency
     async def _settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показ всех текущих настроек"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен.")
+        # Настройки не менялись с прошлого запроса - отдаем готовый текст
+        settings = await self._get_settings_snapshot()
+        if self._settings_cache and self._settings_cache[0] == self._settings_version:
+            await self._send_message(update, self._settings_cache[1], parse_mode='Markdown')
             return
 
-        # Получаем все настройки из бота
-        settings = self.trading_bot.get_all_settings()
-
-        message = "⚙️ *Текущие настройки:*\n\n"
-
-        # Группируем настройки для лучшего отображения
-        categories = {
-            '📊 Торговые настройки': [
-                'trading_symbols', 'default_symbol', 'min_confidence', 'leverage',
-                'trading_interval_minutes'
-            ],
-            '🛡️ Риск-менеджмент': [
-                'risk_percent', 'max_position_percent', 'max_total_position_percent',
-                'min_trade_usdt', 'stop_loss_percent', 'take_profit_percent',
-                'trailing_stop_activation_percent', 'trailing_stop_distance_percent'
-            ],
-            '🔧 Поведение': [
-                'allow_short_positions', 'allow_long_positions', 'auto_position_reversal'
-            ],
-            '🔔 Уведомления': [
-                'enable_notifications', 'enable_trade_logging'
-            ],
-            '🤖 DeepSeek': [
-                'deepseek_model', 'deepseek_max_tokens', 'deepseek_temperature',
-                'enable_deepseek_reasoning'
-            ],
-            '💰 Баланс': [
-                'initial_balance'
-            ]
-        }
-
-        for category, keys in categories.items():
-            message += f"*{category}:*\n"
+        parts = ["⚙️ *Текущие настройки:*\n\n"]
+        for category, keys in SETTINGS_CATEGORIES:
+            parts.append(f"*{category}:*\n")
             for key in keys:
                 if key in settings:
                     value = settings[key]
                     # Сокращаем длинные значения
                     if key == 'trading_symbols' and len(value) > 50:
                         value = value[:50] + "..."
-                    message += f"• `{key}: {value}`\n"
-            message += "\n"
+                    parts.append(f"• `{key}: {value}`\n")
+            parts.append("\n")
 
-        message += "*Изменить настройку:*\n"
-        message += "`/set <ключ> <значение>`\n\n"
-        message += "*Примеры:*\n"
-        message += "`/set leverage 5`\n"
-        message += "`/set risk_percent 1.5`\n"
-        message += "`/set enable_notifications true`\n"
-        message += "`/set trading_symbols BTCUSDT,ETHUSDT`"
+        parts.append(SETTINGS_FOOTER)
 
+        message = "".join(parts)
+        self._settings_cache = (self._settings_version, message)
         await self._send_message(update, message, parse_mode='Markdown')
 
+    @log_latency
     async def _set_setting(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Изменение настройки"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен.")
-            return
-
         if not context.args or len(context.args) < 2:
-            await self._send_message(update,
-                                     "❌ Использование: /set <ключ> <значение>\n\n"
-                                     "Примеры:\n"
-                                     "`/set trading_symbols BTCUSDT,ETHUSDT,ADAUSDT`\n"
-                                     "`/set leverage 10`\n"
-                                     "`/set risk_percent 2.0`\n"
-                                     "`/set enable_notifications true`\n\n"
-                                     "Посмотреть текущие настройки: /settings"
-                                     )
+            await self._send_message(update, SET_USAGE)
             return
 
         key = context.args[0]
         value = ' '.join(context.args[1:])
 
-        # Валидация числовых значений
-        numeric_keys = [
-            'leverage', 'min_confidence', 'risk_percent', 'max_position_percent',
-            'max_total_position_percent', 'min_trade_usdt', 'stop_loss_percent',
-            'take_profit_percent', 'trailing_stop_activation_percent',
-            'trailing_stop_distance_percent', 'initial_balance',
-            'deepseek_max_tokens', 'deepseek_temperature', 'trading_interval_minutes'
-        ]
-
-        if key in numeric_keys:
+        # Валидация числовых значений: один разбор и одна проверка диапазона
+        rule = SETTING_PARSERS.get(key)
+        if rule is not None:
+            parse, is_valid, error = rule
             try:
-                if key == 'leverage':
-                    leverage = int(value)
-                    if leverage < 1 or leverage > 100:
-                        await self._send_message(update, "❌ Леверидж должен быть от 1 до 100")
-                        return
-                elif key in ['min_confidence', 'deepseek_temperature']:
-                    float_value = float(value)
-                    if float_value < 0 or float_value > 1:
-                        await self._send_message(update, f"❌ {key} должен быть между 0 и 1")
-                        return
-                else:
-                    float_value = float(value)
-                    if float_value < 0:
-                        await self._send_message(update, f"❌ {key} должен быть положительным числом")
-                        return
+                parsed = parse(value)
             except ValueError:
                 await self._send_message(update, f"❌ {key} должен быть числом")
                 return
+            if not is_valid(parsed):
+                await self._send_message(update, error.format(key=key))
+                return
 
         # Валидация булевых значений
-        boolean_keys = [
-            'enable_notifications', 'enable_trade_logging', 'allow_short_positions',
-            'allow_long_positions', 'auto_position_reversal', 'enable_deepseek_reasoning'
-        ]
-        if key in boolean_keys:
-            if value.lower() not in ['true', 'false', '1', '0', 'yes', 'no']:
+        if key in BOOLEAN_SETTING_KEYS:
+            if value.lower() not in BOOLEAN_VALUES:
                 await self._send_message(update, f"❌ {key} должен быть true или false")
                 return
             # Нормализуем значение
-            value = 'true' if value.lower() in [
-                'true', '1', 'yes'] else 'false'
+            value = 'true' if value.lower() in TRUE_VALUES else 'false'
 
         # Валидация trading_symbols
         if key == 'trading_symbols':
             symbols = [s.strip().upper() for s in value.split(',')]
-            # Простая валидация формата символов
-            for symbol in symbols:
-                if not symbol.endswith('USDT'):
-                    await self._send_message(update, f"❌ Неверный формат символа: {symbol}. Используйте формат: BTCUSDT,ETHUSDT")
-                    return
+            # Проверяем формат символов тем же шаблоном, что и /set_symbol
+            invalid_symbol = next((symbol for symbol in symbols if not SYMBOL_PATTERN.match(symbol)), None)
+            if invalid_symbol is not None:
+                await self._send_message(update, f"❌ Неверный формат символа: {invalid_symbol}. Используйте формат: BTCUSDT,ETHUSDT")
+                return
             value = ','.join(symbols)
 
         try:
             # Обновляем настройку
-            self.trading_bot.update_setting(key, value)
+            await self._run_blocking(self.trading_bot.update_setting, key, value)
+
+            # Обновляем снимок на месте, без повторного чтения всех настроек
+            if self._settings_version + 1 == self.trading_bot.settings_version:
+                if key in self._settings_snapshot:
+                    self._settings_snapshot[key] = value
+                self._settings_version = self.trading_bot.settings_version
             await self._send_message(update, f"✅ Настройка `{key}` обновлена на `{value}`")
 
             # Если изменили торговые символы, показываем обновленный список
@@ -503,23 +795,20 @@ class TelegramBot:
                 await self._send_message(update, f"📊 Теперь торгуем: {value}")
 
         except Exception as e:
+            logger.exception("Ошибка обновления настройки %s", key)
             await self._send_message(update, f"❌ Ошибка при обновлении настройки: {str(e)}")
 
+    @log_latency
     async def _reset_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Сброс настроек к значениям по умолчанию"""
         if not update.effective_user:
             return
 
-        user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id) or not self.db.is_user_admin(user_id):
-            await self._send_message(update, "❌ Эта команда доступна только администраторам.")
-            return
-
         # Подтверждение сброса
         if context.args and context.args[0] == 'confirm':
             # Инициализируем настройки по умолчанию
-            self.trading_bot._initialize_default_settings()
-            self.trading_bot._load_settings_from_db()
+            await self._run_blocking(self.trading_bot._initialize_default_settings)
+            await self._run_blocking(self.trading_bot._load_settings_from_db)
 
             await self._send_message(update, "✅ Все настройки сброшены к значениям по умолчанию")
         else:
@@ -531,48 +820,68 @@ class TelegramBot:
                 parse_mode='Markdown'
             )
 
+    @log_latency
     async def _set_symbol(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало процесса смены символа"""
         if not update.effective_user:
-            return ConversationHandler.END
+            return
 
         user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return ConversationHandler.END
-
+        self._pending[user_id] = (SET_SYMBOL, {})
         await self._send_message(
             update,
             "Введите новую торговую пару (например: BTCUSDT, ETHUSDT):",
             reply_markup=ReplyKeyboardRemove()
         )
-        return SET_SYMBOL
-
-    async def _set_symbol_receive(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработка ввода символа и запрос левериджа"""
-        if not update.message or not update.effective_user:
-            return ConversationHandler.END
 
-        if not update.message.text:
+    @log_latency
+    async def _fsm_route(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Маршрутизация текстового ввода в шаг незавершенного диалога"""
+        if not update.message or not update.message.text or not update.effective_user:
             return
+
+        user_id = update.effective_user.id
+        async with self._lock(user_id):
+            pending = self._pending.get(user_id)
+            if pending is None:
+                return
+
+            state, data = pending
+            if state == SET_SYMBOL:
+                next_state = await self._set_symbol_receive(update, data)
+            else:
+                next_state = await self._set_leverage_receive(update, data)
+
+            # None означает завершение диалога; data изменяется на месте,
+            # поэтому запись перезаписывается только при смене состояния
+            if next_state is None:
+                self._pending.pop(user_id, None)
+            elif next_state != state:
+                self._pending[user_id] = (next_state, data)
+
+    async def _set_symbol_receive(self, update: Update, data: dict) -> int | None:
+        """Обработка ввода символа и запрос левериджа"""
         symbol = update.message.text.upper().strip()
 
         # Простая валидация символа
-        if not symbol.endswith('USDT'):
+        if not SYMBOL_PATTERN.match(symbol):
             await self._send_message(update, "❌ Неверный формат. Используйте формат: BTCUSDT, ETHUSDT и т.д.")
             return SET_SYMBOL
 
-        # Проверяем существование символа на бирже
-        market_data = self.trading_bot.bybit.get_market_data(symbol)
-        if not market_data:
+        # Проверяем существование символа по кешу биржи (запрос к API только если кеш недоступен)
+        symbols = await self._get_tradable_symbols()
+        if symbols:
+            symbol_exists = symbol in symbols
+        else:
+            symbol_exists = bool(await self._get_market_data(symbol))
+        if not symbol_exists:
             await self._send_message(update, f"❌ Символ {symbol} не найден на бирже.")
             return SET_SYMBOL
 
-        if not context.user_data:
-            return
-        context.user_data['new_symbol'] = symbol
+        data['new_symbol'] = symbol
 
-        current_leverage = self.db.get_setting('leverage', '10')
+        # Леверидж из настроек, загруженных ботом (без запроса к БД)
+        current_leverage = self.trading_bot.leverage
         await self._send_message(
             update,
             f"✅ Символ {symbol} доступен.\n"
@@ -581,13 +890,8 @@ class TelegramBot:
         )
         return SET_LEVERAGE
 
-    async def _set_leverage_receive(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def _set_leverage_receive(self, update: Update, data: dict) -> int | None:
         """Обработка ввода левериджа и сохранение настроек"""
-        if not update.message or not update.effective_user:
-            return ConversationHandler.END
-
-        if not update.message.text:
-            return
         leverage_text = update.message.text.strip()
         try:
             leverage = int(leverage_text)
@@ -598,20 +902,16 @@ class TelegramBot:
             await self._send_message(update, "❌ Введите число от 1 до 100.")
             return SET_LEVERAGE
 
-        if not context.user_data:
-            return
-        symbol = context.user_data['new_symbol']
-
-        # Сохраняем настройки в базу
-        self.db.set_setting('symbol', symbol)
-        self.db.set_setting('leverage', str(leverage))
+        symbol = data['new_symbol']
 
-        # Обновляем настройки в торговом боте
+        # Сохраняем настройки через бота: он перечитывает их из БД и увеличивает
+        # settings_version, поэтому снимок и текст /settings обновятся
+        await self._run_blocking(self.trading_bot.update_setting, 'symbol', symbol)
+        await self._run_blocking(self.trading_bot.update_setting, 'leverage', str(leverage))
         self.trading_bot.symbol = symbol
-        self.trading_bot.leverage = leverage
 
         # Устанавливаем леверидж на бирже
-        success = self.trading_bot.bybit.set_leverage(symbol, leverage)
+        success = await self.trading_bot.bybit.set_leverage_async(symbol, leverage)
 
         leverage_status = "✅" if success else "⚠️ (ошибка установки на бирже)"
 
@@ -621,82 +921,87 @@ class TelegramBot:
             f"• Торговая пара: {symbol}\n"
             f"• Леверидж: {leverage}x {leverage_status}"
         )
+        return None
 
-        # Очищаем данные разговора
-        if context.user_data:
-            context.user_data.clear()
-
-        return ConversationHandler.END
-
+    @log_latency
     async def _reverse(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Принудительный переворот позиции"""
         if not update.effective_user:
             return
 
         user_id = update.effective_user.id
-        if not self.db.is_user_allowed(user_id):
-            await self._send_message(update, "❌ Доступ запрещен. Используйте /start для активации.")
-            return
+        async with self._lock(user_id):
+            open_positions = await self._run_blocking(self.db.get_open_positions)
+            if not open_positions:
+                await self._send_message(update, "📭 Нет открытых позиций для переворота.")
+                return
 
-        open_positions = self.db.get_open_positions()
-        if not open_positions:
-            await self._send_message(update, "📭 Нет открытых позиций для переворота.")
-            return
+            position = open_positions[0]
+            market_data = await self._get_market_data(position['symbol'])
+            if not market_data:
+                await self._send_message(update, "❌ Ошибка получения рыночных данных.")
+                return
 
-        position = open_positions[0]
-        market_data = self.trading_bot.bybit.get_market_data(
-            position['symbol'])
-        if not market_data:
-            await self._send_message(update, "❌ Ошибка получения рыночных данных.")
-            return
+            # Закрываем текущую позицию
+            result = await self.trading_bot.bybit.close_position_async(
+                position['symbol'], position['side'])
+            if result['success']:
+                await self._run_blocking(
+                    self.db.close_position, position['id'], result['price'] or market_data['price'])
+                await self._send_message(update, f"✅ Позиция #{position['id']} закрыта для переворота.")
+
+                # Открываем противоположную позицию (виртуальную - бот работает в виртуальном режиме)
+                new_side = "Sell" if position['side'] == 'BUY' else "Buy"
+                if new_side == "Buy":
+                    execute = self.trading_bot._execute_virtual_buy
+                    signal = {'action': 'BUY', 'confidence': 1.0, 'reason': 'Manual reversal'}
+                else:
+                    execute = self.trading_bot._execute_virtual_sell
+                    signal = {'action': 'SELL', 'confidence': 1.0, 'reason': 'Manual reversal'}
+
+                try:
+                    # Расчет размера и запись позиции блокируют - выполняем вне цикла событий
+                    position_amount = await self._run_blocking(
+                        self.trading_bot.calculate_position_size,
+                        position['symbol'], market_data['price'])
+                    await self._run_blocking(
+                        execute, position['symbol'], signal, market_data, position_amount)
+                except Exception as e:
+                    logger.exception("Ошибка открытия противоположной позиции для %s", position['symbol'])
+                    await self._send_message(
+                        update, f"❌ Позиция закрыта, но противоположная не открыта: {e}")
+                    return
 
-        # Закрываем текущую позицию
-        success = self.trading_bot.bybit.close_position(
-            position['symbol'], position['side'])
-        if success:
-            self.db.close_position(position['id'], market_data['price'])
-            await self._send_message(update, f"✅ Позиция #{position['id']} закрыта для переворота.")
-
-            # Открываем противоположную позицию
-            new_side = "Sell" if position['side'] == 'BUY' else "Buy"
-            position_amount = self.trading_bot.calculate_position_size(
-                market_data['price'])
-
-            if new_side == "Buy":
-                self.trading_bot._execute_buy(
-                    {'action': 'BUY', 'confidence': 1.0,
-                        'reason': 'Manual reversal'},
-                    market_data,
-                    position_amount
-                )
+                await self._send_message(update, f"✅ Открыта противоположная позиция ({new_side})")
             else:
-                self.trading_bot._execute_sell(
-                    {'action': 'SELL', 'confidence': 1.0,
-                        'reason': 'Manual reversal'},
-                    market_data,
-                    position_amount
-                )
+                await self._send_message(update, f"❌ Ошибка закрытия позиции для переворота.")
 
-            await self._send_message(update, f"✅ Открыта противоположная позиция ({new_side})")
-        else:
-            await self._send_message(update, f"❌ Ошибка закрытия позиции для переворота.")
+    @log_latency
+    async def _admin_only(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ответ разрешенному пользователю без прав администратора на админ-команду"""
+        await self._send_message(update, "❌ Эта команда доступна только администраторам.")
 
+    @log_latency
     async def _cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Отмена операции"""
-        if context.user_data:
-            context.user_data.clear()
+        if update.effective_user:
+            self._pending.pop(update.effective_user.id, None)
 
         await self._send_message(
             update,
             "❌ Операция отменена.",
             reply_markup=ReplyKeyboardRemove()
         )
-        return ConversationHandler.END
 
+    @log_latency
     async def _unknown(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик неизвестных команд"""
+        # Не отвечаем на устаревшие сообщения, доставленные повторно после простоя
+        if update.message and time.time() - update.message.date.timestamp() > STALE_MESSAGE_SECONDS:
+            return
+
         if update.message and update.message.text:
-            self.logger.warning(f"Неизвестная команда: {update.message.text}")
+            logger.warning("Неизвестная команда: %s", update.message.text)
 
         await self._send_message(
             update,
@@ -705,10 +1010,25 @@ class TelegramBot:
 
     def run(self):
         """Запуск бота"""
-        self.logger.info("🤖 Запуск Telegram бота...")
-        self.application.run_polling()
+        logger.info("🤖 Запуск Telegram бота...")
+        if uvloop is not None:
+            # run_polling создает цикл событий через текущую политику asyncio
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("⚡ Цикл событий: uvloop")
+        self.application.run_polling(
+            timeout=POLLING_TIMEOUT_SECONDS,
+            poll_interval=0.0,
+            bootstrap_retries=-1,
+            # Обрабатываем только сообщения; накопившиеся за время простоя обновления отбрасываем
+            allowed_updates=[Update.MESSAGE],
+            drop_pending_updates=True
+        )
 
     def stop(self):
         """Остановка бота"""
-        self.logger.info("🛑 Остановка Telegram бота...")
+        logger.info("🛑 Остановка Telegram бота...")
+        if self._profiler:
+            self._profiler.stop()
         self.application.stop()
+        self._db_pool.shutdown(wait=False)
+        self.trading_bot.bybit.close()
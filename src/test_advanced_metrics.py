@@ -11,6 +11,9 @@
 """
 
 import logging
+import os
+import sys
+import traceback
 from datetime import datetime, timedelta
 from backtester import BacktestEngine
 
@@ -25,6 +28,10 @@ logger = logging.getLogger(__name__)
 
 def explain_metrics():
     """Объясняет значение каждой метрики"""
+    # Справка - большой блок сообщений, при отключенном INFO не формируем его вовсе
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    
     logger.info("=" * 80)
     logger.info("📚 СПРАВКА ПО МЕТРИКАМ")
     logger.info("=" * 80)
@@ -94,13 +101,13 @@ def test_advanced_metrics():
     start_date = end_date - timedelta(days=14)  # 2 недели для достаточной статистики
     initial_balance = 10000.0
     
-    logger.info(f"\n⚙️ ПАРАМЕТРЫ БЭКТЕСТА:")
-    logger.info(f"   Символы: {', '.join(symbols)}")
-    logger.info(f"   Период: {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
-    logger.info(f"   Таймфрейм: {interval} минут")
-    logger.info(f"   Начальный баланс: ${initial_balance:.2f}")
-    logger.info(f"   Комиссии: Включены (Bybit: 0.055%/0.06%)")
-    logger.info(f"   Slippage: Включен (0.05%)")
+    logger.info("\n⚙️ ПАРАМЕТРЫ БЭКТЕСТА:")
+    logger.info("   Символы: %s", ', '.join(symbols))
+    logger.info("   Период: %s - %s", start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    logger.info("   Таймфрейм: %s минут", interval)
+    logger.info("   Начальный баланс: $%.2f", initial_balance)
+    logger.info("   Комиссии: Включены (Bybit: 0.055%/0.06%)")
+    logger.info("   Slippage: Включен (0.05%)")
     
     # Запуск бэктеста
     logger.info("\n🚀 Запуск бэктеста...")
@@ -123,20 +130,20 @@ def test_advanced_metrics():
     
     # Базовые метрики
     logger.info("\n💰 БАЗОВЫЕ ПОКАЗАТЕЛИ:")
-    logger.info(f"   ROI: {results['roi_percent']:.2f}%")
-    logger.info(f"   Прибыль: ${results['total_pnl']:.2f}")
-    logger.info(f"   Сделок: {results['total_trades']}")
-    logger.info(f"   Win Rate: {results['win_rate']:.2f}%")
+    logger.info("   ROI: %.2f%%", results['roi_percent'])
+    logger.info("   Прибыль: $%.2f", results['total_pnl'])
+    logger.info("   Сделок: %s", results['total_trades'])
+    logger.info("   Win Rate: %.2f%%", results['win_rate'])
     
     # Риск-метрики
     logger.info("\n📉 РИСК-МЕТРИКИ:")
-    logger.info(f"   Max Drawdown: {results['max_drawdown']:.2f}%")
+    logger.info("   Max Drawdown: %.2f%%", results['max_drawdown'])
     
     sharpe = results['sharpe_ratio']
     sortino = results['sortino_ratio']
     calmar = results['calmar_ratio']
     
-    logger.info(f"   Sharpe Ratio: {sharpe:.3f}")
+    logger.info("   Sharpe Ratio: %.3f", sharpe)
     if sharpe >= 2.0:
         logger.info("      ✅ Отличный результат! Стратегия эффективна с учетом риска.")
     elif sharpe >= 1.0:
@@ -146,11 +153,11 @@ def test_advanced_metrics():
     else:
         logger.info("      ⚠️ Низкий Sharpe Ratio. Риск слишком высок для такой доходности.")
     
-    logger.info(f"   Sortino Ratio: {sortino:.3f}")
+    logger.info("   Sortino Ratio: %.3f", sortino)
     if sortino > sharpe:
         logger.info("      💡 Sortino выше Sharpe - стратегия лучше защищена от просадок")
     
-    logger.info(f"   Calmar Ratio: {calmar:.3f}")
+    logger.info("   Calmar Ratio: %.3f", calmar)
     if calmar >= 1.0:
         logger.info("      ✅ Доходность превышает максимальную просадку")
     else:
@@ -160,7 +167,7 @@ def test_advanced_metrics():
     logger.info("\n💹 ТОРГОВЫЕ МЕТРИКИ:")
     
     pf = results['profit_factor']
-    logger.info(f"   Profit Factor: {pf:.2f}")
+    logger.info("   Profit Factor: %.2f", pf)
     if pf >= 2.0:
         logger.info("      ✅ Отлично! Прибыли вдвое превышают убытки.")
     elif pf >= 1.5:
@@ -171,31 +178,31 @@ def test_advanced_metrics():
         logger.info("      🔴 Стратегия убыточна!")
     
     exp = results['expectancy']
-    logger.info(f"   Expectancy: ${exp:.2f} на сделку")
+    logger.info("   Expectancy: $%.2f на сделку", exp)
     if exp > 0:
         total_expected = exp * results['total_trades']
-        logger.info(f"      💰 При {results['total_trades']} сделках ожидается: ${total_expected:.2f}")
+        logger.info("      💰 При %s сделках ожидается: $%.2f", results['total_trades'], total_expected)
     else:
         logger.info("      ⚠️ Отрицательное ожидание - стратегия убыточна")
     
     avg_duration = results['avg_trade_duration_hours']
     if avg_duration > 0:
         if avg_duration < 1:
-            logger.info(f"   Средняя длительность: {avg_duration * 60:.1f} минут (скальпинг)")
+            logger.info("   Средняя длительность: %.1f минут (скальпинг)", avg_duration * 60)
         elif avg_duration < 24:
-            logger.info(f"   Средняя длительность: {avg_duration:.1f} часов (дневная торговля)")
+            logger.info("   Средняя длительность: %.1f часов (дневная торговля)", avg_duration)
         else:
-            logger.info(f"   Средняя длительность: {avg_duration / 24:.1f} дней (свинг-трейдинг)")
+            logger.info("   Средняя длительность: %.1f дней (свинг-трейдинг)", avg_duration / 24)
     
     # Комиссии
     logger.info("\n💸 ВЛИЯНИЕ КОМИССИЙ:")
     fees = results['total_fees_paid']
     if fees > 0:
         fee_impact = (fees / initial_balance) * 100
-        logger.info(f"   Всего комиссий: ${fees:.4f} ({fee_impact:.3f}% от баланса)")
+        logger.info("   Всего комиссий: $%.4f (%.3f%% от баланса)", fees, fee_impact)
         if results['total_trades'] > 0:
             avg_fee = fees / results['total_trades']
-            logger.info(f"   Средняя комиссия на сделку: ${avg_fee:.4f}")
+            logger.info("   Средняя комиссия на сделку: $%.4f", avg_fee)
     
     # Итоговая оценка
     logger.info("\n" + "=" * 80)
@@ -235,7 +242,7 @@ def test_advanced_metrics():
     else:
         logger.info("❌ Max Drawdown высокий (≥ 20%)")
     
-    logger.info(f"\n📊 ОБЩИЙ БАЛЛ: {score}/{max_score}")
+    logger.info("\n📊 ОБЩИЙ БАЛЛ: %d/%d", score, max_score)
     
     if score >= 4:
         logger.info("🌟 ОТЛИЧНО! Стратегия показывает сильные результаты.")
@@ -256,7 +263,9 @@ if __name__ == "__main__":
         # Сначала объясняем метрики
         explain_metrics()
         
-        input("\n\n▶️  Нажмите Enter для запуска бэктеста...")
+        # В CI и скриптовых прогонах (нет терминала) не ждем нажатия Enter
+        if sys.stdin.isatty() and not os.environ.get('CI'):
+            input("\n\n▶️  Нажмите Enter для запуска бэктеста...")
         
         # Затем запускаем тест
         results = test_advanced_metrics()
@@ -268,8 +277,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("\n\n⏸️  Тест прерван пользователем")
     except Exception as e:
-        logger.error(f"❌ Ошибка выполнения теста: {e}")
-        import traceback
+        logger.error("❌ Ошибка выполнения теста: %s", e)
         traceback.print_exc()
 
 
@@ -7,6 +7,7 @@
 """
 
 import logging
+import traceback
 from datetime import datetime, timedelta
 from data_loader import DataLoader
 
@@ -31,6 +32,8 @@ def test_data_loading():
     # Настраиваем период (последние 7 дней)
     end_date = datetime.now()
     start_date = end_date - timedelta(days=7)
+    start_ms = int(start_date.timestamp() * 1000)
+    end_ms = int(end_date.timestamp() * 1000)
     
     print(f"\n📅 Период: {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
     
@@ -49,8 +52,10 @@ def test_data_loading():
     
     if btc_data:
         print(f"✅ Загружено {len(btc_data)} свечей для BTCUSDT")
-        print(f"   Первая свеча: {btc_data[0]['datetime']} - Цена: ${btc_data[0]['close']:.2f}")
-        print(f"   Последняя свеча: {btc_data[-1]['datetime']} - Цена: ${btc_data[-1]['close']:.2f}")
+        first_time = datetime.fromtimestamp(btc_data[0]['timestamp'] / 1000)
+        last_time = datetime.fromtimestamp(btc_data[-1]['timestamp'] / 1000)
+        print(f"   Первая свеча: {first_time} - Цена: ${btc_data[0]['close']:.2f}")
+        print(f"   Последняя свеча: {last_time} - Цена: ${btc_data[-1]['close']:.2f}")
     else:
         print("❌ Не удалось загрузить данные для BTCUSDT")
     
@@ -101,9 +106,6 @@ def test_data_loading():
     print("Тест 4: Проверка покрытия кеша")
     print("-" * 80)
     
-    start_ms = int(start_date.timestamp() * 1000)
-    end_ms = int(end_date.timestamp() * 1000)
-    
     cache_info = loader.db.check_cache_coverage(
         symbol='BTCUSDT',
         interval='15',
@@ -171,7 +173,6 @@ if __name__ == "__main__":
         print("\n\n⚠️  Прервано пользователем")
     except Exception as e:
         print(f"\n\n❌ Ошибка при выполнении тестов: {e}")
-        import traceback
         traceback.print_exc()
 
 
@@ -1,8 +1,6 @@
 import json
 from deepseek_client import DeepSeekClient
 import os
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def test_deepseek_with_debug():
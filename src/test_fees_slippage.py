@@ -6,6 +6,7 @@
 """
 
 import logging
+import traceback
 from datetime import datetime, timedelta
 from backtester import BacktestEngine
 
@@ -53,6 +54,10 @@ def test_fees_and_slippage():
     start_date = end_date - timedelta(days=7)
     initial_balance = 10000.0
     
+    # Свечи и индикаторы одинаковы для обоих прогонов - загружаем их один раз
+    logger.info("\n📦 Подготовка данных для обоих прогонов...")
+    prepared = engine_ideal.prepare(symbols, interval, start_date, end_date)
+    
     # Запуск бэктеста БЕЗ комиссий и slippage
     logger.info("\n🚀 Запуск идеального бэктеста...")
     results_ideal = engine_ideal.run_backtest(
@@ -60,7 +65,8 @@ def test_fees_and_slippage():
         interval=interval,
         start_date=start_date,
         end_date=end_date,
-        initial_balance=initial_balance
+        initial_balance=initial_balance,
+        prepared=prepared
     )
     
     # Запуск бэктеста С комиссиями и slippage
@@ -70,7 +76,8 @@ def test_fees_and_slippage():
         interval=interval,
         start_date=start_date,
         end_date=end_date,
-        initial_balance=initial_balance
+        initial_balance=initial_balance,
+        prepared=prepared
     )
     
     # Сравнение результатов
@@ -132,7 +139,6 @@ if __name__ == "__main__":
         
     except Exception as e:
         logger.error(f"❌ Ошибка выполнения теста: {e}")
-        import traceback
         traceback.print_exc()
 
 
@@ -1,7 +1,4 @@
 from trading_strategy import TradingBot
-import os
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def test_final():
@@ -3,8 +3,11 @@
 Быстрый тест бэктестинга с новой быстрой стратегией.
 """
 
+import json
 import sys
 import os
+import time
+import traceback
 from datetime import datetime, timedelta
 import logging
 
@@ -43,12 +46,13 @@ def test_quick_backtest():
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
     
-    logger.info(f"📊 Параметры:")
-    logger.info(f"   Символы: {', '.join(symbols)}")
-    logger.info(f"   Интервал: {interval} минут")
-    logger.info(f"   Период: {days} дней ({start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')})")
-    logger.info(f"   Баланс: ${initial_balance:.2f}")
-    logger.info(f"   Стратегия: Быстрая (Техническая)")
+    logger.info("📊 Параметры:")
+    logger.info("   Символы: %s", ', '.join(symbols))
+    logger.info("   Интервал: %s минут", interval)
+    logger.info("   Период: %d дней (%s - %s)", days,
+                start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    logger.info("   Баланс: $%.2f", initial_balance)
+    logger.info("   Стратегия: Быстрая (Техническая)")
     
     # Включаем комиссии и slippage для реалистичности
     engine.use_fees_in_backtest = True
@@ -56,8 +60,7 @@ def test_quick_backtest():
     
     print("\n🚀 Запуск бэктеста...\n")
     
-    import time
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
     # Запускаем бэктест
     results = engine.run_backtest(
@@ -68,57 +71,64 @@ def test_quick_backtest():
         initial_balance=initial_balance
     )
     
-    elapsed_time = time.time() - start_time
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    elapsed_time = elapsed_ns / 1e9
     
     if not results:
         logger.error("❌ Бэктест не вернул результатов")
         return None
     
-    # Выводим результаты
-    print("\n" + "="*80)
-    print("📊 РЕЗУЛЬТАТЫ БЫСТРОГО ТЕСТА")
-    print("="*80)
-    
-    print(f"\n⏱️  Время выполнения: {elapsed_time:.2f} секунд")
-    print(f"📊 Обработано свечей: {results.get('total_candles', 'N/A')}")
-    
-    print(f"\n💰 ФИНАНСОВЫЕ РЕЗУЛЬТАТЫ:")
-    print(f"   Начальный баланс: ${results['initial_balance']:.2f}")
-    print(f"   Финальный баланс: ${results['final_balance']:.2f}")
-    print(f"   Прибыль/Убыток: ${results['total_pnl']:.2f}")
-    print(f"   ROI: {results['roi_percent']:.2f}%")
-    
-    print(f"\n🎯 СТАТИСТИКА СДЕЛОК:")
-    print(f"   Всего сделок: {results['total_trades']}")
-    print(f"   Прибыльных: {results['winning_trades']}")
-    print(f"   Убыточных: {results['losing_trades']}")
-    print(f"   Win Rate: {results['win_rate']:.2f}%")
-    
-    print(f"\n📉 РИСКИ:")
-    print(f"   Max Drawdown: {results['max_drawdown']:.2f}%")
-    print(f"   Макс. баланс: ${results.get('max_balance', results['final_balance']):.2f}")
-    print(f"   Мин. баланс: ${results.get('min_balance', results['final_balance']):.2f}")
-    
-    print(f"\n📊 ПРОДВИНУТЫЕ МЕТРИКИ:")
-    print(f"   Sharpe Ratio: {results['sharpe_ratio']:.3f}")
-    print(f"   Sortino Ratio: {results['sortino_ratio']:.3f}")
-    print(f"   Calmar Ratio: {results['calmar_ratio']:.3f}")
-    print(f"   Profit Factor: {results['profit_factor']:.2f}")
-    print(f"   Expectancy: ${results['expectancy']:.2f} на сделку")
+    # Выводим результаты одним print
+    lines = [
+        "\n" + "="*80,
+        "📊 РЕЗУЛЬТАТЫ БЫСТРОГО ТЕСТА",
+        "="*80,
+        f"\n⏱️  Время выполнения: {elapsed_time:.2f} секунд",
+        f"📊 Обработано свечей: {results.get('total_candles', 'N/A')}",
+        "\n💰 ФИНАНСОВЫЕ РЕЗУЛЬТАТЫ:",
+        f"   Начальный баланс: ${results['initial_balance']:.2f}",
+        f"   Финальный баланс: ${results['final_balance']:.2f}",
+        f"   Прибыль/Убыток: ${results['total_pnl']:.2f}",
+        f"   ROI: {results['roi_percent']:.2f}%",
+        "\n🎯 СТАТИСТИКА СДЕЛОК:",
+        f"   Всего сделок: {results['total_trades']}",
+        f"   Прибыльных: {results['winning_trades']}",
+        f"   Убыточных: {results['losing_trades']}",
+        f"   Win Rate: {results['win_rate']:.2f}%",
+        "\n📉 РИСКИ:",
+        f"   Max Drawdown: {results['max_drawdown']:.2f}%",
+        f"   Макс. баланс: ${results.get('max_balance', results['final_balance']):.2f}",
+        f"   Мин. баланс: ${results.get('min_balance', results['final_balance']):.2f}",
+        "\n📊 ПРОДВИНУТЫЕ МЕТРИКИ:",
+        f"   Sharpe Ratio: {results['sharpe_ratio']:.3f}",
+        f"   Sortino Ratio: {results['sortino_ratio']:.3f}",
+        f"   Calmar Ratio: {results['calmar_ratio']:.3f}",
+        f"   Profit Factor: {results['profit_factor']:.2f}",
+        f"   Expectancy: ${results['expectancy']:.2f} на сделку",
+    ]
     
     if results['total_trades'] > 0:
-        print(f"   Средняя длительность: {results['avg_trade_duration_hours']:.1f} часов")
+        lines.append(f"   Средняя длительность: {results['avg_trade_duration_hours']:.1f} часов")
     
     # Оценка скорости
-    print(f"\n⚡ ПРОИЗВОДИТЕЛЬНОСТЬ:")
+    lines.append("\n⚡ ПРОИЗВОДИТЕЛЬНОСТЬ:")
     if elapsed_time < 30:
-        print(f"   ✅ ОТЛИЧНО! Бэктест завершен за {elapsed_time:.1f}s")
+        lines.append(f"   ✅ ОТЛИЧНО! Бэктест завершен за {elapsed_time:.1f}s")
     elif elapsed_time < 60:
-        print(f"   👍 ХОРОШО! Бэктест завершен за {elapsed_time:.1f}s")
+        lines.append(f"   👍 ХОРОШО! Бэктест завершен за {elapsed_time:.1f}s")
     else:
-        print(f"   ⚠️  МЕДЛЕННО: {elapsed_time:.1f}s (ожидалось <60s)")
+        lines.append(f"   ⚠️  МЕДЛЕННО: {elapsed_time:.1f}s (ожидалось <60s)")
     
-    print("\n" + "="*80)
+    lines.append("\n" + "="*80)
+    print("\n".join(lines))
+    
+    # Машиночитаемая строка для отслеживания производительности между прогонами
+    total_candles = results.get('total_candles', engine.total_candles)
+    print(json.dumps({
+        'elapsed_ns': elapsed_ns,
+        'candles': total_candles,
+        'ns_per_candle': elapsed_ns / max(1, total_candles),
+    }))
     
     return results
 
@@ -128,18 +138,19 @@ if __name__ == '__main__':
         results = test_quick_backtest()
         
         if results:
-            print("\n✅ Тест успешно завершен!")
-            print("\n💡 Следующие шаги:")
-            print("   1. Откройте Web UI: http://localhost:5000")
-            print("   2. Запустите бэктест через интерфейс")
-            print("   3. Проверьте что прогресс-бар работает")
-            print("   4. Посмотрите на графики результатов")
+            print("\n".join([
+                "\n✅ Тест успешно завершен!",
+                "\n💡 Следующие шаги:",
+                "   1. Откройте Web UI: http://localhost:5000",
+                "   2. Запустите бэктест через интерфейс",
+                "   3. Проверьте что прогресс-бар работает",
+                "   4. Посмотрите на графики результатов",
+            ]))
         
     except KeyboardInterrupt:
         logger.info("\n\n⏸️  Тест прерван пользователем")
     except Exception as e:
-        logger.error(f"❌ Ошибка выполнения теста: {e}")
-        import traceback
+        logger.error("❌ Ошибка выполнения теста: %s", e)
         traceback.print_exc()
 
 
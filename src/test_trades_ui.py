@@ -3,96 +3,111 @@
 Создаем несколько тестовых сделок вручную для проверки.
 """
 
-import sys
-sys.path.append('src')
-
 from database import Database
 from datetime import datetime, timedelta
-import random
 
-def create_test_trades():
-    """Создаем тестовые сделки"""
+import numpy as np
+
+# Символы тестовых сделок: (базовая цена, разброс цены входа)
+TEST_PRICE_RANGES = {
+    'BTCUSDT': (95000, 5000),
+    'ETHUSDT': (3500, 500),
+    'SOLUSDT': (200, 50),
+    'XRPUSDT': (2.5, 0.5),
+}
+SYMBOLS = np.array(list(TEST_PRICE_RANGES))
+BASE_PRICES, PRICE_SPREADS = np.array(list(TEST_PRICE_RANGES.values()), dtype=float).T
+
+# Комиссия за вход и за выход (0.06%)
+FEE_RATE = 0.0006
+
+# Сид генератора: одни и те же сделки при каждом запуске (None - случайные)
+TEST_TRADES_SEED = 0xC0FFEE
+
+
+def compute_trade_pnl(entry_price, exit_price, size, side_sign, fee_rate=FEE_RATE):
+    """PnL закрытых сделок за один проход по массивам (работает и со скалярами).
+
+    side_sign: 1.0 для BUY (прибыль при росте цены), -1.0 для SELL.
+    Возвращает (pnl_net, entry_fee, exit_fee, pnl_percent).
+    """
+    # Номинал > 0: цена от 2 USDT, размер от 0.001 - без проверки на ноль
+    notional = entry_price * size
+    entry_fee = notional * fee_rate
+    exit_fee = exit_price * size * fee_rate
+    pnl_net = side_sign * (exit_price - entry_price) * size - entry_fee - exit_fee
+    return pnl_net, entry_fee, exit_fee, pnl_net / notional * 100
+
+
+def create_test_trades(seed: int | None = TEST_TRADES_SEED):
+    """Создаем тестовые сделки (воспроизводимые при одинаковом seed)"""
     db = Database()
     
     print("🧪 Создание тестовых сделок...")
     
+    count = 15
+    
+    base_time = datetime.now() - timedelta(days=7)
+    
     # Очищаем старые тестовые позиции
-    db._execute_query("DELETE FROM virtual_positions", fetch=False)
+    db.clear_virtual_positions()
     print("  ✅ Старые позиции очищены")
     
-    symbols = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT']
-    sides = ['BUY', 'SELL']
+    # Генерируем все 15 сделок сразу - по одной векторной операции на величину
+    rng = np.random.default_rng(seed)
+    symbol_idx = rng.integers(0, len(SYMBOLS), count)
+    is_buy = rng.integers(0, 2, count).astype(bool)
     
-    base_time = datetime.now() - timedelta(days=7)
+    entry_price = BASE_PRICES[symbol_idx] + PRICE_SPREADS[symbol_idx] * rng.uniform(-1, 1, count)
+    size = rng.uniform(0.001, 0.1, count)
     
-    # Создаем 15 тестовых сделок
-    for i in range(15):
-        symbol = random.choice(symbols)
-        side = random.choice(sides)
-        
-        # Генерируем реалистичные цены
-        if symbol == 'BTCUSDT':
-            entry_price = 95000 + random.uniform(-5000, 5000)
-        elif symbol == 'ETHUSDT':
-            entry_price = 3500 + random.uniform(-500, 500)
-        elif symbol == 'SOLUSDT':
-            entry_price = 200 + random.uniform(-50, 50)
-        else:  # XRPUSDT
-            entry_price = 2.5 + random.uniform(-0.5, 0.5)
-        
-        # Генерируем размер позиции
-        size = random.uniform(0.001, 0.1)
-        
-        # Генерируем выходную цену (±1-5%)
-        price_change_percent = random.uniform(-5, 5)
-        exit_price = entry_price * (1 + price_change_percent / 100)
-        
-        # Рассчитываем PnL
-        if side == 'BUY':
-            pnl_gross = (exit_price - entry_price) * size
-        else:
-            pnl_gross = (entry_price - exit_price) * size
-        
-        # Комиссии
-        entry_fee = entry_price * size * 0.0006  # 0.06%
-        exit_fee = exit_price * size * 0.0006
-        total_fees = entry_fee + exit_fee
-        
-        pnl_net = pnl_gross - total_fees
-        pnl_percent = (pnl_net / (entry_price * size)) * 100 if (entry_price * size) > 0 else 0
-        
-        # Создаем временные метки
-        created_at = base_time + timedelta(hours=i * 8)
-        closed_at = created_at + timedelta(minutes=random.randint(15, 240))
-        
-        # Добавляем позицию
-        position_id = db.add_virtual_position(
-            symbol=symbol,
-            side=side,
-            size=size,
-            entry_price=entry_price,
-            leverage=5,
-            entry_fee=entry_fee
-        )
-        
-        if position_id and position_id > 0:
-            # Закрываем позицию
-            db.close_virtual_position(
-                position_id=position_id,
-                exit_price=exit_price,
-                close_reason='test' if i % 2 == 0 else 'take_profit',
-                exit_fee=exit_fee
-            )
-            
-            result = "✅ WIN" if pnl_net > 0 else "❌ LOSS"
-            print(f"  {result} #{position_id}: {side:4} {symbol:10} PnL: ${pnl_net:+7.2f} ({pnl_percent:+.2f}%)")
-        else:
-            print(f"  ❌ FAILED to create position: ID={position_id}")
-    
-    print(f"\n✅ Создано {len(db.get_virtual_closed_positions())} тестовых сделок")
+    # Выходная цена (±1-5%)
+    exit_price = entry_price * (1 + rng.uniform(-5, 5, count) / 100)
     
-    # Показываем статистику
+    pnl_net, entry_fee, exit_fee, pnl_percent = compute_trade_pnl(
+        entry_price, exit_price, size, np.where(is_buy, 1.0, -1.0))
+    
+    # Как в close_virtual_position: убыточный тейк-профит записывается как стоп-лосс
+    close_reason = np.where(np.arange(count) % 2 == 0, 'test',
+                            np.where(pnl_net < 0, 'stop_loss', 'take_profit'))
+    
+    # Время открытия - каждые 8 часов, длительность сделки 15-240 минут
+    created_at = np.datetime64(base_time, 'us') + np.arange(count) * np.timedelta64(8, 'h')
+    closed_at = created_at + rng.integers(15, 241, count).astype('timedelta64[m]')
+    created_at, closed_at = created_at.tolist(), closed_at.tolist()
+    
+    # Создаем 15 тестовых сделок (сразу закрытыми) и пишем их одним executemany
+    trades = []
+    for i in range(count):
+        trades.append({
+            'symbol': str(SYMBOLS[symbol_idx[i]]),
+            'side': 'BUY' if is_buy[i] else 'SELL',
+            'size': float(size[i]),
+            'entry_price': float(entry_price[i]),
+            'exit_price': float(exit_price[i]),
+            'leverage': 5,
+            'realized_pnl': float(pnl_net[i]),
+            'pnl_percent': float(pnl_percent[i]),
+            'entry_fee': float(entry_fee[i]),
+            'exit_fee': float(exit_fee[i]),
+            'close_reason': str(close_reason[i]),
+            'created_at': created_at[i],
+            'closed_at': closed_at[i]
+        })
+    
+    if db.add_closed_virtual_positions(trades) != len(trades):
+        print("  ❌ FAILED to create positions")
+    
+    for trade in trades:
+        result = "✅ WIN" if trade['realized_pnl'] > 0 else "❌ LOSS"
+        print(f"  {result} {trade['side']:4} {trade['symbol']:10} "
+              f"PnL: ${trade['realized_pnl']:+7.2f} ({trade['pnl_percent']:+.2f}%)")
+    
+    # Количество и статистика - одним агрегирующим запросом, без выборки всех строк
     stats = db.get_virtual_trade_stats(days=30)
+    print(f"\n✅ Создано {stats.get('closed_trades', 0)} тестовых сделок")
+    
+    # Показываем статистику
     print(f"\n📊 Статистика:")
     print(f"  Всего сделок: {stats.get('total_trades', 0)}")
     print(f"  Закрытых: {stats.get('closed_trades', 0)}")
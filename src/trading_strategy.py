@@ -1,13 +1,55 @@
-import pytz
 from deepseek_client import DeepSeekClient
 from bybit_client import BybitClient
 from database import Database
 from config import Config
+from utils.notifier import TelegramNotifier, moscow_now
+from utils.signals import fetch_signals
 import time
 import logging
-from datetime import datetime
 from typing import Dict, List
 
+# Сколько секунд баланс с биржи считается свежим (повторные запросы в итерации не нужны)
+BALANCE_TTL_SECONDS = 5.0
+
+# Шаблон уведомления о сделке (заполняется через str.format_map)
+TRADE_NOTIFICATION_TEMPLATE = """
+{direction_emoji} *{action} - {direction_text}*
+
+🆔 *ID позиции:* #{position_id}
+💹 *Символ:* {symbol}
+💰 *Общий баланс:* {trading_balance:.2f} USDT ({balance_source})
+{arrow} *Изменение:* {balance_change:+.2f} USDT ({balance_change_percent:+.2f}%)
+📊 *Начальный баланс:* {initial_balance:.2f} USDT
+💵 *Размер позиции:* {size:.4f}
+🔢 *Леверидж:* {leverage}x
+💸 *Цена входа:* ${entry_price:.2f}
+📉 *Стоп-лосс:* ${stop_loss:.2f}
+📈 *Тейк-профит:* ${take_profit:.2f}
+
+🎯 *Сигнал AI:* {signal_action}
+⭐ *Уверенность:* {confidence:.2f}
+💭 *Причина:* {reason}
+
+⏰ *Время (МСК):* {time}
+📅 *Дата:* {date}
+"""
+
+POSITION_CLOSED_TEMPLATE = """
+🔒 *ПОЗИЦИЯ ЗАКРЫТА*
+
+🆔 *ID:* #{id}
+💹 *Символ:* {symbol}
+📊 *Сторона:* {side}
+💵 *Цена входа:* ${entry_price:.2f}
+💰 *Цена выхода:* ${close_price:.2f}
+{pnl_emoji} *P&L:* {pnl:.2f} USDT ({pnl_percent:.2f}%)
+🔢 *Размер:* {size:.4f}
+⚡ *Леверидж:* {leverage}x
+
+⏰ *Время (МСК):* {time}
+📅 *Дата:* {date}
+"""
+
 
 class TradingBot:
     def __init__(self):
@@ -16,6 +58,9 @@ class TradingBot:
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
+        # Версия настроек: увеличивается при каждой перезагрузке из БД
+        self.settings_version = 0
+
         # Инициализируем настройки по умолчанию в БД при первом запуске
         self._initialize_default_settings()
 
@@ -26,10 +71,17 @@ class TradingBot:
         self.deepseek = DeepSeekClient()
         self.bybit = BybitClient()
 
+        # Telegram-рассылка в фоновом потоке, не задерживает торговлю
+        self.notifier = TelegramNotifier(self.db, Config.TELEGRAM_BOT_TOKEN)
+
         # Трекер состояния
         self.balance_info = {}
+        # Тип счета, на котором в последний раз нашелся баланс (UNIFIED или SPOT)
+        self._balance_account_type = "UNIFIED"
+        # time.monotonic() последнего успешного обновления баланса (0 - нужно обновить)
+        self._balance_updated_at = 0.0
         self.initial_balance = float(
-            self.db.get_setting('initial_balance', '1000.0'))
+            self._get_setting_cached('initial_balance', '1000.0'))
         self.highest_balance = self.initial_balance
         self.lowest_balance = self.initial_balance
 
@@ -42,8 +94,8 @@ class TradingBot:
         # Запускаем WebSocket
         self.bybit.start_websocket()
 
-        self.logger.info(
-            f"🔧 Инициализирован бот для {len(self.symbols)} символов с левериджем {self.leverage}x")
+        self.logger.info("🔧 Инициализирован бот для %s символов с левериджем %sx",
+                         len(self.symbols), self.leverage)
 
     def _initialize_default_settings(self):
         """Инициализация настроек по умолчанию в базе данных"""
@@ -87,75 +139,89 @@ class TradingBot:
             'trading_interval_minutes': '15'
         }
 
+        existing = self.db.get_settings(list(default_settings))
         for key, value in default_settings.items():
-            current_value = self.db.get_setting(key)
-            if not current_value:
+            if not existing.get(key):
                 self.db.set_setting(key, value)
-                self.logger.info(
-                    f"📝 Инициализирована настройка {key} = {value}")
+                self.logger.info("📝 Инициализирована настройка %s = %s", key, value)
 
     def _load_settings_from_db(self):
         """Загрузка всех настроек из базы данных"""
+        # Все настройки одним запросом вместо отдельного запроса на каждую
+        self._settings_cache = self.db.get_settings()
+        setting = self._get_setting_cached
+
         # Торговые настройки
-        self.symbols = self.db.get_setting(
+        self.symbols = setting(
             'trading_symbols', 'ETHUSDT,BTCUSDT,ADAUSDT').split(',')
-        self.main_symbol = self.db.get_setting('default_symbol', 'ETHUSDT')
-        self.leverage = int(self.db.get_setting('leverage', '5'))
+        self.main_symbol = setting('default_symbol', 'ETHUSDT')
+        self.leverage = int(setting('leverage', '5'))
         self.min_confidence = float(
-            self.db.get_setting('min_confidence', '0.68'))
+            setting('min_confidence', '0.68'))
 
         # Риск-менеджмент
-        self.risk_percent = float(self.db.get_setting('risk_percent', '2.0'))
+        self.risk_percent = float(setting('risk_percent', '2.0'))
         self.max_position_percent = float(
-            self.db.get_setting('max_position_percent', '20.0'))
+            setting('max_position_percent', '20.0'))
+        # Доли баланса для calculate_position_size - пересчитываются только при загрузке настроек
+        self._risk_fraction = self.risk_percent / 100
+        self._max_position_fraction = self.max_position_percent / 100
         self.max_total_position_percent = float(
-            self.db.get_setting('max_total_position_percent', '30.0'))
+            setting('max_total_position_percent', '30.0'))
         self.min_trade_usdt = float(
-            self.db.get_setting('min_trade_usdt', '10.0'))
+            setting('min_trade_usdt', '10.0'))
         self.stop_loss_percent = float(
-            self.db.get_setting('stop_loss_percent', '2.0'))
+            setting('stop_loss_percent', '2.0'))
         self.take_profit_percent = float(
-            self.db.get_setting('take_profit_percent', '4.0'))
+            setting('take_profit_percent', '4.0'))
 
         # Трейлинг-стоп
         self.trailing_stop_activation = float(
-            self.db.get_setting('trailing_stop_activation_percent', '0.5'))
+            setting('trailing_stop_activation_percent', '0.5'))
         self.trailing_stop_distance = float(
-            self.db.get_setting('trailing_stop_distance_percent', '0.3'))
+            setting('trailing_stop_distance_percent', '0.3'))
 
         # Поведение торговли
-        self.allow_short_positions = self.db.get_setting(
+        self.allow_short_positions = setting(
             'allow_short_positions', 'true').lower() == 'true'
-        self.allow_long_positions = self.db.get_setting(
+        self.allow_long_positions = setting(
             'allow_long_positions', 'true').lower() == 'true'
-        self.auto_position_reversal = self.db.get_setting(
+        self.auto_position_reversal = setting(
             'auto_position_reversal', 'true').lower() == 'true'
 
         # Уведомления
-        self.enable_notifications = self.db.get_setting(
+        self.enable_notifications = setting(
             'enable_notifications', 'true').lower() == 'true'
-        self.enable_trade_logging = self.db.get_setting(
+        self.enable_trade_logging = setting(
             'enable_trade_logging', 'true').lower() == 'true'
 
         # DeepSeek настройки
-        self.deepseek_model = self.db.get_setting(
+        self.deepseek_model = setting(
             'deepseek_model', 'deepseek-chat')
         self.deepseek_max_tokens = int(
-            self.db.get_setting('deepseek_max_tokens', '10000'))
+            setting('deepseek_max_tokens', '10000'))
         self.deepseek_temperature = float(
-            self.db.get_setting('deepseek_temperature', '0.68'))
+            setting('deepseek_temperature', '0.68'))
 
         # Интервал
         self.trading_interval_minutes = int(
-            self.db.get_setting('trading_interval_minutes', '15'))
+            setting('trading_interval_minutes', '15'))
 
+        self.settings_version += 1
         self.logger.info("✅ Настройки загружены из базы данных")
 
+    def _get_setting_cached(self, key: str, default: str = '') -> str:
+        """Настройка из снимка таблицы settings, без запроса к БД.
+
+        Снимок обновляется в _load_settings_from_db (в том числе из update_setting).
+        """
+        return self._settings_cache.get(key) or default
+
     def update_setting(self, key: str, value: str):
         """Обновление настройки и перезагрузка"""
         self.db.set_setting(key, value)
         self._load_settings_from_db()
-        self.logger.info(f"🔄 Настройка {key} обновлена на {value}")
+        self.logger.info("🔄 Настройка %s обновлена на %s", key, value)
 
     def _setup_allowed_users(self):
         """Добавление разрешенных пользователей (здесь укажите свои user_id)"""
@@ -184,7 +250,7 @@ class TradingBot:
             created_time = position_data.get('createdTime', '')
             updated_time = position_data.get('updatedTime', '')
 
-            self.logger.info(f"🔄 Обновление позиции: {symbol} {side} {size}")
+            self.logger.info("🔄 Обновление позиции: %s %s %s", symbol, side, size)
 
             # Если позиция закрыта (размер = 0), но у нас она есть в базе
             if size == 0:
@@ -196,8 +262,7 @@ class TradingBot:
                         close_price = market_data['price'] if market_data else db_position['current_price']
 
                         self.db.close_position(db_position['id'], close_price)
-                        self.logger.info(
-                            f"✅ Позиция #{db_position['id']} закрыта через WebSocket")
+                        self.logger.info("✅ Позиция #%s закрыта через WebSocket", db_position['id'])
 
                         # Отправляем уведомление
                         self._send_position_closed_notification(
@@ -215,7 +280,7 @@ class TradingBot:
                         break
 
         except Exception as e:
-            self.logger.error(f"❌ Ошибка обработки обновления позиции: {e}")
+            self.logger.error("❌ Ошибка обработки обновления позиции: %s", e)
 
     def _handle_order_update(self, order_data: Dict):
         """Обработка обновлений ордеров из WebSocket"""
@@ -229,19 +294,17 @@ class TradingBot:
             price = order_data.get('price', '0')
             created_time = order_data.get('createdTime', '')
 
-            self.logger.info(
-                f"🔄 Обновление ордера: {order_id} {order_status} {symbol}")
+            self.logger.info("🔄 Обновление ордера: %s %s %s", order_id, order_status, symbol)
 
             # Если ордер исполнен
             if order_status in ['Filled', 'PartiallyFilled']:
                 market_data = self.bybit.get_market_data(symbol)
                 if market_data:
                     current_price = market_data['price']
-                    self.logger.info(
-                        f"✅ Ордер {order_id} исполнен по цене {current_price}")
+                    self.logger.info("✅ Ордер %s исполнен по цене %s", order_id, current_price)
 
         except Exception as e:
-            self.logger.error(f"❌ Ошибка обработки обновления ордера: {e}")
+            self.logger.error("❌ Ошибка обработки обновления ордера: %s", e)
 
     def _send_position_closed_notification(self, position: Dict, close_price: float):
         """Отправка уведомления о закрытии позиции всем пользователям"""
@@ -259,27 +322,26 @@ class TradingBot:
                 pnl = -pnl
                 pnl_percent = -pnl_percent
 
-            moscow_time = self._get_moscow_time()
-            pnl_emoji = "📈" if pnl >= 0 else "📉"
-
-            message = f"""
-            🔒 *ПОЗИЦИЯ ЗАКРЫТА*
-
-            🆔 *ID:* #{position['id']}
-            💹 *Символ:* {position['symbol']}
-            📊 *Сторона:* {position['side']}
-            💵 *Цена входа:* ${position['entry_price']:.2f}
-            💰 *Цена выхода:* ${close_price:.2f}
-            {pnl_emoji} *P&L:* {pnl:.2f} USDT ({pnl_percent:.2f}%)
-            🔢 *Размер:* {position['size']:.4f}
-            ⚡ *Леверидж:* {position['leverage']}x
-
-            ⏰ *Время (МСК):* {moscow_time.strftime("%H:%M:%S")}
-            📅 *Дата:* {moscow_time.strftime("%d.%m.%Y")}
-            """
-
-            # Отправляем сообщение всем пользователям
-            self._broadcast_message(message)
+            # Сообщение собираем, только если Telegram настроен (запись в журнал нужна в любом случае)
+            if self.notifier.enabled:
+                moscow_time = moscow_now()
+                message = POSITION_CLOSED_TEMPLATE.format_map({
+                    'id': position['id'],
+                    'symbol': position['symbol'],
+                    'side': position['side'],
+                    'entry_price': position['entry_price'],
+                    'close_price': close_price,
+                    'pnl_emoji': "📈" if pnl >= 0 else "📉",
+                    'pnl': pnl,
+                    'pnl_percent': pnl_percent,
+                    'size': position['size'],
+                    'leverage': position['leverage'],
+                    'time': moscow_time.strftime("%H:%M:%S"),
+                    'date': moscow_time.strftime("%d.%m.%Y"),
+                })
+
+                # Отправляем сообщение всем пользователям
+                self.notifier.broadcast(message)
 
             # Логируем закрытие позиции
             if self.enable_trade_logging:
@@ -293,61 +355,66 @@ class TradingBot:
                 )
 
         except Exception as e:
-            self.logger.warning(
-                f"Не удалось отправить уведомление о закрытии позиции: {e}")
+            self.logger.warning("Не удалось отправить уведомление о закрытии позиции: %s", e)
 
-    def update_balance(self):
-        """Обновляем информацию о балансе с учетом открытых позиций"""
-        try:
-            balance = self.bybit.get_wallet_balance("UNIFIED")
+    def update_balance(self, force: bool = False):
+        """Обновляем информацию о балансе с учетом открытых позиций.
 
+        Баланс, полученный меньше BALANCE_TTL_SECONDS назад, не запрашивается повторно
+        (force=True - запросить в любом случае). Сделки сбрасывают кеш через _invalidate_balance().
+        """
+        if not force and time.monotonic() - self._balance_updated_at < BALANCE_TTL_SECONDS:
+            return True
+
+        try:
+            # Сначала запрашиваем счет, на котором баланс нашелся в прошлый раз:
+            # при SPOT-счете в установившемся режиме это один запрос вместо двух
+            account_type = self._balance_account_type
+            balance = self.bybit.get_wallet_balance(account_type)
+            if balance['total_equity'] <= 0:
+                account_type = "SPOT" if account_type == "UNIFIED" else "UNIFIED"
+                balance = self.bybit.get_wallet_balance(account_type)
             if balance['total_equity'] > 0:
-                # Получаем информацию об открытых позициях
+                self._balance_account_type = account_type
+
+            # Открытые позиции учитываются только на UNIFIED-счете (деривативы)
+            total_position_value = unrealized_pnl = 0
+            if account_type == "UNIFIED":
                 open_positions = self.db.get_open_positions()
                 total_position_value = self._calculate_total_position_value(
                     open_positions)
                 unrealized_pnl = self._calculate_unrealized_pnl(open_positions)
 
-                self.balance_info = {
-                    'source': 'UNIFIED',
-                    'total_equity': balance['total_equity'],
-                    'total_available': balance['total_available_balance'],
-                    'usdt_balance': balance['usdt_balance'],
-                    'total_used_margin': balance.get('total_used_margin', 0),
-                    'open_positions_value': total_position_value,
-                    'unrealized_pnl': unrealized_pnl,
-                    'total_balance_with_positions': balance['total_equity'] + unrealized_pnl,
-                    'full_info': balance
-                }
-            else:
-                # Пробуем SPOT как запасной вариант
-                balance = self.bybit.get_wallet_balance("SPOT")
-                self.balance_info = {
-                    'source': 'SPOT',
-                    'total_equity': balance['total_equity'],
-                    'total_available': balance['total_available_balance'],
-                    'usdt_balance': balance['usdt_balance'],
-                    'open_positions_value': 0,
-                    'unrealized_pnl': 0,
-                    'total_balance_with_positions': balance['total_equity'],
-                    'full_info': balance
-                }
+            self.balance_info = {
+                'source': account_type,
+                'total_equity': balance['total_equity'],
+                'total_available': balance['total_available_balance'],
+                'usdt_balance': balance['usdt_balance'],
+                'total_used_margin': balance.get('total_used_margin', 0),
+                'open_positions_value': total_position_value,
+                'unrealized_pnl': unrealized_pnl,
+                'total_balance_with_positions': balance['total_equity'] + unrealized_pnl,
+                'full_info': balance
+            }
 
             # Обновляем максимальный и минимальный баланс
             current_balance = self.balance_info['total_balance_with_positions']
-            if current_balance > self.highest_balance:
-                self.highest_balance = current_balance
-            if current_balance < self.lowest_balance:
-                self.lowest_balance = current_balance
+            self.highest_balance = max(self.highest_balance, current_balance)
+            self.lowest_balance = min(self.lowest_balance, current_balance)
 
-            self.logger.info(
-                f"💰 Баланс: {current_balance:.2f} USDT (позиции: {self.balance_info['open_positions_value']:.2f} USDT)")
+            self.logger.info("💰 Баланс: %.2f USDT (позиции: %.2f USDT)",
+                             current_balance, self.balance_info['open_positions_value'])
+            self._balance_updated_at = time.monotonic()
             return True
 
         except Exception as e:
-            self.logger.error(f"❌ Ошибка обновления баланса: {e}")
+            self.logger.error("❌ Ошибка обновления баланса: %s", e)
             return False
 
+    def _invalidate_balance(self):
+        """Сбрасывает кеш баланса: после сделки следующий update_balance пойдет на биржу"""
+        self._balance_updated_at = 0.0
+
     def get_all_settings(self) -> Dict[str, str]:
         """Получение всех текущих настроек"""
         settings_keys = [
@@ -361,11 +428,8 @@ class TradingBot:
             'trading_interval_minutes'
         ]
 
-        settings = {}
-        for key in settings_keys:
-            settings[key] = self.db.get_setting(key, '')
-
-        return settings
+        settings = self.db.get_settings(settings_keys)
+        return {key: settings.get(key) or '' for key in settings_keys}
 
     def _calculate_total_position_value(self, positions: List[Dict]) -> float:
         """Рассчитывает общую стоимость открытых позиций"""
@@ -420,11 +484,10 @@ class TradingBot:
             return 0
 
         # Рассчитываем сумму для сделки на основе процента риска
-        risk_amount = trading_balance * (self.risk_percent / 100)
+        risk_amount = trading_balance * self._risk_fraction
 
         # Ограничиваем максимальный размер позиции
-        max_position_amount = trading_balance * \
-            (self.max_position_percent / 100)
+        max_position_amount = trading_balance * self._max_position_fraction
         position_amount = min(risk_amount, max_position_amount)
 
         # Учитываем леверидж
@@ -437,9 +500,8 @@ class TradingBot:
         # Проверяем минимальную сумму с учетом минимального размера ордера
         if leveraged_amount < max(self.min_trade_usdt, min_order_value):
             self.logger.warning(
-                f"⚠️ Сумма сделки {leveraged_amount:.2f} USDT меньше минимальной "
-                f"(min_trade: {self.min_trade_usdt}, min_order_value: {min_order_value:.2f})"
-            )
+                "⚠️ Сумма сделки %.2f USDT меньше минимальной (min_trade: %s, min_order_value: %.2f)",
+                leveraged_amount, self.min_trade_usdt, min_order_value)
             return 0
 
         # Рассчитываем количество
@@ -447,24 +509,20 @@ class TradingBot:
 
         # Проверяем, что количество не меньше минимального
         if quantity < min_order_qty:
-            self.logger.warning(
-                f"⚠️ Рассчитанное количество {quantity:.6f} меньше минимального {min_order_qty:.6f}"
-            )
+            self.logger.warning("⚠️ Рассчитанное количество %.6f меньше минимального %.6f",
+                                quantity, min_order_qty)
             # Пробуем увеличить до минимального размера
             min_required_amount = min_order_qty * market_price / self.leverage
             if min_required_amount <= trading_balance:
-                self.logger.info(
-                    f"🔄 Увеличиваем размер до минимального: {min_required_amount:.2f} USDT")
+                self.logger.info("🔄 Увеличиваем размер до минимального: %.2f USDT", min_required_amount)
                 return min_required_amount * self.leverage
             else:
                 self.logger.warning(
                     "⚠️ Недостаточно средств для минимального ордера")
                 return 0
 
-        self.logger.info(
-            f"📊 Расчет позиции для {symbol}: {leveraged_amount:.2f} USDT "
-            f"(леверидж {self.leverage}x), количество: {quantity:.6f}"
-        )
+        self.logger.info("📊 Расчет позиции для %s: %.2f USDT (леверидж %sx), количество: %.6f",
+                         symbol, leveraged_amount, self.leverage, quantity)
         return leveraged_amount
 
     def calculate_stop_loss_take_profit(self, entry_price: float, side: str) -> tuple:
@@ -491,39 +549,44 @@ class TradingBot:
             # Получаем общий лимит позиций
             total_position_limit = self.balance_info['total_equity'] * (
                 self.max_total_position_percent / 100)
-            current_total_position_value = self._get_current_total_position_value()
+            # Для UNIFIED-счета update_balance уже посчитал стоимость открытых позиций -
+            # повторно позиции из БД не читаем
+            if self.balance_info.get('source') == 'UNIFIED':
+                current_total_position_value = self.balance_info['open_positions_value']
+            else:
+                current_total_position_value = self._get_current_total_position_value()
             available_for_trading = total_position_limit - current_total_position_value
 
             if available_for_trading < self.min_trade_usdt:
                 self.logger.info("⚠️  Достигнут общий лимит позиций")
                 return
 
-            # 1. Обрабатываем каждый символ
+            # 1. Рыночные данные и сигналы по всем символам запрашиваем параллельно
+            fetched = fetch_signals(self.symbols, self.bybit, self.get_trading_signal_with_logging)
+
+            # 2. Позиции и сделки обрабатываем последовательно, в порядке символов
             for symbol in self.symbols:
                 try:
-                    self._process_symbol(symbol, available_for_trading)
-                except Exception as e:
-                    self.logger.error(
-                        f"❌ Ошибка обработки символа {symbol}: {e}")
+                    result = fetched[symbol].result()
+                    if result:
+                        self._process_symbol(symbol, available_for_trading, *result)
+                except Exception:
+                    self.logger.exception("❌ Ошибка обработки символа %s", symbol)
 
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка в торговой итерации: {e}")
+        except Exception:
+            self.logger.exception("❌ Ошибка в торговой итерации")
 
-    def _process_symbol(self, symbol: str, available_for_trading: float):
+    def _process_symbol(self, symbol: str, available_for_trading: float, market_data: Dict, signal: Dict):
         """Обработка одного символа"""
-        # Получаем рыночные данные
-        market_data = self.bybit.get_market_data(symbol)
-        if not market_data:
-            return
-
         # Обновляем цены открытых позиций для этого символа
         self._update_symbol_positions_prices(symbol, market_data['price'])
 
         # Проверяем условия для скользящих стоп-лоссов
         self._check_symbol_trailing_stops(symbol, market_data['price'])
 
-        # Получаем сигнал от DeepSeek
-        signal = self.get_trading_signal_with_logging(symbol, market_data)
+        # HOLD и неуверенные сигналы ничего не исполняют - размер позиции для них не считаем
+        if signal.get('action') not in ('BUY', 'SELL') or signal['confidence'] <= self.min_confidence:
+            return
 
         # Рассчитываем размер позиции с учетом общего лимита и минимальных требований
         position_amount = self.calculate_position_size(
@@ -531,10 +594,8 @@ class TradingBot:
         if position_amount <= 0:
             return
 
-        # Исполняем сделку если сигнал хороший
-        if signal['confidence'] > self.min_confidence:
-            self._execute_trading_decision(
-                symbol, signal, market_data, position_amount)
+        self._execute_trading_decision(
+            symbol, signal, market_data, position_amount)
 
     def _get_current_total_position_value(self) -> float:
         """Получает общую стоимость всех открытых позиций"""
@@ -573,8 +634,7 @@ class TradingBot:
                         (1 - self.trailing_stop_distance / 100)
                     if not current_sl or new_sl > current_sl:
                         self.db.update_stop_loss(position_id, new_sl)
-                        self.logger.info(
-                            f"📈 Обновлен стоп-лосс для лонга {symbol}: {new_sl:.2f}")
+                        self.logger.info("📈 Обновлен стоп-лосс для лонга %s: %.2f", symbol, new_sl)
 
                 # Проверяем достижение стоп-лосса или тейк-профита
                 if current_sl and current_price <= current_sl:
@@ -593,8 +653,7 @@ class TradingBot:
                         (1 + self.trailing_stop_distance / 100)
                     if not current_sl or new_sl < current_sl:
                         self.db.update_stop_loss(position_id, new_sl)
-                        self.logger.info(
-                            f"📉 Обновлен стоп-лосс для шорта {symbol}: {new_sl:.2f}")
+                        self.logger.info("📉 Обновлен стоп-лосс для шорта %s: %.2f", symbol, new_sl)
 
                 # Проверяем достижение стоп-лосса или тейк-профита
                 if current_sl and current_price >= current_sl:
@@ -623,32 +682,35 @@ class TradingBot:
 
     def _execute_trading_decision(self, symbol: str, signal: Dict, market_data: Dict, position_amount: float):
         """Исполняет торговое решение с поддержкой обоих направлений"""
+        signal_action = signal['action']
+        if signal_action not in ('BUY', 'SELL'):
+            # HOLD - позиции из БД не нужны
+            return
+
         try:
+            # Бот держит одну позицию: берем самую свежую открытую (или None)
             current_positions = self.db.get_open_positions()
-            has_position = len(current_positions) > 0
-
-            signal_action = signal['action']
+            current_position = current_positions[0] if current_positions else None
 
             # Проверяем разрешены ли направления
             if signal_action == 'BUY' and not self.allow_long_positions:
-                self.logger.info(f"⏸️  Лонг позиции отключены для {symbol}")
+                self.logger.info("⏸️  Лонг позиции отключены для %s", symbol)
                 return
             elif signal_action == 'SELL' and not self.allow_short_positions:
-                self.logger.info(f"⏸️  Шорт позиции отключены для {symbol}")
+                self.logger.info("⏸️  Шорт позиции отключены для %s", symbol)
                 return
 
             if signal_action == 'BUY':
-                if not has_position:
+                if current_position is None:
                     # Нет позиций - открываем лонг
                     self._execute_buy(
                         symbol, signal, market_data, position_amount)
                 elif self.auto_position_reversal:
-                    # Есть позиция - проверяем направление
-                    current_position = current_positions[0]
-                    if current_position['side'] == 'SELL':
+                    # Есть позиция - разворачиваем только позицию по этому же символу,
+                    # иначе закроем чужую позицию по цене текущего символа
+                    if current_position['symbol'] == symbol and current_position['side'] == 'SELL':
                         # Закрываем шорт и открываем лонг
-                        self.logger.info(
-                            f"🔄 Переворот позиции {symbol}: SELL → BUY")
+                        self.logger.info("🔄 Переворот позиции %s: SELL → BUY", symbol)
                         self._close_position_by_id(
                             current_position['id'], market_data['price'], "reversal")
                         time.sleep(1)
@@ -656,29 +718,27 @@ class TradingBot:
                             symbol, signal, market_data, position_amount)
 
             elif signal_action == 'SELL':
-                if not has_position:
+                if current_position is None:
                     # Нет позиций - открываем шорт
                     self._execute_sell(
                         symbol, signal, market_data, position_amount)
                 elif self.auto_position_reversal:
-                    # Есть позиция - проверяем направление
-                    current_position = current_positions[0]
-                    if current_position['side'] == 'BUY':
+                    # Есть позиция - разворачиваем только позицию по этому же символу
+                    if current_position['symbol'] == symbol and current_position['side'] == 'BUY':
                         # Закрываем лонг и открываем шорт
-                        self.logger.info(
-                            f"🔄 Переворот позиции {symbol}: BUY → SELL")
+                        self.logger.info("🔄 Переворот позиции %s: BUY → SELL", symbol)
                         self._close_position_by_id(
                             current_position['id'], market_data['price'], "reversal")
                         time.sleep(1)
                         self._execute_sell(
                             symbol, signal, market_data, position_amount)
 
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка исполнения сделки для {symbol}: {e}")
+        except Exception:
+            self.logger.exception("❌ Ошибка исполнения сделки для %s", symbol)
 
     def _execute_buy(self, symbol: str, signal: Dict, market_data: Dict, position_amount: float):
         """Исполняет покупку"""
-        self.logger.info(f"🎯 Исполняем BUY сигнал для {symbol}")
+        self.logger.info("🎯 Исполняем BUY сигнал для %s", symbol)
 
         entry_price = market_data['price']
         stop_loss, take_profit = self.calculate_stop_loss_take_profit(
@@ -697,6 +757,8 @@ class TradingBot:
         )
 
         if order:
+            self._invalidate_balance()
+
             # Сохраняем позицию в базу
             position_id = self.db.add_position(
                 symbol=symbol,
@@ -725,7 +787,7 @@ class TradingBot:
 
     def _execute_sell(self, symbol: str, signal: Dict, market_data: Dict, position_amount: float):
         """Исполняет продажу"""
-        self.logger.info(f"🎯 Исполняем SELL сигнал для {symbol}")
+        self.logger.info("🎯 Исполняем SELL сигнал для %s", symbol)
 
         entry_price = market_data['price']
         stop_loss, take_profit = self.calculate_stop_loss_take_profit(
@@ -744,6 +806,8 @@ class TradingBot:
         )
 
         if order:
+            self._invalidate_balance()
+
             # Сохраняем позицию в базу
             position_id = self.db.add_position(
                 symbol=symbol,
@@ -774,16 +838,17 @@ class TradingBot:
         """Закрытие позиции по ID"""
         position = self.db.get_position(position_id)
         if position and position['status'] == 'open':
-            success = self.bybit.close_position(
+            result = self.bybit.close_position(
                 position['symbol'], position['side'])
-            if success:
-                self.db.close_position(position_id, exit_price)
-                self.logger.info(
-                    f"✅ Позиция #{position_id} закрыта по причине: {reason}")
+            if result['success']:
+                self._invalidate_balance()
+                self.db.close_position(position_id, result['price'] or exit_price)
+                self.logger.info("✅ Позиция #%s закрыта по причине: %s", position_id, reason)
 
     def _send_trade_notification(self, action: str, position_id: int, signal: Dict, entry_price: float):
         """Отправляет уведомление о сделке всем пользователям бота"""
-        if not self.enable_notifications:
+        # Без Telegram сообщение некому отправлять - не собираем его
+        if not self.enable_notifications or not self.notifier.enabled:
             return
 
         try:
@@ -796,100 +861,43 @@ class TradingBot:
             # Получаем позицию из базы
             position = self.db.get_position(position_id)
             if not position:
-                self.logger.error(f"Позиция {position_id} не найдена в базе")
+                self.logger.error("Позиция %s не найдена в базе", position_id)
                 return
 
-            moscow_time = self._get_moscow_time()
-
-            # Определяем эмодзи для направления
-            direction_emoji = "🟢" if position['side'] == 'BUY' else "🔴"
-            direction_text = "ЛОНГ" if position['side'] == 'BUY' else "ШОРТ"
-
-            message = f"""
-{direction_emoji} *{action} - {direction_text}*
-
-🆔 *ID позиции:* #{position_id}
-💹 *Символ:* {position['symbol']}
-💰 *Общий баланс:* {trading_balance:.2f} USDT ({balance_source})
-{arrow} *Изменение:* {balance_change:+.2f} USDT ({balance_change_percent:+.2f}%)
-📊 *Начальный баланс:* {self.initial_balance:.2f} USDT
-💵 *Размер позиции:* {position['size']:.4f}
-🔢 *Леверидж:* {position['leverage']}x
-💸 *Цена входа:* ${entry_price:.2f}
-📉 *Стоп-лосс:* ${position.get('stop_loss', 0):.2f}
-📈 *Тейк-профит:* ${position.get('take_profit', 0):.2f}
-
-🎯 *Сигнал AI:* {signal.get('action', 'N/A')}
-⭐ *Уверенность:* {signal.get('confidence', 0):.2f}
-💭 *Причина:* {signal.get('reason', 'N/A')}
-
-⏰ *Время (МСК):* {moscow_time.strftime("%H:%M:%S")}
-📅 *Дата:* {moscow_time.strftime("%d.%m.%Y")}
-"""
+            moscow_time = moscow_now()
+
+            is_buy = position['side'] == 'BUY'
+
+            message = TRADE_NOTIFICATION_TEMPLATE.format_map({
+                # Эмодзи и текст направления
+                'direction_emoji': "🟢" if is_buy else "🔴",
+                'direction_text': "ЛОНГ" if is_buy else "ШОРТ",
+                'action': action,
+                'position_id': position_id,
+                'symbol': position['symbol'],
+                'trading_balance': trading_balance,
+                'balance_source': balance_source,
+                'arrow': arrow,
+                'balance_change': balance_change,
+                'balance_change_percent': balance_change_percent,
+                'initial_balance': self.initial_balance,
+                'size': position['size'],
+                'leverage': position['leverage'],
+                'entry_price': entry_price,
+                'stop_loss': position.get('stop_loss', 0),
+                'take_profit': position.get('take_profit', 0),
+                'signal_action': signal.get('action', 'N/A'),
+                'confidence': signal.get('confidence', 0),
+                'reason': signal.get('reason', 'N/A'),
+                'time': moscow_time.strftime("%H:%M:%S"),
+                'date': moscow_time.strftime("%d.%m.%Y"),
+            })
 
             # Отправляем сообщение всем пользователям
-            self._broadcast_message(message)
+            self.notifier.broadcast(message)
 
         except Exception as e:
-            self.logger.warning(
-                f"Не удалось отправить уведомление о сделке: {e}")
-
-    def _broadcast_message(self, message: str, parse_mode: str = 'Markdown'):
-        """Рассылает сообщение всем пользователям бота"""
-        try:
-            import requests
-            from config import Config
-
-            token = Config.TELEGRAM_BOT_TOKEN
-            if not token or token == "your_telegram_token":
-                return
-
-            # Получаем всех пользователей из базы
-            users = self.db.get_all_users()
-            if not users:
-                self.logger.warning("Нет пользователей для рассылки")
-                return
-
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-
-            successful_sends = 0
-            failed_sends = 0
-
-            for user in users:
-                try:
-                    payload = {
-                        'chat_id': user['user_id'],
-                        'text': message,
-                        'parse_mode': parse_mode
-                    }
-
-                    response = requests.post(url, json=payload, timeout=10)
-                    if response.status_code == 200:
-                        successful_sends += 1
-                    else:
-                        failed_sends += 1
-                        self.logger.warning(
-                            f"Не удалось отправить сообщение пользователю {user['user_id']}: {response.text}")
-
-                except Exception as e:
-                    failed_sends += 1
-                    self.logger.warning(
-                        f"Ошибка отправки пользователю {user['user_id']}: {e}")
-
-            self.logger.info(
-                f"📢 Рассылка завершена: успешно {successful_sends}, ошибок {failed_sends}")
-
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка при рассылке сообщений: {e}")
-
-    def _get_moscow_time(self):
-        """Возвращает текущее время по Москве"""
-        try:
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            return datetime.now(moscow_tz)
-        except:
-            from datetime import timedelta
-            return datetime.utcnow() + timedelta(hours=3)
+            self.logger.warning("Не удалось отправить уведомление о сделке: %s", e)
 
     def stop(self):
         """Остановка бота"""
@@ -1,9 +1,14 @@
 """
 Утилиты для торгового бота.
 """
-from .performance import log_performance, PerformanceTracker
-
-__all__ = ['log_performance', 'PerformanceTracker']
+from .performance import log_performance, log_latency, PerformanceTracker
+from .profiling import Profiler
+from .log_format import JsonFormatter
+from .notifier import TelegramNotifier, moscow_now
+from .signals import fetch_signals
+
+__all__ = ['log_performance', 'log_latency', 'PerformanceTracker', 'Profiler', 'JsonFormatter',
+           'TelegramNotifier', 'moscow_now', 'fetch_signals']
 
 
 
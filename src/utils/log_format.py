@@ -0,0 +1,35 @@
+"""
+JSON-форматтер логов для передачи в системы сбора логов.
+
+Использование:
+    from utils.log_format import JsonFormatter
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+# Поля из extra, которые выносятся в JSON отдельными ключами
+EXTRA_FIELDS = ('user_id', 'handler', 'latency_ms')
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
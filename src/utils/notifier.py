@@ -0,0 +1,122 @@
+"""
+Рассылка уведомлений торговых ботов в Telegram.
+
+Использование:
+    from utils.notifier import TelegramNotifier, moscow_now
+
+    notifier = TelegramNotifier(db, Config.TELEGRAM_BOT_TOKEN)
+    if notifier.enabled:
+        notifier.broadcast(message)     # не блокирует: отправка в фоновом потоке
+"""
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Сколько уведомлений может ждать отправки; при переполнении вытесняются самые старые
+NOTIFICATION_QUEUE_SIZE = 256
+
+# Часовой пояс времени в уведомлениях (разбирается один раз при импорте).
+# Без системной базы tzdata - фиксированный UTC+3 (Москва без перехода на летнее время)
+try:
+    MOSCOW_TZ = ZoneInfo('Europe/Moscow')
+except ZoneInfoNotFoundError:
+    MOSCOW_TZ = timezone(timedelta(hours=3), 'MSK')
+
+
+def moscow_now() -> datetime:
+    """Текущее время по Москве"""
+    return datetime.now(MOSCOW_TZ)
+
+
+class TelegramNotifier:
+    """Рассылка сообщений всем пользователям бота (db.get_all_users()).
+
+    Сообщения ставятся в ограниченную очередь и отправляются одним фоновым потоком,
+    поэтому торговый цикл не ждет ответов Telegram. Поток запускается при первом сообщении.
+    """
+
+    def __init__(self, db, token: Optional[str]):
+        self.db = db
+        self.enabled = bool(token) and token != "your_telegram_token"
+        # Адрес API и HTTP-сессия (keep-alive) создаются один раз
+        self._url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self._http = requests.Session()
+        # Рассылку ведет один фоновый поток - одного хоста и небольшого пула достаточно
+        self._http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._queue: queue.Queue = queue.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
+
+    def broadcast(self, message: str, parse_mode: str = 'Markdown'):
+        """Ставит сообщение в очередь рассылки всем пользователям бота (не блокирует)"""
+        if not self.enabled:
+            return
+
+        if self._worker is None:
+            self._worker = threading.Thread(
+                target=self._notification_loop, name="telegram-notify", daemon=True)
+            self._worker.start()
+
+        item = (message, parse_mode)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Telegram не успевает - вытесняем самое старое сообщение, свежее важнее
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                pass
+            logger.warning("⚠️ Очередь уведомлений переполнена, самое старое сообщение пропущено")
+
+    def _notification_loop(self):
+        """Фоновый поток: отправляет сообщения из очереди по одному"""
+        while True:
+            message, parse_mode = self._queue.get()
+            try:
+                self._send_broadcast(message, parse_mode)
+            finally:
+                self._queue.task_done()
+
+    def _send_broadcast(self, message: str, parse_mode: str = 'Markdown'):
+        """Рассылает сообщение всем пользователям бота"""
+        try:
+            # Получаем всех пользователей из базы
+            users = self.db.get_all_users()
+            if not users:
+                logger.warning("Нет пользователей для рассылки")
+                return
+
+            successful_sends = 0
+            failed_sends = 0
+
+            for user in users:
+                try:
+                    payload = {'chat_id': user['user_id'], 'text': message, 'parse_mode': parse_mode}
+                    response = self._http.post(self._url, json=payload, timeout=10)
+                    if response.status_code == 200:
+                        successful_sends += 1
+                    else:
+                        failed_sends += 1
+                        logger.warning("Не удалось отправить сообщение пользователю %s: %s",
+                                       user['user_id'], response.text)
+
+                except Exception as e:
+                    failed_sends += 1
+                    logger.warning("Ошибка отправки пользователю %s: %s", user['user_id'], e)
+
+            logger.info("📢 Рассылка завершена: успешно %s, ошибок %s", successful_sends, failed_sends)
+
+        except Exception as e:
+            logger.error("❌ Ошибка при рассылке сообщений: %s", e)
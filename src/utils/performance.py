@@ -12,6 +12,11 @@
     @log_performance(threshold_seconds=2.0)
     def my_function():
         ...
+
+    # Задержка async-обработчиков Telegram
+    @log_latency
+    async def _balance(self, update, context):
+        ...
 """
 import time
 import functools
@@ -142,7 +147,7 @@ def log_performance(func: Optional[Callable] = None, *,
                 return result
             except Exception as e:
                 success = False
-                logger.error(f"❌ {fn.__name__} failed after {time.perf_counter() - start_time:.3f}s: {e}")
+                logger.error("❌ %s failed after %.3fs: %s", fn.__name__, time.perf_counter() - start_time, e)
                 raise
             finally:
                 duration = time.perf_counter() - start_time
@@ -154,10 +159,10 @@ def log_performance(func: Optional[Callable] = None, *,
                 # Логируем
                 if duration > threshold_seconds:
                     logger.warning(
-                        f"⚠️ SLOW: {fn.__name__} took {duration:.3f}s (threshold: {threshold_seconds}s)"
+                        "⚠️ SLOW: %s took %.3fs (threshold: %ss)", fn.__name__, duration, threshold_seconds
                     )
                 elif log_all:
-                    logger.debug(f"⏱️ {fn.__name__} took {duration:.3f}s")
+                    logger.debug("⏱️ %s took %.3fs", fn.__name__, duration)
         
         return wrapper
     
@@ -167,6 +172,52 @@ def log_performance(func: Optional[Callable] = None, *,
     return decorator
 
 
+def log_latency(func: Optional[Callable] = None, *,
+                threshold_seconds: float = 1.0) -> Callable:
+    """
+    Декоратор для async-обработчиков: замеряет time.perf_counter() от входа до выхода.
+
+    Запись лога содержит поля user_id, handler и latency_ms (через extra),
+    чтобы JSON-форматтер мог отдавать их как отдельные ключи.
+
+    Args:
+        func: Декорируемая корутина
+        threshold_seconds: Порог, выше которого вызов логируется как WARNING (иначе DEBUG)
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs) -> Any:
+            start_time = time.perf_counter()
+            success = True
+
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                success = False
+                raise
+            finally:
+                duration = time.perf_counter() - start_time
+                _tracker.record(fn.__name__, duration, success)
+
+                level = logging.WARNING if duration > threshold_seconds else logging.DEBUG
+                if logger.isEnabledFor(level):
+                    user_id = next(
+                        (arg.effective_user.id for arg in args
+                         if getattr(arg, 'effective_user', None) is not None),
+                        None)
+                    logger.log(
+                        level, "⏱️ %s: %.1f ms (user_id=%s)",
+                        fn.__name__, duration * 1000, user_id,
+                        extra={'user_id': user_id, 'handler': fn.__name__,
+                               'latency_ms': round(duration * 1000, 1)})
+
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
 def get_performance_tracker() -> PerformanceTracker:
     """Возвращает глобальный трекер производительности"""
     return _tracker
@@ -0,0 +1,118 @@
+"""
+Профилирование CPU и памяти работающего бота.
+
+Использование:
+    from utils.profiling import Profiler
+
+    profiler = Profiler(output_dir='profiles', rotate_seconds=300)
+    profiler.start()
+    ...
+    profiler.maybe_rotate()             # периодически - сохраняет профиль в файл
+    print(profiler.top_functions())     # топ функций по cumulative времени
+    print(profiler.top_allocations())   # рост памяти с прошлого снимка
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """cProfile с ротацией файлов статистики и снимки памяти tracemalloc.
+
+    cProfile профилирует только поток, в котором вызван start()/rotate(),
+    поэтому все методы нужно вызывать из одного потока (цикла событий бота).
+    """
+
+    def __init__(self, output_dir: str = 'profiles', rotate_seconds: int = 300):
+        self.output_dir = output_dir
+        self.rotate_seconds = rotate_seconds
+        self._profile: Optional[cProfile.Profile] = None
+        self._started_at = 0.0
+        self._last_stats_path: Optional[str] = None
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._profile is not None
+
+    def start(self):
+        """Запускает сбор CPU-профиля и трассировку памяти"""
+        if self.is_running:
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._begin()
+        logger.info("🔬 Профилирование запущено, файлы: %s", self.output_dir)
+
+    def stop(self):
+        """Сохраняет последний профиль и останавливает профилирование"""
+        if not self.is_running:
+            return
+
+        self._dump()
+        self._profile = None
+        tracemalloc.stop()
+        self._last_snapshot = None
+        logger.info("🔬 Профилирование остановлено")
+
+    def rotate(self) -> Optional[str]:
+        """Сохраняет текущий профиль в файл и начинает новый"""
+        if not self.is_running:
+            return None
+
+        path = self._dump()
+        self._begin()
+        return path
+
+    def maybe_rotate(self) -> Optional[str]:
+        """Ротация, если текущий профиль собирается дольше rotate_seconds"""
+        if self.is_running and time.monotonic() - self._started_at >= self.rotate_seconds:
+            return self.rotate()
+        return None
+
+    def top_functions(self, limit: int = 20) -> str:
+        """Топ функций по cumulative времени из последнего сохраненного профиля"""
+        path = self._last_stats_path or self.rotate()
+        if not path:
+            return ''
+
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def top_allocations(self, limit: int = 20) -> str:
+        """Топ мест выделения памяти (разница с предыдущим снимком, если он есть)"""
+        if not tracemalloc.is_tracing():
+            return ''
+
+        snapshot = tracemalloc.take_snapshot()
+        if self._last_snapshot is None:
+            stats = snapshot.statistics('lineno')[:limit]
+        else:
+            stats = snapshot.compare_to(self._last_snapshot, 'lineno')[:limit]
+        self._last_snapshot = snapshot
+
+        return "\n".join(str(stat) for stat in stats)
+
+    def _begin(self):
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self._started_at = time.monotonic()
+
+    def _dump(self) -> str:
+        self._profile.disable()
+        path = os.path.join(
+            self.output_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pstats")
+        self._profile.dump_stats(path)
+        self._last_stats_path = path
+        return path
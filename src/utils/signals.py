@@ -0,0 +1,40 @@
+"""
+Параллельный запрос рыночных данных и сигналов DeepSeek по символам.
+
+Использование:
+    from utils.signals import fetch_signals
+
+    fetched = fetch_signals(symbols, bybit, get_signal)
+    result = fetched['ETHUSDT'].result()    # (market_data, signal) или None;
+                                            # ошибка символа поднимается здесь
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .performance import log_performance
+
+# Сколько символов одновременно запрашивают рыночные данные и сигнал DeepSeek
+MAX_PARALLEL_SIGNALS = 4
+
+
+def fetch_signals(symbols: List[str], bybit,
+                  get_signal: Callable[[str, Dict], Dict]) -> Dict[str, Future]:
+    """Запускает запросы по всем символам в пуле потоков и ждет их завершения.
+
+    Итерация ждет самый медленный ответ DeepSeek, а не сумму ответов по всем символам.
+    Ошибка символа сохраняется в его Future и поднимается при вызове result().
+    """
+    workers = max(1, min(MAX_PARALLEL_SIGNALS, len(symbols)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="signal") as pool:
+        return {symbol: pool.submit(fetch_symbol_signal, bybit, get_signal, symbol)
+                for symbol in symbols}
+
+
+@log_performance(threshold_seconds=10.0)
+def fetch_symbol_signal(bybit, get_signal: Callable[[str, Dict], Dict],
+                        symbol: str) -> Optional[Tuple[Dict, Dict]]:
+    """Рыночные данные и сигнал DeepSeek для символа (без изменения состояния бота)"""
+    market_data = bybit.get_market_data(symbol)
+    if not market_data:
+        return None
+    return market_data, get_signal(symbol, market_data)
@@ -1,13 +1,59 @@
-import pytz
 from deepseek_client import DeepSeekClient
 from bybit_client import BybitClient
 from database import Database
+from config import Config
+from utils.notifier import TelegramNotifier, moscow_now
 from utils.performance import log_performance
+from utils.signals import fetch_signals
 import time
 import logging
-from datetime import datetime
 from typing import Dict
 
+# Шаблоны уведомлений (заполняются через str.format_map)
+VIRTUAL_TRADE_TEMPLATE = """
+🤖 *{action}*
+
+🆔 *ID позиции:* #{position_id} (ВИРТУАЛЬНАЯ)
+💹 *Символ:* {symbol}
+💰 *Виртуальный баланс:* {current_balance:.2f} USDT
+{arrow} *Изменение:* {balance_change:+.2f} USDT ({balance_change_percent:+.2f}%)
+📊 *Начальный баланс:* {initial_balance:.2f} USDT
+💵 *Размер позиции:* {position_size}
+🔢 *Леверидж:* {leverage}x
+💸 *Цена входа:* ${entry_price:.2f}
+
+🎯 *Сигнал AI:* {signal_action}
+⭐ *Уверенность:* {confidence:.2f}
+💭 *Причина:* {reason}
+
+⏰ *Время (МСК):* {time}
+📅 *Дата:* {date}
+
+*⚠️ ВНИМАНИЕ: Это виртуальная сделка!*
+"""
+
+VIRTUAL_POSITION_CLOSED_TEMPLATE = """
+🔒 *ВИРТУАЛЬНАЯ ПОЗИЦИЯ ЗАКРЫТА*
+
+🆔 *ID:* #{id} (ВИРТУАЛЬНАЯ)
+💹 *Символ:* {symbol}
+📊 *Сторона:* {side}
+💵 *Цена входа:* ${entry_price:.2f}
+💰 *Цена выхода:* ${close_price:.2f}
+{pnl_emoji} *P&L:* {pnl:.2f} USDT ({pnl_percent:.2f}%)
+🔢 *Размер:* {size:.4f}
+⚡ *Леверидж:* {leverage}x
+📝 *Причина:* {close_reason}
+
+💰 *Общий виртуальный PnL:* {total_pnl:.2f} USDT
+🔢 *Всего виртуальных сделок:* {total_trades}
+
+⏰ *Время (МСК):* {time}
+📅 *Дата:* {date}
+
+*⚠️ ВНИМАНИЕ: Это виртуальная позиция!*
+"""
+
 
 class VirtualTradingBot:
     def __init__(self):
@@ -20,6 +66,12 @@ class VirtualTradingBot:
             self.deepseek = DeepSeekClient(self.db)
             self.bybit = BybitClient()
 
+            # Telegram-рассылка в фоновом потоке, не задерживает торговлю
+            self.notifier = TelegramNotifier(self.db, Config.TELEGRAM_BOT_TOKEN)
+
+            # Версия настроек: увеличивается при каждой перезагрузке из БД
+            self.settings_version = 0
+
             # Инициализируем настройки по умолчанию в БД при первом запуске
             self._initialize_default_settings()
 
@@ -32,7 +84,7 @@ class VirtualTradingBot:
             # Трекер состояния
             self.balance_info = {}
             self.initial_balance = float(
-                self.db.get_setting('initial_balance', '10000.0'))
+                self._get_setting_cached('initial_balance', '10000.0'))
             self.current_balance = self.initial_balance
             self.highest_balance = self.initial_balance
             self.lowest_balance = self.initial_balance
@@ -96,71 +148,92 @@ class VirtualTradingBot:
             'use_slippage_in_backtest': 'true'  # Учитывать slippage в бэктестах
         }
 
+        existing = self.db.get_settings(list(default_settings))
         for key, value in default_settings.items():
-            current_value = self.db.get_setting(key)
-            if not current_value:
+            if not existing.get(key):
                 self.db.set_setting(key, value)
                 self.logger.info(
                     f"📝 Инициализирована настройка {key} = {value}")
 
     def _load_settings_from_db(self):
         """Загрузка всех настроек из базы данных"""
+        # Все настройки одним запросом вместо отдельного запроса на каждую
+        self._settings_cache = self.db.get_settings()
+        setting = self._get_setting_cached
+
         # Торговые настройки
-        self.symbols = self.db.get_setting(
+        self.symbols = setting(
             'trading_symbols', 'ETHUSDT,BTCUSDT,ADAUSDT').split(',')
-        self.main_symbol = self.db.get_setting('default_symbol', 'ETHUSDT')
-        self.leverage = int(self.db.get_setting('leverage', '10'))
+        self.main_symbol = setting('default_symbol', 'ETHUSDT')
+        self.leverage = int(setting('leverage', '10'))
         self.min_confidence = float(
-            self.db.get_setting('min_confidence', '0.7'))
+            setting('min_confidence', '0.7'))
 
         # Риск-менеджмент
-        self.risk_percent = float(self.db.get_setting('risk_percent', '2.0'))
+        self.risk_percent = float(setting('risk_percent', '2.0'))
         self.max_position_percent = float(
-            self.db.get_setting('max_position_percent', '20.0'))
+            setting('max_position_percent', '20.0'))
+        # Доли баланса для calculate_position_size - пересчитываются только при загрузке настроек
+        self._risk_fraction = self.risk_percent / 100
+        self._max_position_fraction = self.max_position_percent / 100
         self.max_total_position_percent = float(
-            self.db.get_setting('max_total_position_percent', '50.0'))
+            setting('max_total_position_percent', '50.0'))
         self.min_trade_usdt = float(
-            self.db.get_setting('min_trade_usdt', '50.0'))
+            setting('min_trade_usdt', '50.0'))
         self.stop_loss_percent = float(
-            self.db.get_setting('stop_loss_percent', '2.0'))
+            setting('stop_loss_percent', '2.0'))
         self.take_profit_percent = float(
-            self.db.get_setting('take_profit_percent', '4.0'))
+            setting('take_profit_percent', '4.0'))
 
         # Трейлинг-стоп
         self.trailing_stop_activation = float(
-            self.db.get_setting('trailing_stop_activation_percent', '0.5'))
+            setting('trailing_stop_activation_percent', '0.5'))
         self.trailing_stop_distance = float(
-            self.db.get_setting('trailing_stop_distance_percent', '0.3'))
+            setting('trailing_stop_distance_percent', '0.3'))
 
         # Поведение торговли
-        self.allow_short_positions = self.db.get_setting(
+        self.allow_short_positions = setting(
             'allow_short_positions', 'true').lower() == 'true'
-        self.allow_long_positions = self.db.get_setting(
+        self.allow_long_positions = setting(
             'allow_long_positions', 'true').lower() == 'true'
-        self.auto_position_reversal = self.db.get_setting(
+        self.auto_position_reversal = setting(
             'auto_position_reversal', 'true').lower() == 'true'
 
         # Уведомления
-        self.enable_notifications = self.db.get_setting(
+        self.enable_notifications = setting(
             'enable_notifications', 'true').lower() == 'true'
-        self.enable_trade_logging = self.db.get_setting(
+        self.enable_trade_logging = setting(
             'enable_trade_logging', 'true').lower() == 'true'
 
         # Комиссии и slippage (для бэктестинга)
         self.maker_fee_percent = float(
-            self.db.get_setting('maker_fee_percent', '0.055'))
+            setting('maker_fee_percent', '0.055'))
         self.taker_fee_percent = float(
-            self.db.get_setting('taker_fee_percent', '0.06'))
+            setting('taker_fee_percent', '0.06'))
         self.slippage_percent = float(
-            self.db.get_setting('slippage_percent', '0.05'))
-        self.use_fees_in_backtest = self.db.get_setting(
+            setting('slippage_percent', '0.05'))
+        self.use_fees_in_backtest = setting(
             'use_fees_in_backtest', 'true').lower() == 'true'
-        self.use_slippage_in_backtest = self.db.get_setting(
+        self.use_slippage_in_backtest = setting(
             'use_slippage_in_backtest', 'true').lower() == 'true'
 
+        self.settings_version += 1
         self.logger.info(
             "✅ Настройки виртуального бота загружены из базы данных")
 
+    def _get_setting_cached(self, key: str, default: str = '') -> str:
+        """Настройка из снимка таблицы settings, без запроса к БД.
+
+        Снимок обновляется в _load_settings_from_db (в том числе из update_setting).
+        """
+        return self._settings_cache.get(key) or default
+
+    def update_setting(self, key: str, value: str):
+        """Обновление настройки и перезагрузка"""
+        self.db.set_setting(key, value)
+        self._load_settings_from_db()
+        self.logger.info(f"🔄 Настройка {key} обновлена на {value}")
+
     def update_balance(self):
         """Обновляем информацию о реальном балансе (только для информации)"""
         try:
@@ -216,11 +289,8 @@ class VirtualTradingBot:
             'trading_interval_minutes'
         ]
 
-        settings = {}
-        for key in settings_keys:
-            settings[key] = self.db.get_setting(key, '')
-
-        return settings
+        settings = self.db.get_settings(settings_keys)
+        return {key: settings.get(key) or '' for key in settings_keys}
 
     def get_balance_change_info(self):
         """Рассчитывает информацию об изменении виртуального баланса"""
@@ -248,11 +318,10 @@ class VirtualTradingBot:
             return 0
 
         # Рассчитываем сумму для сделки на основе процента риска
-        risk_amount = trading_balance * (self.risk_percent / 100)
+        risk_amount = trading_balance * self._risk_fraction
 
         # Ограничиваем максимальный размер позиции
-        max_position_amount = trading_balance * \
-            (self.max_position_percent / 100)
+        max_position_amount = trading_balance * self._max_position_fraction
         position_amount = min(risk_amount, max_position_amount)
 
         # Учитываем леверидж
@@ -260,17 +329,14 @@ class VirtualTradingBot:
 
         # Проверяем минимальную сумму
         if leveraged_amount < self.min_trade_usdt:
-            self.logger.warning(
-                f"⚠️ Виртуальная сумма сделки {leveraged_amount:.2f} USDT меньше минимальной")
+            self.logger.warning("⚠️ Виртуальная сумма сделки %.2f USDT меньше минимальной", leveraged_amount)
             return 0
 
         # Рассчитываем количество
         quantity = leveraged_amount / market_price
 
-        self.logger.info(
-            f"📊 Расчет виртуальной позиции для {symbol}: {leveraged_amount:.2f} USDT "
-            f"(леверидж {self.leverage}x), количество: {quantity:.6f}"
-        )
+        self.logger.info("📊 Расчет виртуальной позиции для %s: %.2f USDT (леверидж %sx), количество: %.6f",
+                         symbol, leveraged_amount, self.leverage, quantity)
         return leveraged_amount
 
     def calculate_stop_loss_take_profit(self, entry_price: float, side: str) -> tuple:
@@ -331,33 +397,32 @@ class VirtualTradingBot:
                 self.logger.error("❌ Не удалось обновить баланс")
                 return
 
-            # 1. Обрабатываем каждый символ
+            # 1. Рыночные данные и сигналы по всем символам запрашиваем параллельно
+            fetched = fetch_signals(self.symbols, self.bybit, self.get_trading_signal_with_logging)
+
+            # 2. Позиции и сделки обрабатываем последовательно, в порядке символов
             for symbol in self.symbols:
                 try:
-                    self._process_symbol(symbol)
-                except Exception as e:
-                    self.logger.error(
-                        f"❌ Ошибка обработки символа {symbol}: {e}")
+                    result = fetched[symbol].result()
+                    if result:
+                        self._process_symbol(symbol, *result)
+                except Exception:
+                    self.logger.exception("❌ Ошибка обработки символа %s", symbol)
 
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка в виртуальной торговой итерации: {e}")
+        except Exception:
+            self.logger.exception("❌ Ошибка в виртуальной торговой итерации")
 
-    @log_performance(threshold_seconds=10.0)
-    def _process_symbol(self, symbol: str):
+    def _process_symbol(self, symbol: str, market_data: Dict, signal: Dict):
         """Обработка одного символа для виртуальной торговли"""
-        # Получаем реальные рыночные данные
-        market_data = self.bybit.get_market_data(symbol)
-        if not market_data:
-            return
-
         # Обновляем цены виртуальных позиций
         self._update_virtual_positions_prices(symbol, market_data['price'])
 
         # Проверяем условия для закрытия виртуальных позиций
         self._check_virtual_position_conditions(symbol, market_data['price'])
 
-        # Получаем сигнал от DeepSeek
-        signal = self.get_trading_signal_with_logging(symbol, market_data)
+        # HOLD и неуверенные сигналы (порог из БД) ничего не исполняют - размер позиции не считаем
+        if signal.get('action') not in ('BUY', 'SELL') or signal['confidence'] <= self.min_confidence:
+            return
 
         # Рассчитываем размер виртуальной позиции
         position_amount = self.calculate_position_size(
@@ -365,10 +430,8 @@ class VirtualTradingBot:
         if position_amount <= 0:
             return
 
-        # Исполняем виртуальную сделку если сигнал хороший (используем настройку из БД)
-        if signal['confidence'] > self.min_confidence:
-            self._execute_virtual_trading_decision(
-                symbol, signal, market_data, position_amount)
+        self._execute_virtual_trading_decision(
+            symbol, signal, market_data, position_amount)
 
     def _update_virtual_positions_prices(self, symbol: str, current_price: float):
         """Обновление цен виртуальных позиций для конкретного символа из БД"""
@@ -379,13 +442,14 @@ class VirtualTradingBot:
             self.db.update_virtual_position_price(position['id'], current_price)
             
             self.logger.debug(
-                f"Updated position #{position['id']}: {symbol} @ ${current_price:.2f}"
+                "Updated position #%s: %s @ $%.2f", position['id'], symbol, current_price
             )
 
     def _check_virtual_position_conditions(self, symbol: str, current_price: float):
         """Проверка условий для закрытия виртуальных позиций из БД"""
         # Логируем входные данные для диагностики (DEBUG - слишком часто для INFO)
-        self.logger.debug(f"🔍 _check_virtual_position_conditions: symbol={symbol}, current_price=${current_price:,.2f}")
+        self.logger.debug("🔍 _check_virtual_position_conditions: symbol=%s, current_price=$%.2f",
+                          symbol, current_price)
         
         open_positions = self.db.get_virtual_open_positions(symbol)
         
@@ -518,12 +582,15 @@ class VirtualTradingBot:
 
     def _execute_virtual_trading_decision(self, symbol: str, signal: Dict, market_data: Dict, position_amount: float):
         """Исполняет виртуальное торговое решение"""
+        signal_action = signal['action']
+        if signal_action not in ('BUY', 'SELL'):
+            # HOLD - позиции из БД не нужны
+            return
+
         try:
-            # Получаем позиции из БД вместо памяти
+            # Получаем позиции из БД вместо памяти: по символу держим одну позицию (или None)
             current_positions = self.db.get_virtual_open_positions(symbol)
-            has_position = len(current_positions) > 0
-
-            signal_action = signal['action']
+            current_position = current_positions[0] if current_positions else None
 
             # Проверяем разрешены ли направления
             if signal_action == 'BUY' and not self.allow_long_positions:
@@ -536,78 +603,79 @@ class VirtualTradingBot:
                 return
 
             if signal_action == 'BUY':
-                if not has_position:
+                if current_position is None:
                     # Нет позиций - открываем виртуальный лонг
                     self._execute_virtual_buy(
                         symbol, signal, market_data, position_amount)
                 elif self.auto_position_reversal:
                     # Есть позиция - проверяем направление
-                    current_position = current_positions[0]
                     if current_position['side'] == 'SELL':
                         # Закрываем виртуальный шорт и открываем лонг
                         self.logger.info(
                             f"🔄 Виртуальный переворот позиции {symbol}: SELL → BUY")
                         self._close_virtual_position(
                             current_position, market_data['price'], "reversal")
-                        time.sleep(1)
+                        # В бэктесте пауза только растягивает прогон (на исторических свечах ждать нечего)
+                        if not getattr(self, 'backtest_mode', False):
+                            time.sleep(1)
                         self._execute_virtual_buy(
                             symbol, signal, market_data, position_amount)
 
             elif signal_action == 'SELL':
-                if not has_position:
+                if current_position is None:
                     # Нет позиций - открываем виртуальный шорт
                     self._execute_virtual_sell(
                         symbol, signal, market_data, position_amount)
                 elif self.auto_position_reversal:
                     # Есть позиция - проверяем направление
-                    current_position = current_positions[0]
                     if current_position['side'] == 'BUY':
                         # Закрываем виртуальный лонг и открываем шорт
                         self.logger.info(
                             f"🔄 Виртуальный переворот позиции {symbol}: BUY → SELL")
                         self._close_virtual_position(
                             current_position, market_data['price'], "reversal")
-                        time.sleep(1)
+                        # В бэктесте пауза только растягивает прогон (на исторических свечах ждать нечего)
+                        if not getattr(self, 'backtest_mode', False):
+                            time.sleep(1)
                         self._execute_virtual_sell(
                             symbol, signal, market_data, position_amount)
 
-        except Exception as e:
-            self.logger.error(
-                f"❌ Ошибка исполнения виртуальной сделки для {symbol}: {e}")
+        except Exception:
+            self.logger.exception(
+                "❌ Ошибка исполнения виртуальной сделки для %s", symbol)
 
     def _send_virtual_trade_notification(self, action: str, position_id: int, signal: Dict, entry_price: float):
         """Отправляет уведомление о виртуальной сделке"""
-        if not self.enable_notifications:
+        # Без Telegram сообщение некому отправлять - не собираем его
+        if not self.enable_notifications or not self.notifier.enabled:
             return
 
         try:
             # Получаем информацию о балансе
             arrow, balance_change, balance_change_percent, highest, lowest = self.get_balance_change_info()
-
-            message = f"""
-🤖 *{action}*
-
-🆔 *ID позиции:* #{position_id} (ВИРТУАЛЬНАЯ)
-💹 *Символ:* {signal.get('symbol', 'N/A')}
-💰 *Виртуальный баланс:* {self.current_balance:.2f} USDT
-{arrow} *Изменение:* {balance_change:+.2f} USDT ({balance_change_percent:+.2f}%)
-📊 *Начальный баланс:* {self.initial_balance:.2f} USDT
-💵 *Размер позиции:* {signal.get('position_size', 'N/A')}
-🔢 *Леверидж:* {self.leverage}x
-💸 *Цена входа:* ${entry_price:.2f}
-
-🎯 *Сигнал AI:* {signal.get('action', 'N/A')}
-⭐ *Уверенность:* {signal.get('confidence', 0):.2f}
-💭 *Причина:* {signal.get('reason', 'N/A')}
-
-⏰ *Время (МСК):* {self._get_moscow_time().strftime("%H:%M:%S")}
-📅 *Дата:* {self._get_moscow_time().strftime("%d.%m.%Y")}
-
-*⚠️ ВНИМАНИЕ: Это виртуальная сделка!*
-"""
+            moscow_time = moscow_now()
+
+            message = VIRTUAL_TRADE_TEMPLATE.format_map({
+                'action': action,
+                'position_id': position_id,
+                'symbol': signal.get('symbol', 'N/A'),
+                'current_balance': self.current_balance,
+                'arrow': arrow,
+                'balance_change': balance_change,
+                'balance_change_percent': balance_change_percent,
+                'initial_balance': self.initial_balance,
+                'position_size': signal.get('position_size', 'N/A'),
+                'leverage': self.leverage,
+                'entry_price': entry_price,
+                'signal_action': signal.get('action', 'N/A'),
+                'confidence': signal.get('confidence', 0),
+                'reason': signal.get('reason', 'N/A'),
+                'time': moscow_time.strftime("%H:%M:%S"),
+                'date': moscow_time.strftime("%d.%m.%Y"),
+            })
 
             # Отправляем сообщение всем пользователям
-            self._broadcast_message(message)
+            self.notifier.broadcast(message)
 
         except Exception as e:
             self.logger.warning(
@@ -615,7 +683,8 @@ class VirtualTradingBot:
 
     def _send_virtual_position_closed_notification(self, position: Dict, close_price: float):
         """Отправка уведомления о закрытии виртуальной позиции"""
-        if not self.enable_notifications:
+        # Без Telegram сообщение некому отправлять - не читаем статистику из БД
+        if not self.enable_notifications or not self.notifier.enabled:
             return
 
         try:
@@ -629,95 +698,34 @@ class VirtualTradingBot:
             pnl_percent = (
                 pnl / (position['entry_price'] * position['size'])) * 100 if position['entry_price'] * position['size'] > 0 else 0
 
-            moscow_time = self._get_moscow_time()
+            moscow_time = moscow_now()
             pnl_emoji = "📈" if pnl >= 0 else "📉"
 
-            message = f"""
-🔒 *ВИРТУАЛЬНАЯ ПОЗИЦИЯ ЗАКРЫТА*
-
-🆔 *ID:* #{position['id']} (ВИРТУАЛЬНАЯ)
-💹 *Символ:* {position['symbol']}
-📊 *Сторона:* {position['side']}
-💵 *Цена входа:* ${position['entry_price']:.2f}
-💰 *Цена выхода:* ${close_price:.2f}
-{pnl_emoji} *P&L:* {pnl:.2f} USDT ({pnl_percent:.2f}%)
-🔢 *Размер:* {position['size']:.4f}
-⚡ *Леверидж:* {position['leverage']}x
-📝 *Причина:* {position.get('close_reason', 'N/A')}
-
-💰 *Общий виртуальный PnL:* {total_pnl:.2f} USDT
-🔢 *Всего виртуальных сделок:* {total_trades}
-
-⏰ *Время (МСК):* {moscow_time.strftime("%H:%M:%S")}
-📅 *Дата:* {moscow_time.strftime("%d.%m.%Y")}
-
-*⚠️ ВНИМАНИЕ: Это виртуальная позиция!*
-"""
+            message = VIRTUAL_POSITION_CLOSED_TEMPLATE.format_map({
+                'id': position['id'],
+                'symbol': position['symbol'],
+                'side': position['side'],
+                'entry_price': position['entry_price'],
+                'close_price': close_price,
+                'pnl_emoji': pnl_emoji,
+                'pnl': pnl,
+                'pnl_percent': pnl_percent,
+                'size': position['size'],
+                'leverage': position['leverage'],
+                'close_reason': position.get('close_reason', 'N/A'),
+                'total_pnl': total_pnl,
+                'total_trades': total_trades,
+                'time': moscow_time.strftime("%H:%M:%S"),
+                'date': moscow_time.strftime("%d.%m.%Y"),
+            })
 
             # Отправляем сообщение всем пользователям
-            self._broadcast_message(message)
+            self.notifier.broadcast(message)
 
         except Exception as e:
             self.logger.warning(
                 f"Не удалось отправить уведомление о закрытии виртуальной позиции: {e}")
 
-    def _broadcast_message(self, message: str, parse_mode: str = 'Markdown'):
-        """Рассылает сообщение всем пользователям бота"""
-        try:
-            import requests
-            from config import Config
-
-            token = Config.TELEGRAM_BOT_TOKEN
-            if not token or token == "your_telegram_token":
-                return
-
-            # Получаем всех пользователей из базы
-            users = self.db.get_all_users()
-            if not users:
-                self.logger.warning("Нет пользователей для рассылки")
-                return
-
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-
-            successful_sends = 0
-            failed_sends = 0
-
-            for user in users:
-                try:
-                    payload = {
-                        'chat_id': user['user_id'],
-                        'text': message,
-                        'parse_mode': parse_mode
-                    }
-
-                    response = requests.post(url, json=payload, timeout=10)
-                    if response.status_code == 200:
-                        successful_sends += 1
-                    else:
-                        failed_sends += 1
-                        self.logger.warning(
-                            f"Не удалось отправить сообщение пользователю {user['user_id']}: {response.text}")
-
-                except Exception as e:
-                    failed_sends += 1
-                    self.logger.warning(
-                        f"Ошибка отправки пользователю {user['user_id']}: {e}")
-
-            self.logger.info(
-                f"📢 Рассылка завершена: успешно {successful_sends}, ошибок {failed_sends}")
-
-        except Exception as e:
-            self.logger.error(f"❌ Ошибка при рассылке сообщений: {e}")
-
-    def _get_moscow_time(self):
-        """Возвращает текущее время по Москве"""
-        try:
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            return datetime.now(moscow_tz)
-        except:
-            from datetime import timedelta
-            return datetime.utcnow() + timedelta(hours=3)
-
     def stop(self):
         """Остановка виртуального бота"""
         self.logger.info("✅ Виртуальный бот остановлен")
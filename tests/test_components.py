@@ -1,12 +1,35 @@
 import sys
 import os
+import logging
+import queue
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 
 # Добавляем src в путь для импорта
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 
+@pytest.fixture
+def bare_bot():
+    """TradingBot без __init__: без БД, биржи и Telegram, с моками клиентов"""
+    from trading_strategy import TradingBot
+
+    bot = TradingBot.__new__(TradingBot)
+    bot.logger = logging.getLogger(__name__)
+    bot.db = Mock()
+    bot.db.get_open_positions.return_value = []
+    bot.bybit = Mock()
+    bot.balance_info = {}
+    bot._balance_account_type = 'UNIFIED'
+    bot._balance_updated_at = 0.0
+    bot.highest_balance = bot.lowest_balance = 100.0
+    bot.allow_long_positions = True
+    bot.allow_short_positions = True
+    bot.auto_position_reversal = True
+    return bot
+
+
 class TestTradingBot:
     """Базовые тесты для торгового бота"""
 
@@ -53,6 +76,140 @@ class TestTradingBot:
         mock_bybit_instance.get_market_data.assert_called_once_with("ETHUSDT")
         mock_deepseek_instance.get_trading_signal.assert_called_once()
 
+    def test_reversal_ignores_position_of_other_symbol(self, bare_bot):
+        """Переворот не закрывает позицию другого символа по цене текущего"""
+        bot = bare_bot
+        bot.db.get_open_positions.return_value = [
+            {'id': 1, 'symbol': 'BTCUSDT', 'side': 'SELL'}
+        ]
+        bot._close_position_by_id = Mock()
+        bot._execute_buy = Mock()
+
+        bot._execute_trading_decision(
+            'ETHUSDT', {'action': 'BUY'}, {'price': 3500.0}, 0.1)
+
+        bot._close_position_by_id.assert_not_called()
+        bot._execute_buy.assert_not_called()
+
+    def test_update_balance_remembers_spot_account(self, bare_bot):
+        """После первого найденного SPOT-баланса UNIFIED больше не запрашивается"""
+        def wallet_balance(account_type):
+            equity = 100.0 if account_type == 'SPOT' else 0
+            return {'total_equity': equity, 'total_available_balance': equity,
+                    'usdt_balance': equity, 'account_type': account_type}
+
+        bot = bare_bot
+        bot.bybit.get_wallet_balance.side_effect = wallet_balance
+
+        assert bot.update_balance()
+        assert bot.update_balance(force=True)
+
+        calls = [c.args[0] for c in bot.bybit.get_wallet_balance.call_args_list]
+        assert calls == ['UNIFIED', 'SPOT', 'SPOT']
+        assert bot.balance_info['source'] == 'SPOT'
+
+    def test_update_balance_reuses_fresh_balance_until_trade(self, bare_bot):
+        """Свежий баланс не запрашивается повторно, пока сделка не сбросит кеш"""
+        bot = bare_bot
+        bot.bybit.get_wallet_balance.return_value = {
+            'total_equity': 100.0, 'total_available_balance': 100.0,
+            'usdt_balance': 100.0, 'account_type': 'UNIFIED'}
+
+        assert bot.update_balance()
+        assert bot.update_balance()
+        assert bot.bybit.get_wallet_balance.call_count == 1
+
+        bot._invalidate_balance()
+        assert bot.update_balance()
+        assert bot.bybit.get_wallet_balance.call_count == 2
+
+
+def test_signal_fetch_error_does_not_block_other_symbols():
+    """Сигналы запрашиваются параллельно, ошибка одного символа не мешает остальным"""
+    from utils.signals import fetch_signals
+
+    def market_data(symbol):
+        if symbol == 'BTCUSDT':
+            raise ConnectionError("timeout")
+        return {'symbol': symbol, 'price': 3500.0}
+
+    bybit = Mock()
+    bybit.get_market_data.side_effect = market_data
+    get_signal = Mock(return_value={'action': 'HOLD', 'confidence': 0.5})
+
+    fetched = fetch_signals(['BTCUSDT', 'ETHUSDT'], bybit, get_signal)
+
+    with pytest.raises(ConnectionError):
+        fetched['BTCUSDT'].result()
+    eth_market_data, eth_signal = fetched['ETHUSDT'].result()
+    assert eth_market_data['price'] == 3500.0
+    assert eth_signal['action'] == 'HOLD'
+
+
+def test_full_notification_queue_drops_oldest():
+    """При переполнении очереди уведомлений вытесняется самое старое сообщение"""
+    from utils.notifier import TelegramNotifier
+
+    notifier = TelegramNotifier(Mock(), 'token')
+    notifier._queue = queue.Queue(maxsize=2)
+    notifier._worker = Mock()  # поток уже "запущен" - сообщения копятся в очереди
+
+    for message in ('first', 'second', 'third'):
+        notifier.broadcast(message)
+
+    assert [m for m, _ in notifier._queue.queue] == ['second', 'third']
+
+
+def test_market_data_reuses_klines_within_candle():
+    """Свечи запрашиваются раз за свечу, а цена последней свечи берется из тикера"""
+    from bybit_client import BybitClient
+
+    client = BybitClient.__new__(BybitClient)
+    client.logger = logging.getLogger(__name__)
+    client._kline_cache = {}
+    client._kline_pool = ThreadPoolExecutor(max_workers=1)
+    client.session = Mock()
+    client.session.get_kline.return_value = {
+        'result': {'list': [['0', '0', '0', '0', '3500.0'], ['0', '0', '0', '0', '3490.0']]}}
+    client.session.get_tickers.side_effect = [
+        {'result': {'list': [{'lastPrice': '3505.0'}]}},
+        {'result': {'list': [{'lastPrice': '3510.0'}]}},
+    ]
+
+    with patch.object(BybitClient, '_current_candle', return_value=1):
+        first = client.get_market_data('ETHUSDT')
+        second = client.get_market_data('ETHUSDT')
+
+    assert client.session.get_kline.call_count == 1
+    assert first['historical_prices'] == [3505.0, 3490.0]
+    assert second['price'] == 3510.0
+    assert second['historical_prices'] == [3510.0, 3490.0]
+
+
+def test_kline_requested_before_candle_close_is_not_reused():
+    """Свечи, запрошенные до границы свечи, не считаются свежими для новой свечи"""
+    from bybit_client import BybitClient
+
+    client = BybitClient.__new__(BybitClient)
+    client.logger = logging.getLogger(__name__)
+    client._kline_cache = {}
+    client._kline_pool = ThreadPoolExecutor(max_workers=1)
+    client.session = Mock()
+    candle = [1]
+
+    def get_kline(**kwargs):
+        candle[0] = 2  # ответ пришел уже после закрытия свечи
+        return {'result': {'list': [['0', '0', '0', '0', '3500.0']]}}
+
+    client.session.get_kline.side_effect = get_kline
+    client.session.get_tickers.return_value = {'result': {'list': [{'lastPrice': '3505.0'}]}}
+
+    with patch.object(BybitClient, '_current_candle', side_effect=lambda: candle[0]):
+        client.get_market_data('ETHUSDT')
+        client.get_market_data('ETHUSDT')
+
+    assert client.session.get_kline.call_count == 2
+
 
 def test_bybit_client_directly():
     """Прямой тест клиента Bybit (только если есть API ключи)"""
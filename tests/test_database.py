@@ -9,6 +9,7 @@ import sys
 import os
 import pytest
 import tempfile
+from datetime import datetime
 from unittest.mock import patch
 
 # Добавляем src в путь для импорта
@@ -190,6 +191,27 @@ class TestDatabaseVirtualPositions:
         # Total realized PnL = 1.0 - 1.0 + 10.0 = 10.0
         assert stats['total_realized_pnl'] == 10.0
 
+    def test_add_closed_virtual_positions_bulk(self, db):
+        """Тест пакетной записи закрытых позиций"""
+        now = datetime.now()
+        trades = [
+            {'symbol': 'BTCUSDT', 'side': 'BUY', 'size': 0.001, 'entry_price': 50000.0,
+             'exit_price': 51000.0, 'leverage': 5, 'realized_pnl': 1.0, 'pnl_percent': 2.0,
+             'entry_fee': 0.03, 'exit_fee': 0.03, 'close_reason': 'take_profit',
+             'created_at': now, 'closed_at': now},
+            {'symbol': 'ETHUSDT', 'side': 'SELL', 'size': 0.1, 'entry_price': 3000.0,
+             'exit_price': 3100.0, 'leverage': 5, 'realized_pnl': -10.0, 'pnl_percent': -3.3,
+             'entry_fee': 0.18, 'exit_fee': 0.19, 'close_reason': 'stop_loss',
+             'created_at': now, 'closed_at': now},
+        ]
+
+        assert db.add_closed_virtual_positions(trades) == 2
+
+        stats = db.get_virtual_trade_stats(days=30)
+        assert stats['closed_trades'] == 2
+        assert stats['open_trades'] == 0
+        assert stats['total_realized_pnl'] == -9.0
+
 
 class TestDatabaseValidation:
     """Тесты валидации параметров"""
@@ -392,6 +414,15 @@ class TestDatabaseSettings:
         value = db.get_setting('test_key')
         assert value == 'value2'
 
+    def test_get_settings_bulk(self, db):
+        """Тест получения нескольких настроек одним запросом"""
+        db.set_setting('key_a', '1')
+        db.set_setting('key_b', '2')
+
+        assert db.get_settings(['key_a', 'key_b', 'missing']) == {'key_a': '1', 'key_b': '2'}
+        assert db.get_settings([]) == {}
+        assert db.get_settings()['key_b'] == '2'
+
 
 class TestDatabaseDecimalConversion:
     """Тесты конвертации Decimal в float"""
@@ -471,6 +502,107 @@ class TestDatabaseDecimalConversion:
         assert isinstance(position['current_price'], float)
 
 
+class TestDatabaseOpenPositionsView:
+    """Тесты для предагрегированной таблицы open_positions_mv"""
+
+    @pytest.fixture
+    def db(self):
+        """Создаёт временную SQLite БД для тестов"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
+            temp_db_path = f.name
+        
+        with patch.dict(os.environ, {'DATABASE_URL': ''}, clear=False):
+            from database import Database
+            
+            db = Database.__new__(Database)
+            db.logger = __import__('logging').getLogger(__name__)
+            db.max_retries = 3
+            db.retry_delay = 1
+            db.db_config = temp_db_path
+            db.db_type = 'sqlite'
+            db._init_db()
+            
+            yield db
+        
+        try:
+            os.unlink(temp_db_path)
+        except:
+            pass
+
+    def test_open_position_appears_in_view(self, db):
+        """Тест: новая позиция попадает в open_positions_mv"""
+        db.add_position('BTCUSDT', 'BUY', 0.001, 50000.0)
+        
+        open_positions = db.get_open_positions()
+        
+        assert len(open_positions) == 1
+        assert open_positions[0]['symbol'] == 'BTCUSDT'
+        assert open_positions[0]['status'] == 'open'
+
+    def test_price_update_refreshes_view(self, db):
+        """Тест: обновление цены пересчитывает PnL в open_positions_mv"""
+        db.add_position('BTCUSDT', 'BUY', 0.001, 50000.0)
+        position_id = db.get_open_positions()[0]['id']
+        
+        db.update_position_price(position_id, 51000.0)
+        
+        position = db.get_open_positions()[0]
+        assert position['current_price'] == 51000.0
+        assert position['pnl'] == pytest.approx(1.0)
+
+    def test_closed_position_removed_from_view(self, db):
+        """Тест: закрытая позиция удаляется из open_positions_mv"""
+        db.add_position('BTCUSDT', 'BUY', 0.001, 50000.0)
+        db.add_position('ETHUSDT', 'SELL', 0.1, 3000.0)
+        btc_id = next(p['id'] for p in db.get_open_positions() if p['symbol'] == 'BTCUSDT')
+        
+        db.close_position(btc_id, 51000.0)
+        
+        open_positions = db.get_open_positions()
+        assert [p['symbol'] for p in open_positions] == ['ETHUSDT']
+        assert db.get_position(btc_id)['status'] == 'closed'
+
+
+
+class TestDatabaseAllowedUsers:
+    """Тесты для белого списка пользователей"""
+
+    @pytest.fixture
+    def db(self):
+        """Создаёт временную SQLite БД для тестов"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
+            temp_db_path = f.name
+        
+        with patch.dict(os.environ, {'DATABASE_URL': ''}, clear=False):
+            from database import Database
+            
+            db = Database.__new__(Database)
+            db.logger = __import__('logging').getLogger(__name__)
+            db.max_retries = 3
+            db.retry_delay = 1
+            db.db_config = temp_db_path
+            db.db_type = 'sqlite'
+            db._init_db()
+            
+            yield db
+        
+        try:
+            os.unlink(temp_db_path)
+        except:
+            pass
+
+    def test_upsert_user_is_idempotent(self, db):
+        """Тест: повторный upsert обновляет имя, не создавая дубликатов"""
+        db.upsert_user(12345, 'old_name')
+        db.upsert_user(12345, 'new_name')
+        
+        rows = db._execute_query("SELECT user_id, username FROM allowed_users")
+        
+        assert len(rows) == 1
+        assert rows[0]['username'] == 'new_name'
+        assert db.is_user_allowed(12345)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
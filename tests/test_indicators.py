@@ -0,0 +1,67 @@
+import sys
+import os
+import random
+
+import pandas as pd
+import pytest
+
+# Добавляем src в путь для импорта
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def _prices(count=200, seed=7):
+    rnd = random.Random(seed)
+    price = 100.0
+    prices = []
+    for _ in range(count):
+        price *= 1 + rnd.gauss(0, 0.01)
+        prices.append(price)
+    return prices
+
+
+class TestIncrementalIndicators:
+    """Тесты для потоковых индикаторов"""
+
+    def test_ema_matches_pandas(self):
+        """Тест: EMA совпадает с pandas ewm после засева SMA"""
+        from indicators import IncrementalEMA
+
+        prices = _prices()
+        ema = IncrementalEMA(10)
+        values = [ema.update(price) for price in prices]
+
+        assert values[8] is None
+        seeded = pd.Series([sum(prices[:10]) / 10] + prices[10:])
+        expected = seeded.ewm(span=10, adjust=False).mean().tolist()
+        assert values[9:] == pytest.approx(expected)
+
+    def test_rsi_matches_wilder_smoothing(self):
+        """Тест: RSI совпадает с расчетом Уайлдера по всему ряду"""
+        from indicators import IncrementalRSI
+
+        prices = _prices()
+        rsi = IncrementalRSI(14)
+        values = [rsi.update(price) for price in prices]
+
+        changes = [b - a for a, b in zip(prices, prices[1:])]
+        avg_gain = sum(max(c, 0) for c in changes[:14]) / 14
+        avg_loss = sum(max(-c, 0) for c in changes[:14]) / 14
+        for change in changes[14:]:
+            avg_gain = (avg_gain * 13 + max(change, 0)) / 14
+            avg_loss = (avg_loss * 13 + max(-change, 0)) / 14
+
+        assert values[13] is None
+        assert values[-1] == pytest.approx(100 - 100 / (1 + avg_gain / avg_loss))
+
+    def test_macd_is_difference_of_emas(self):
+        """Тест: MACD равен разнице быстрой и медленной EMA"""
+        from indicators import IncrementalEMA, IncrementalMACD
+
+        prices = _prices()
+        macd, fast, slow = IncrementalMACD(12, 26, 9), IncrementalEMA(12), IncrementalEMA(26)
+        for price in prices:
+            value = macd.update(price)
+            fast_value, slow_value = fast.update(price), slow.update(price)
+
+        assert value == pytest.approx(fast_value - slow_value)
+        assert macd.signal is not None
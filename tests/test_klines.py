@@ -0,0 +1,100 @@
+import sys
+import os
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+# Добавляем src в путь для импорта
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def _klines(count=5, start=1704067200000, step=900000):
+    return [
+        {
+            'timestamp': start + i * step,
+            'open': 100.0 + i,
+            'high': 101.0 + i,
+            'low': 99.0 + i,
+            'close': 100.5 + i,
+            'volume': 10.0 * (i + 1),
+            'turnover': 0.0
+        }
+        for i in range(count)
+    ]
+
+
+class TestKlines:
+    """Тесты для колоночного представления свечей"""
+
+    def test_roundtrip_keeps_kline_dicts(self):
+        """Тест: индексация и итерация возвращают исходные свечи"""
+        from data_loader import Klines
+
+        source = _klines()
+        klines = Klines.from_list(source)
+
+        assert len(klines) == 5
+        assert klines[0] == source[0]
+        assert klines[-1]['close'] == pytest.approx(104.5)
+        assert list(klines) == source
+        assert klines.close.dtype.name == 'float64'
+
+    def test_empty_klines_are_falsy(self):
+        """Тест: пустой набор свечей ведет себя как пустой список"""
+        from data_loader import Klines
+
+        assert not Klines.from_list([])
+
+
+class TestDataLoader:
+    """Тесты для DataLoader"""
+
+    def test_load_without_cache_returns_klines(self):
+        """Тест: загрузка с API возвращает свечи в колоночном виде"""
+        from data_loader import DataLoader, Klines
+
+        bybit = Mock()
+        bybit.get_historical_klines_range.return_value = _klines(3)
+        loader = DataLoader(bybit, Mock())
+
+        klines = loader.load_historical_data(
+            'BTCUSDT', '15', datetime(2024, 1, 1), datetime(2024, 1, 2), use_cache=False)
+
+        assert isinstance(klines, Klines)
+        assert klines.timestamp.tolist() == [k['timestamp'] for k in _klines(3)]
+
+    def test_preload_keeps_symbol_order_and_skips_empty(self):
+        """Тест: параллельная предзагрузка сохраняет порядок символов и пропускает пустые"""
+        from data_loader import DataLoader
+
+        bybit = Mock()
+        bybit.get_historical_klines_range.side_effect = (
+            lambda symbol, *args: [] if symbol == 'SOLUSDT' else _klines(2))
+        db = Mock()
+        db.get_historical_klines_from_cache.return_value = []
+        loader = DataLoader(bybit, db)
+
+        data = loader.preload_data_for_backtest(
+            ['ETHUSDT', 'SOLUSDT', 'BTCUSDT'], '15', datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        assert list(data) == ['ETHUSDT', 'BTCUSDT']
+        assert all(len(klines) == 2 for klines in data.values())
+
+    def test_repeated_load_returns_cached_klines(self):
+        """Тест: повторная загрузка того же периода берется из памяти без БД и API"""
+        from data_loader import DataLoader
+
+        bybit = Mock()
+        bybit.get_historical_klines_range.return_value = _klines(3)
+        db = Mock()
+        db.get_historical_klines_from_cache.return_value = []
+        loader = DataLoader(bybit, db)
+        start, end = datetime(2024, 1, 1), datetime(2024, 1, 2)
+
+        first = loader.load_historical_data('BTCUSDT', '15', start, end)
+        second = loader.load_historical_data('BTCUSDT', '15', start, end)
+
+        assert second is first
+        assert db.get_historical_klines_from_cache.call_count == 1
+        assert bybit.get_historical_klines_range.call_count == 1
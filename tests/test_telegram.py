@@ -1,7 +1,11 @@
 import sys
 import os
+import asyncio
+import logging
+import weakref
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 
 # Добавляем src в путь для импорта
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -82,5 +86,155 @@ def test_telegram_config_validation():
             assert Config.TELEGRAM_CHAT_ID == 'your_chat_id'
 
 
+
+class TestSplitMessage:
+    """Тесты для разбиения длинных ответов бота"""
+
+    def test_short_message_is_not_split(self):
+        """Тест: короткий текст отправляется одним сообщением"""
+        from telegram_bot import split_message
+
+        assert split_message("📭 Нет открытых позиций.") == ["📭 Нет открытых позиций."]
+
+    def test_split_on_record_boundaries(self):
+        """Тест: части не превышают лимит и не разрывают записи"""
+        from telegram_bot import split_message, MESSAGE_SEPARATOR
+
+        record = "🆔 *ID:* 1\n" * 10 + MESSAGE_SEPARATOR
+        text = "📋 *Открытые позиции:*\n\n" + record * 50
+
+        chunks = split_message(text, limit=1000)
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+        assert all(chunk.endswith(MESSAGE_SEPARATOR) for chunk in chunks)
+
+    def test_oversized_record_is_split_by_lines(self):
+        """Тест: запись длиннее лимита делится по строкам"""
+        from telegram_bot import split_message
+
+        text = "строка\n" * 100
+
+        chunks = split_message(text, limit=50)
+
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 50 for chunk in chunks)
+
+
+@pytest.fixture
+def virtual_bot(tmp_path):
+    """VirtualTradingBot на временной SQLite БД, без биржи, DeepSeek и Telegram"""
+    with patch.dict(os.environ, {'DATABASE_URL': ''}, clear=False):
+        from database import Database
+        from utils.notifier import TelegramNotifier
+        from virtual_trading_bot import VirtualTradingBot
+
+        db = Database.__new__(Database)
+        db.logger = logging.getLogger(__name__)
+        db.max_retries = 3
+        db.retry_delay = 1
+        db.db_config = str(tmp_path / 'bot.db')
+        db.db_type = 'sqlite'
+        db._init_db()
+
+        bot = VirtualTradingBot.__new__(VirtualTradingBot)
+        bot.logger = logging.getLogger(__name__)
+        bot.db = db
+        bot.bybit = Mock()
+        bot.notifier = TelegramNotifier(db, None)
+        bot.settings_version = 0
+        bot._initialize_default_settings()
+        bot._load_settings_from_db()
+        bot.initial_balance = bot.current_balance = 10000.0
+        bot.highest_balance = bot.lowest_balance = 10000.0
+        bot.enable_trade_logging = False
+        yield bot
+
+
+def make_telegram_bot(trading_bot):
+    """TelegramBot без __init__: без polling, ответы собираются в bot.replies"""
+    from telegram_bot import TelegramBot
+
+    bot = TelegramBot.__new__(TelegramBot)
+    bot.trading_bot = trading_bot
+    bot.db = trading_bot.db
+    bot._db_pool = ThreadPoolExecutor(max_workers=1)
+    bot._pending = {}
+    bot._user_locks = weakref.WeakValueDictionary()
+    bot._settings_snapshot = trading_bot.get_all_settings()
+    bot._settings_version = trading_bot.settings_version
+    bot._settings_cache = None
+    bot.replies = []
+
+    async def send_message(update, text, parse_mode=None, reply_markup=None):
+        bot.replies.append(text)
+
+    bot._send_message = send_message
+    return bot
+
+
+def make_update(text=''):
+    update = Mock()
+    update.effective_user.id = 1
+    update.message.text = text
+    return update
+
+
+class TestTelegramBotHandlers:
+    """Тесты обработчиков команд на виртуальном боте"""
+
+    def test_settings_show_leverage_changed_by_dialog(self, virtual_bot):
+        """Тест: после диалога /set_symbol новый леверидж виден в /settings"""
+        bot = make_telegram_bot(virtual_bot)
+        bot._get_tradable_symbols = AsyncMock(return_value=frozenset({'BTCUSDT'}))
+        virtual_bot.bybit.set_leverage_async = AsyncMock(return_value=True)
+
+        async def scenario():
+            await bot._settings(make_update(), Mock())  # заполняет кеш текста /settings
+            await bot._set_symbol(make_update(), Mock())
+            await bot._fsm_route(make_update('BTCUSDT'), Mock())
+            await bot._fsm_route(make_update('25'), Mock())
+            await bot._settings(make_update(), Mock())
+
+        asyncio.run(scenario())
+
+        assert "Текущий леверидж: 10x" in bot.replies[-3]
+        assert virtual_bot.leverage == 25
+        assert '`leverage: 25`' in bot.replies[-1]
+
+    def test_reverse_opens_opposite_virtual_position(self, virtual_bot):
+        """Тест: /reverse закрывает позицию и открывает противоположную виртуальную"""
+        bot = make_telegram_bot(virtual_bot)
+        bot.db = Mock()
+        bot.db.get_open_positions.return_value = [
+            {'id': 7, 'symbol': 'ETHUSDT', 'side': 'BUY'}]
+        bot._get_market_data = AsyncMock(return_value={'symbol': 'ETHUSDT', 'price': 3500.0})
+        virtual_bot.bybit.close_position_async = AsyncMock(
+            return_value={'success': True, 'price': 3500.0})
+
+        asyncio.run(bot._reverse(make_update(), Mock()))
+
+        bot.db.close_position.assert_called_once_with(7, 3500.0)
+        positions = virtual_bot.db.get_virtual_open_positions('ETHUSDT')
+        assert [p['side'] for p in positions] == ['SELL']
+        assert bot.replies[-1] == "✅ Открыта противоположная позиция (Sell)"
+
+    def test_reverse_reports_failed_reopen(self, virtual_bot):
+        """Тест: ошибка открытия новой позиции сообщается пользователю"""
+        bot = make_telegram_bot(virtual_bot)
+        bot.db = Mock()
+        bot.db.get_open_positions.return_value = [
+            {'id': 7, 'symbol': 'ETHUSDT', 'side': 'SELL'}]
+        bot._get_market_data = AsyncMock(return_value={'symbol': 'ETHUSDT', 'price': 3500.0})
+        virtual_bot.bybit.close_position_async = AsyncMock(
+            return_value={'success': True, 'price': 3500.0})
+        virtual_bot._execute_virtual_buy = Mock(side_effect=RuntimeError("db is down"))
+
+        asyncio.run(bot._reverse(make_update(), Mock()))
+
+        assert bot.replies[-1] == "❌ Позиция закрыта, но противоположная не открыта: db is down"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])